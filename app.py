@@ -1,22 +1,62 @@
-from random import randint
-from typing import Union
+import glob
+import io
+import os
+import time
 
 from flask_openapi3 import Info, OpenAPI, Tag
-from flask import redirect, jsonify
+from flask import redirect, Response, stream_with_context, request, g, current_app
+from flask.cli import click
 from flask_cors import CORS
-from sqlalchemy.exc import IntegrityError
-from logger import logger
-from model import Session
-from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+from logger import configure_logging
+from model import Session, get_engine, get_aas_engines, shard_engines, is_fulltext_enabled, configure_database, \
+    setup_database, create_session
+from model.aas_change import AASChange
+from model.aas_change_relay import AASChangeRelay
+from model.aas_fulltext import AASFullText
+from model.aas_shard_index import AASShardIndex
 from schemas import ErrorSchema
-from schemas.asset_administration_shell import AASSchema, show_aas, AASListSchema, show_aas_list, AASDelSchema, \
-    AASSearchSchema, AASViewSchema, AASUpdateSchema, IdEncodeDecodeSchema, show_encode_decode_ids, ModelTypeSchema
-from utils.id_decoder_service import IDDecoderService
+from schemas.asset_administration_shell import AASSchema, AASDelSchema, AASSearchSchema, AASViewSchema, \
+    AASUpdateSchema, IdEncodeDecodeSchema, ModelTypeSchema, AASListQuerySchema, AASListPageSchema, \
+    AASBulkQuerySchema, AASBulkResultSchema, AASCacheStatsSchema, AASFilterSchema, AASTextSearchSchema, \
+    AASTextSearchListSchema, IdBatchResultSchema, AASExportQuerySchema, AASImportQuerySchema, \
+    AASImportResultSchema, AASChangeQuerySchema, AASChangeStreamQuerySchema, AASChangeListSchema, \
+    AASChangesCompactedSchema, AASViewQuerySchema, AASStatsQuerySchema, AASStatsSchema, SubmodelSchema, \
+    SubmodelSearchSchema, SubmodelDelSchema
+from utils.aas_cache import aas_cache
+from utils.aas_route_service import AASRouteService
+from utils.aas_snapshot import aas_snapshot
+from utils.compression_service import CompressionService
+from utils.etag_service import ETagService
+from utils.load_shedder import load_shedder
+from utils.rate_limiter import API_KEY_HEADER, FORWARDED_FOR_HEADER
+from utils.idempotency_service import IdempotencyService
+from utils.openapi_spec_service import DeferredAPIBlueprint, OpenAPISpecService
+from utils.request_metrics import request_metrics, MetricsJSONProvider
+from utils.route_response import RouteResponse
 
 # First definitions
 info = Info(title="Asset Administration Shell Repository", version='1.0.0')
-app = OpenAPI(__name__, info=info)
-CORS(app)
+
+# Routes of the repository, registered on the application by create_app. Commands are
+# added to the flask command itself, e.g. flask rebuild-fts
+api = DeferredAPIBlueprint("aas_repository", __name__, cli_group=None)
+
+# Settings of create_app, which the config parameter overrides
+DEFAULT_CONFIG = {
+    # URL of the database, overriding the DATABASE_URL environment variable
+    "DATABASE_URL": None,
+    # Sets up the database when the application is created instead of on the first request,
+    # e.g. with gunicorn --preload, so that the workers start with a ready database
+    "SETUP_DATABASE_ON_START": os.environ.get("SETUP_DATABASE_ON_START", "0") == "1",
+    # File holding the precomputed OpenAPI specification, written by flask write-openapi-spec
+    "OPENAPI_SPEC_PATH": os.environ.get("OPENAPI_SPEC_PATH"),
+    # Set to False to keep the logging configuration of the caller, e.g. a test runner
+    "CONFIGURE_LOGGING": True,
+}
+
+# Files declaring the routes and schemas, whose changes invalidate a precomputed OpenAPI specification
+OPENAPI_SOURCES = [os.path.abspath(__file__)] + \
+    glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas", "*.py"))
 
 # Defining tags
 home_tag = Tag(
@@ -27,274 +67,521 @@ aas_tag = Tag(
     name="Asset Administration Shell",
     description="This interface allows managing Asset Administration Shells"
 )
+monitoring_tag = Tag(
+    name="Monitoring",
+    description="Performance metrics of the repository"
+)
 
 
-@app.get("/", tags=[home_tag])
-def home():
+def create_app(config: dict = None) -> OpenAPI:
     """
-    Redirects to /openapi, the screen that allows choosing the documentation style.
+    Creates the Flask application. Creating it is cheap: the database is set up on the first request,
+    and the OpenAPI specification is loaded from OPENAPI_SPEC_PATH when the file is up to date,
+    or generated on its first request.
+    \f
+    :param config: Settings overriding DEFAULT_CONFIG, also set in app.config.
     """
-    return redirect('/openapi')
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    if config["CONFIGURE_LOGGING"]:
+        configure_logging()
+    if config["DATABASE_URL"]:
+        configure_database(config["DATABASE_URL"])
+
+    flask_app = OpenAPI(__name__, info=info)
+    flask_app.config.update(config)
+    flask_app.json = MetricsJSONProvider(flask_app)
+    CORS(flask_app)
+
+    flask_app.teardown_appcontext(remove_session)
+    flask_app.before_request(start_request_metrics)
+    flask_app.after_request(add_request_metrics)
+    flask_app.teardown_request(end_request_metrics)
+    flask_app.before_request(limit_request)
+    flask_app.after_request(count_stream_load)
+    flask_app.teardown_request(end_request_load)
+    flask_app.before_request(strip_etag_encodings)
+    flask_app.after_request(compress_response)
+    # Registered after compress_response, so that it runs before it and stores the uncompressed body
+    flask_app.before_request(replay_idempotent_request)
+    flask_app.after_request(store_idempotent_response)
+
+    spec = None
+    if config["OPENAPI_SPEC_PATH"]:
+        spec = OpenAPISpecService.load(config["OPENAPI_SPEC_PATH"], OpenAPISpecService.fingerprint(OPENAPI_SOURCES))
+    if spec is None:
+        api.collect_openapi_info()
+    flask_app.register_api(api)
+    if spec is not None:
+        flask_app.spec_json = spec
+
+    if config["SETUP_DATABASE_ON_START"]:
+        setup_database()
+    return flask_app
+
+
+def __getattr__(name: str):
+    """
+    Creates the default application on the first access to app.app, e.g. by gunicorn app:app or flask run,
+    so that importing this module has no side effects.
+    """
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def remove_session(exception=None):
+    """
+    Returns the connection of the request's session to the pool.
+    """
+    Session.remove()
+
+
+def start_request_metrics():
+    """
+    Starts collecting the latency, database queries and serialization time of the request.
+    """
+    g.request_stats = request_metrics.begin()
+
+
+def add_request_metrics(response):
+    """
+    Records the metrics of the request by route and reports them in the Server-Timing header.
+    For streamed responses, only the work done before the first chunk is included.
+    """
+    stats = g.get("request_stats")
+    if stats is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_metrics.observe(stats, request.method, route, response.status_code)
+        response.headers["Server-Timing"] = request_metrics.server_timing(stats)
+    return response
 
 
-def check_existing_id_short(session, id_short, aas_id):
+def end_request_metrics(exception=None):
     """
-    Check if another Asset Administration Shell with the same id_short exists in the database,
-    excluding the current AAS with aas_id.
+    Stops collecting the metrics of the request.
     """
-    return session.query(AssetAdministrationShell).filter(
-        AssetAdministrationShell.id_short == id_short,
-        AssetAdministrationShell.aas_id != aas_id
-    ).first()
+    request_metrics.end(g.pop("request_stats", None))
 
 
-def check_existing_aas_id(session, aas_id, new_aas_id):
+def limit_request():
     """
-    Check if another Asset Administration Shell with the same new_aas_id exists in the database,
-    excluding the current AAS with aas_id.
+    Rejects the request while the repository is overloaded or when its client used up its rate limit,
+    see AASRouteService.admit. Otherwise counts it as running.
     """
-    return session.query(AssetAdministrationShell).filter(
-        AssetAdministrationShell.aas_id == new_aas_id,
-        AssetAdministrationShell.aas_id != aas_id
-    ).first()
+    response = AASRouteService.admit(request.method, request.path, request.headers.get(API_KEY_HEADER),
+                                     request.remote_addr, request.headers.get(FORWARDED_FOR_HEADER))
+    if response is not None:
+        return to_response(response)
+    g.load_counted = True
+    return None
 
 
-def check_required_fields(form: Union[AASSchema, AASUpdateSchema]):
+def count_stream_load(response):
     """
-    Checks if the required fields 'aas_id', 'id_short', and 'global_asset_id' are not empty or whitespace only.
-    Returns True if all required fields are valid, otherwise False.
+    Counts a request whose route returned a streamed response as a stream, no longer running,
+    since the teardown of a streamed request only runs once the stream ends.
     """
-    required_fields = ['aas_id', 'id_short', 'global_asset_id']
+    if response.is_streamed and g.pop("load_counted", False):
+        load_shedder.start_stream()
+        g.stream_counted = True
+    return response
 
-    for field in required_fields:
-        value = getattr(form, field)
-        if not value:
-            return False
 
-    return True
+def end_request_load(exception=None):
+    """
+    Counts the request as done running, or its stream as done.
+    """
+    if g.pop("load_counted", False):
+        load_shedder.leave()
+    if g.pop("stream_counted", False):
+        load_shedder.end_stream()
 
 
-def strip_whitespace(form: Union[AASSchema, AASUpdateSchema]):
+def strip_etag_encodings():
     """
-    Strip leading and trailing whitespace from all relevant fields in the form.
+    Removes the content coding suffixes from the conditional headers, so that the ETags of
+    compressed responses match the ETags computed by the routes.
     """
-    form.aas_id = form.aas_id.strip()
-    form.id_short = form.id_short.strip()
-    form.global_asset_id = form.global_asset_id.strip()
-    if form.version:
-        form.version = form.version.strip()
-    if form.revision:
-        form.revision = form.revision.strip()
-    if form.description:
-        form.description = form.description.strip()
+    # Kept for compress_response, which gives a 304 the ETag of the representation the client holds
+    g.if_none_match = request.headers.get("If-None-Match")
+    for header in ("HTTP_IF_MATCH", "HTTP_IF_NONE_MATCH"):
+        if header in request.environ:
+            request.environ[header] = ETagService.strip_encodings(request.environ[header])
+
+
+def compress_response(response):
+    """
+    Compresses the response with the coding negotiated with Accept-Encoding. Buffered bodies below
+    the size threshold are sent as they are, streamed bodies are compressed as they are produced.
+    """
+    if response.status_code == 304:
+        etag, weak = response.get_etag()
+        if etag:
+            encoding = CompressionService.negotiate(request.headers.get("Accept-Encoding"))
+            response.set_etag(ETagService.not_modified_etag(etag, encoding, g.get("if_none_match")), weak)
+        return response
+    if response.direct_passthrough or not CompressionService.is_compressible(
+            response.status_code, response.mimetype, response.headers.get("Content-Encoding")):
+        return response
+    response.headers["Vary"] = CompressionService.add_vary(response.headers.get("Vary"))
+
+    encoding = CompressionService.negotiate(request.headers.get("Accept-Encoding"))
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = CompressionService.compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < CompressionService.MIN_SIZE:
+            return response
+        response.set_data(CompressionService.compress(data, encoding))
+
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(ETagService.encoded_etag(etag, encoding), weak)
+    return response
+
+
+def replay_idempotent_request():
+    """
+    Returns the stored response of a write retried with the same Idempotency-Key, without running the route.
+    Otherwise reserves the key for the request, whose response is stored by store_idempotent_response.
+    """
+    key = request.headers.get(IdempotencyService.HEADER)
+    if key is None or request.url_rule is None or not IdempotencyService.applies(request.method,
+                                                                                 request.url_rule.rule):
+        return None
+
+    # The body is read to fingerprint the request, and read again from the cache by the route
+    with create_session() as session:
+        response = IdempotencyService.begin(session, key, request.method, request.path, request.query_string,
+                                            request.get_data())
+    if response is None:
+        g.idempotency_key = key
+        return None
+    return to_response(response)
+
+
+def store_idempotent_response(response):
+    """
+    Stores the response of a request holding an Idempotency-Key, replayed to its retries.
+    """
+    key = g.pop("idempotency_key", None)
+    if key is None:
+        return response
+
+    with create_session() as session:
+        IdempotencyService.finish(session, key, response.status_code,
+                                  None if response.is_streamed else response.get_data(), response.content_type,
+                                  response.get_etag()[0], response.is_streamed)
+    return response
 
 
-@app.post("/aas", tags=[aas_tag],
+def to_response(route_response: RouteResponse) -> Response:
+    """
+    Returns the Flask response of a RouteResponse of AASRouteService.
+    """
+    if route_response.stream is not None:
+        body = stream_with_context(read_stream(route_response.stream))
+    else:
+        body = route_response.encode()
+    response = Response(body, status=route_response.status, mimetype=route_response.media_type)
+    response.headers.update(route_response.headers)
+    if route_response.etag:
+        response.set_etag(route_response.etag)
+    return response
+
+
+def read_stream(stream):
+    """
+    Yields the chunks of a streamed body, read in the session of the request, which is kept until the
+    last chunk. Waits between the chunks block the worker, see the README on Server-Sent Events.
+    """
+    session = Session()
+    try:
+        for chunk in stream(session):
+            if isinstance(chunk, bytes):
+                yield chunk
+            else:
+                time.sleep(chunk)
+    finally:
+        session.close()
+
+
+def request_body():
+    """
+    Returns the body of the request as a file. It was already read, to fingerprint the request,
+    when the request holds an Idempotency-Key.
+    """
+    if g.get("idempotency_key"):
+        return io.BytesIO(request.get_data())
+    return request.stream
+
+
+@api.get("/", tags=[home_tag])
+def home():
+    """
+    Redirects to /openapi, the screen that allows choosing the documentation style.
+    """
+    return redirect('/openapi')
+
+
+@api.post("/aas", tags=[aas_tag],
           responses={"200": AASViewSchema, "409": ErrorSchema, "400": ErrorSchema})
 def post_aas(form: AASSchema):
     """
     Creates a new Asset Administration Shell.
     """
+    return to_response(AASRouteService.create(Session(), form))
 
-    # Strip whitespace from fields
-    strip_whitespace(form)
 
-    # Validate required fields
-    if not check_required_fields(form):
-        error_msg = "Fields 'aas_id', 'id_short', and 'global_asset_id' are required and cannot be empty"
-        logger.warning(f"Error creating Asset Administration Shell: {error_msg}")
-        return jsonify({"message": error_msg}), 400
+@api.post("/aas/bulk", tags=[aas_tag],
+          responses={"200": AASBulkResultSchema, "400": ErrorSchema})
+def post_aas_bulk(query: AASBulkQuerySchema):
+    """
+    Creates many Asset Administration Shells at once from a JSON array or an NDJSON stream.
+    With 'upsert', existing Asset Administration Shells are updated instead of reported as conflicts.
+    """
+    return to_response(AASRouteService.bulk(Session(), request_body(), request.mimetype, query.upsert))
 
-    aas = AssetAdministrationShell(
-        aas_id=form.aas_id,
-        id_short=form.id_short,
-        asset_kind=AssetKind(form.asset_kind),
-        global_asset_id=form.global_asset_id,
-        version=form.version,
-        revision=form.revision,
-        description=form.description
-    )
 
-    logger.debug(f"Creating Asset Administration Shell with ID: {aas.aas_id}")
-    session = Session()
+@api.get("/aas/export", tags=[aas_tag])
+def export_aas(query: AASExportQuerySchema):
+    """
+    Exports every Asset Administration Shell as NDJSON, compressed with gzip or inside a zip archive.
+    The export is streamed in batches, so memory usage does not depend on the size of the repository.
+    """
+    return to_response(AASRouteService.export(query))
 
-    try:
-        # Verify if aas_id already exists in database
-        existing_aas_id = session.query(AssetAdministrationShell).filter_by(aas_id=aas.aas_id).one_or_none()
-        if existing_aas_id:
-            error_msg = f"Asset Administration Shell already exists with ID: {aas.aas_id}"
-            logger.warning(f"Error creating Asset Administration Shell: {aas.aas_id}, {error_msg}")
-            return jsonify({"message": error_msg}), 409
-
-        # Verify if id_short already exists in database
-        existing_id_short = session.query(AssetAdministrationShell).filter_by(id_short=aas.id_short).one_or_none()
-        if existing_id_short:
-            error_msg = f"Asset Administration Shell already exists with Id Short: {aas.id_short}"
-            logger.warning(f"Error creating Asset Administration Shell: {aas.id_short}, {error_msg}")
-            return jsonify({"message": error_msg}), 409
-
-        session.add(aas)
-        session.commit()
-        logger.debug(f"Asset Administration Shell with ID {aas.aas_id} created successfully")
-        return jsonify(show_aas(aas)), 200
-
-    except IntegrityError as e:
-        # Handle IntegrityError specifically
-        error_msg = f"Asset Administration Shell already exists: {str(e)}"
-        logger.warning(f"Error creating Asset Administration Shell: {aas.aas_id}, {error_msg}")
-        return jsonify({"message": error_msg}), 409
-
-    except Exception as e:
-        # Handle unexpected errors
-        error_msg = f"Could not save new Asset Administration Shell: {str(e)}"
-        logger.warning(f"Error creating Asset Administration Shell '{aas.aas_id}', {error_msg}")
-        return jsonify({"message": error_msg}), 400
-
-
-@app.get("/aas_list", tags=[aas_tag],
-         responses={"200": AASListSchema, "404": ErrorSchema})
-def get_aas_list():
+
+@api.post("/aas/import", tags=[aas_tag],
+          responses={"200": AASImportResultSchema, "400": ErrorSchema, "409": AASImportResultSchema})
+def import_aas(query: AASImportQuerySchema):
+    """
+    Imports an export of the repository, sent as NDJSON, gzip or zip, in chunks of one transaction each.
+    Conflicting Asset Administration Shells are skipped, overwritten or stop the import, following 'policy'.
+    """
+    return to_response(AASRouteService.import_items(Session(), query, request_body(), request.mimetype,
+                                                    request.content_encoding))
+
+
+@api.get("/aas_list", tags=[aas_tag],
+         responses={"200": AASListPageSchema, "404": ErrorSchema})
+def get_aas_list(query: AASListQuerySchema):
     """
     Returns all Asset Administration Shells.
+    Use 'limit' and 'cursor' to page through the list, or 'stream' to receive it as NDJSON or chunked JSON.
+    Use 'fields' to read and return only some fields, e.g. 'aas_id,id_short', and 'depth' to include
+    the Submodels.
     """
-    logger.debug(f"Collecting Asset Administration Shells")
-    session = Session()
+    return to_response(AASRouteService.get_list(Session(), query, request.query_string, request.if_none_match))
 
-    aas_list = session.query(AssetAdministrationShell).all()
-    if not aas_list:
-        return jsonify({"Asset Administration Shells": []}), 200
-    else:
-        logger.debug(f"{len(aas_list)} Asset Administration Shells found")
-        return jsonify(show_aas_list(aas_list)), 200
+
+@api.get("/aas/filter", tags=[aas_tag],
+         responses={"200": AASListPageSchema})
+def filter_aas(query: AASFilterSchema):
+    """
+    Returns the Asset Administration Shells matching all the given filters, one page at a time.
+    """
+    return to_response(AASRouteService.filter(Session(), query))
 
 
-@app.get("/aas", tags=[aas_tag],
-         responses={"200": AASViewSchema, "404": ErrorSchema})
-def get_aas(query: AASSearchSchema):
+@api.get("/aas/search", tags=[aas_tag],
+         responses={"200": AASTextSearchListSchema, "400": ErrorSchema, "501": ErrorSchema})
+def search_aas(query: AASTextSearchSchema):
     """
-    Returns a specific Asset Administration Shell by its Unique Identifier.
+    Searches the id_short and description of the Asset Administration Shells,
+    returning the best matches first with the matched words highlighted.
     """
-    decoded_aas_id = IDDecoderService.decode_id(query.aas_id)
-    logger.debug(f"Collecting data for Asset Administration Shell #{decoded_aas_id}")
-    session = Session()
+    return to_response(AASRouteService.search(Session(), query))
 
-    aas = session.query(AssetAdministrationShell).filter(AssetAdministrationShell.aas_id == decoded_aas_id).first()
-    if not aas:
-        error_msg = "Asset Administration Shell not found"
-        logger.warning(f"Error finding Asset Administration Shell: {decoded_aas_id}, {error_msg}")
-        return jsonify({"message": error_msg}), 404
-    else:
-        logger.debug(f"Asset Administration Shell data #{decoded_aas_id} found")
-        return jsonify(show_aas(aas)), 200
 
+@api.cli.command("rebuild-fts")
+def rebuild_fulltext_index():
+    """
+    Rebuilds the full-text index of the Asset Administration Shells, e.g. after restoring a database file.
+    """
+    if not is_fulltext_enabled():
+        click.echo("Full-text search requires an SQLite database with FTS5", err=True)
+        return
+    for aas_engine in get_aas_engines():
+        with aas_engine.begin() as connection:
+            AASFullText.rebuild(connection)
+    click.echo("Full-text index rebuilt")
 
-@app.delete("/aas", tags=[aas_tag],
-            responses={"200": AASDelSchema, "404": ErrorSchema})
-def delete_aas(query: AASSearchSchema):
+
+@api.cli.command("rebuild-shard-index")
+def rebuild_shard_index():
     """
-    Deletes an Asset Administration Shell.
+    Rebuilds the index of a sharded repository from the content of the shards, e.g. after restoring
+    a shard from a backup.
     """
-    decoded_aas_id = IDDecoderService.decode_id(query.aas_id)
-    logger.debug(f"Deleting data from Asset Administration Shell #{decoded_aas_id}")
-    session = Session()
+    setup_database()
+    if not shard_engines:
+        click.echo("The repository is not sharded, see AAS_SHARDS", err=True)
+        return
+    with get_engine().begin() as index_connection:
+        shard_connections = {name: shard_engine.connect() for name, shard_engine in shard_engines.items()}
+        try:
+            count = AASShardIndex.rebuild(index_connection, shard_connections)
+        finally:
+            for connection in shard_connections.values():
+                connection.close()
+    click.echo(f"Shard index rebuilt with {count} Asset Administration Shells")
+
+
+@api.cli.command("write-openapi-spec")
+@click.option("--output", "-o", help="Path of the file, OPENAPI_SPEC_PATH by default")
+def write_openapi_spec(output):
+    """
+    Writes the OpenAPI specification to the file that create_app loads from OPENAPI_SPEC_PATH,
+    e.g. when building the image of the application, so that the workers do not generate it.
+    """
+    output = output or current_app.config["OPENAPI_SPEC_PATH"] or "openapi.json"
+    spec_app = create_app({"OPENAPI_SPEC_PATH": None, "CONFIGURE_LOGGING": False})
+    OpenAPISpecService.save(output, spec_app.api_doc, OpenAPISpecService.fingerprint(OPENAPI_SOURCES))
+    click.echo(f"OpenAPI specification written to {output}")
+
 
-    count = session.query(AssetAdministrationShell).filter(
-        AssetAdministrationShell.aas_id == decoded_aas_id).delete()
+@api.get("/aas/changes", tags=[aas_tag],
+         responses={"200": AASChangeListSchema, "410": AASChangesCompactedSchema})
+def get_aas_changes(query: AASChangeQuerySchema):
+    """
+    Returns the changes of the Asset Administration Shells after the seq 'since', oldest first,
+    so that clients sync the deltas instead of reloading the whole list.
+    """
+    return to_response(AASRouteService.changes(Session(), query))
+
+
+@api.get("/aas/changes/stream", tags=[aas_tag],
+         responses={"410": AASChangesCompactedSchema})
+def stream_aas_changes(query: AASChangeStreamQuerySchema):
+    """
+    Streams the changes of the Asset Administration Shells as Server-Sent Events.
+    Clients that reconnect with the Last-Event-ID header resume after the last change they received.
+    """
+    return to_response(AASRouteService.stream_changes(Session(), query, request.headers.get("Last-Event-ID", "")))
+
+
+@api.cli.command("compact-changes")
+def compact_changes():
+    """
+    Removes the changes older than the retention window (AAS_CHANGES_RETENTION) from the change log,
+    and from the logs of the shards of a sharded repository, once copied to the change log.
+    """
+    session = Session()
+    AASChangeRelay.relay(session)
+    count = sum(AASChange.compact(session, shard=shard) for shard in [None, *shard_engines])
     session.commit()
+    click.echo(f"{count} changes removed from the change log")
 
-    if count:
-        logger.debug(f"Deleting Asset Administration Shell #{decoded_aas_id}")
-        return jsonify({"message": "Asset Administration Shell deleted", "aas_id": decoded_aas_id}), 200
-    else:
-        error_msg = "Asset Administration Shell not found in database"
-        logger.warning(f"Error deleting AAS #{decoded_aas_id}, {error_msg}")
-        return jsonify({"message": error_msg}), 404
+
+@api.get("/aas", tags=[aas_tag],
+         responses={"200": AASViewSchema, "400": ErrorSchema, "404": ErrorSchema})
+def get_aas(query: AASViewQuerySchema):
+    """
+    Returns a specific Asset Administration Shell by its Unique Identifier.
+    Use 'fields' to read and return only some fields, e.g. 'aas_id,id_short', and 'depth' to include
+    the Submodels.
+    """
+    return to_response(AASRouteService.get(Session(), query, request.if_none_match))
 
 
-@app.put("/aas", tags=[aas_tag],
-         responses={"200": AASSchema, "404": ErrorSchema})
+@api.delete("/aas", tags=[aas_tag],
+            responses={"200": AASDelSchema, "400": ErrorSchema, "404": ErrorSchema, "412": ErrorSchema})
+def delete_aas(query: AASSearchSchema):
+    """
+    Deletes an Asset Administration Shell.
+    """
+    return to_response(AASRouteService.delete(Session(), query, request.if_match))
+
+
+@api.put("/aas", tags=[aas_tag],
+         responses={"200": AASSchema, "404": ErrorSchema, "412": ErrorSchema})
 def put_aas(form: AASUpdateSchema):
     """
     Updates an existing Asset Administration Shell.
     """
+    return to_response(AASRouteService.update(Session(), form, request.if_match))
 
-    # Strip whitespace from fields
-    strip_whitespace(form)
-    if form.update_aas_id:
-        form.update_aas_id = form.update_aas_id.strip()
 
-    aas_id = form.aas_id
-    new_aas_id = form.update_aas_id
+@api.post("/aas/submodels", tags=[aas_tag],
+          responses={"200": SubmodelSchema, "400": ErrorSchema, "404": ErrorSchema, "409": ErrorSchema})
+def post_submodel(query: AASSearchSchema, body: SubmodelSchema):
+    """
+    Adds a Submodel, with its tree of elements, to an Asset Administration Shell.
+    The Submodels are part of the representation of the AAS, so its version is incremented.
+    """
+    return to_response(AASRouteService.add_submodel(Session(), query, body))
 
-    logger.debug(f"Updating data for Asset Administration Shell #{aas_id}")
-    session = Session()
 
-    # Verify if AAS with the aas_id exists in database
-    aas = session.query(AssetAdministrationShell).filter(AssetAdministrationShell.aas_id == aas_id).first()
-    if not aas:
-        error_msg = "Asset Administration Shell not found in database"
-        logger.warning(f"Error updating Asset Administration Shell #{aas_id}, {error_msg}")
-        return jsonify({"message": error_msg}), 404
-
-    # Verify if another AAS with the same id_short already exists
-    existing_id_short = check_existing_id_short(session, form.id_short, aas_id)
-    if existing_id_short:
-        error_msg = f"Another Asset Administration Shell already exists with Id Short: {form.id_short}"
-        logger.warning(f"Error updating Asset Administration Shell #{aas_id}, {error_msg}")
-        return jsonify({"message": error_msg}), 409
-
-    # Verify if the new_aas_id already exists in the database
-    if new_aas_id and new_aas_id != aas_id:
-        existing_aas = check_existing_aas_id(session, aas_id, new_aas_id)
-        if existing_aas:
-            error_msg = f"Another Asset Administration Shell already exists with AAS ID: {new_aas_id}"
-            logger.warning(f"Error updating Asset Administration Shell #{aas_id}, {error_msg}")
-            return jsonify({"message": error_msg}), 409
-
-    # Validate required fields
-    if not check_required_fields(form):
-        error_msg = "Fields 'aas_id', 'id_short', and 'global_asset_id' are required and cannot be empty"
-        logger.warning(f"Error updating Asset Administration Shell #{aas_id}, {error_msg}")
-        return jsonify({"message": error_msg}), 400
-
-    if new_aas_id and new_aas_id.strip():
-        # Update with the new aas_id
-        aas.aas_id = form.update_aas_id
-
-    aas.id_short = form.id_short
-    aas.asset_kind = AssetKind(form.asset_kind)
-    aas.global_asset_id = form.global_asset_id
-    aas.version = form.version
-    aas.revision = form.revision
-    aas.description = form.description
+@api.delete("/aas/submodels", tags=[aas_tag],
+            responses={"200": SubmodelDelSchema, "400": ErrorSchema, "404": ErrorSchema, "412": ErrorSchema})
+def delete_submodel(query: SubmodelSearchSchema):
+    """
+    Deletes a Submodel of an Asset Administration Shell, with its elements.
+    """
+    return to_response(AASRouteService.delete_submodel(Session(), query, request.if_match))
 
-    session.commit()
-    logger.debug(f"Updated Asset Administration Shell #{aas_id}")
-    return jsonify(show_aas(aas)), 200
+
+@api.get("/aas/cache", tags=[aas_tag],
+         responses={"200": AASCacheStatsSchema})
+def get_aas_cache_stats():
+    """
+    Returns the hit, miss and eviction counters of the Asset Administration Shell cache.
+    """
+    return to_response(RouteResponse(aas_cache.stats()))
 
 
-@app.get("/generate_id", tags=[aas_tag],
-         responses={"200": IdEncodeDecodeSchema, "404": ErrorSchema})
-def generate_id(query: ModelTypeSchema):
+@api.get("/aas/stats", tags=[aas_tag],
+         responses={"200": AASStatsSchema, "503": ErrorSchema})
+def get_aas_stats(query: AASStatsQuerySchema):
     """
-    Generate examples for aas_id or asset_id and show them with Base64Encode parameter.
+    Returns the number of Asset Administration Shells, their histograms by asset kind, version, revision
+    and creation date and, with 'group_by', their counts by combination of these dimensions.
+    The statistics are computed from a columnar snapshot refreshed in the background, without reading
+    the database, and include the changes up to 'last_seq'.
     """
-    type_model = query.type_model.value
-    blocks = [str(randint(1000, 9999)) for _ in range(4)]
-    decode_id = f"https://example.com/ids/{type_model}/" + "_".join(blocks)
+    return to_response(AASRouteService.stats(aas_snapshot.get(), query))
 
-    try:
-        encode_id = IDDecoderService.encode_id(decode_id)
 
-        encode_decode_ids = IdEncodeDecodeSchema(
-            decode_aas_id=decode_id,
-            encode_aas_id=encode_id
-        )
+@api.get("/metrics", tags=[monitoring_tag])
+def get_metrics():
+    """
+    Returns the latency, database queries and serialization time of the requests, by route,
+    in the Prometheus text format.
+    """
+    return Response(request_metrics.render(), content_type=request_metrics.CONTENT_TYPE)
+
+
+@api.post("/ids/encode", tags=[aas_tag],
+          responses={"200": IdBatchResultSchema, "400": ErrorSchema})
+def encode_ids():
+    """
+    Encodes many IDs at once, from a JSON array, an NDJSON stream or a text stream with one ID per line.
+    Each invalid ID is reported in its result without failing the batch.
+    """
+    return to_response(AASRouteService.convert_ids(request_body(), request.mimetype, encode=True))
+
 
-        return jsonify(show_encode_decode_ids(encode_decode_ids)), 200
+@api.post("/ids/decode", tags=[aas_tag],
+          responses={"200": IdBatchResultSchema, "400": ErrorSchema})
+def decode_ids():
+    """
+    Decodes many URL-safe Base64 IDs at once, from a JSON array, an NDJSON stream or a text stream
+    with one ID per line. Each invalid ID is reported in its result without failing the batch.
+    """
+    return to_response(AASRouteService.convert_ids(request_body(), request.mimetype, encode=False))
 
-    except Exception as e:
-        # Handle unexpected errors
-        error_msg = f"Error during ID generation or encoding: {str(e)}"
-        logger.warning(f"Error during ID generation or encoding '{decode_id}', {error_msg}")
-        return jsonify({"message": error_msg}), 500
+
+@api.get("/generate_id", tags=[aas_tag],
+         responses={"200": IdEncodeDecodeSchema, "404": ErrorSchema})
+def generate_id(query: ModelTypeSchema):
+    """
+    Generate examples for aas_id or asset_id and show them with Base64Encode parameter.
+    With 'count' greater than 1, a list of distinct IDs is returned.
+    """
+    return to_response(AASRouteService.generate_ids(query))
@@ -0,0 +1,600 @@
+"""
+Async ASGI entry point of the Asset Administration Shell Repository.
+
+Serves the same routes and schemas as the Flask application in app.py, on Starlette with
+SQLAlchemy's AsyncSession (aiosqlite for SQLite, asyncpg for PostgreSQL), so that a single
+process can keep thousands of slow clients waiting on the database at the same time. The logic
+of the routes is shared with app.py in AASRouteService, which runs here with AsyncSession.run_sync.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import io
+from contextlib import asynccontextmanager
+from tempfile import SpooledTemporaryFile
+from typing import Callable
+
+from pydantic import BaseModel, ValidationError
+from starlette.applications import Starlette
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import parse_etags, quote_etag, unquote_etag
+
+from logger import configure_logging
+from model import setup_database
+from model.async_session import AsyncSession
+from schemas.asset_administration_shell import AASSchema, AASSearchSchema, AASUpdateSchema, ModelTypeSchema, \
+    AASListQuerySchema, AASBulkQuerySchema, AASFilterSchema, AASTextSearchSchema, AASExportQuerySchema, \
+    AASImportQuerySchema, AASChangeQuerySchema, AASChangeStreamQuerySchema, AASViewQuerySchema, \
+    AASStatsQuerySchema, SubmodelSchema, SubmodelSearchSchema
+from utils.aas_cache import aas_cache
+from utils.aas_route_service import AASRouteService
+from utils.aas_snapshot import aas_snapshot
+from utils.aas_transfer_service import AASTransferService
+from utils.compression_service import CompressionService
+from utils.etag_service import ETagService
+from utils.idempotency_service import IdempotencyService
+from utils.load_shedder import load_shedder
+from utils.rate_limiter import API_KEY_HEADER, FORWARDED_FOR_HEADER
+from utils.request_metrics import request_metrics
+from utils.route_response import RouteResponse
+
+
+def to_response(route_response: RouteResponse) -> Response:
+    """
+    Returns the Starlette response of a RouteResponse of AASRouteService.
+    """
+    headers = dict(route_response.headers)
+    if route_response.etag:
+        headers["ETag"] = quote_etag(route_response.etag)
+    if route_response.stream is not None:
+        return StreamingResponse(read_stream(route_response.stream), status_code=route_response.status,
+                                 media_type=route_response.media_type, headers=headers)
+    return Response(route_response.encode(), status_code=route_response.status,
+                    media_type=route_response.media_type, headers=headers)
+
+
+async def run_route(route: Callable[..., RouteResponse]) -> Response:
+    """
+    Runs a route of AASRouteService, a function of a synchronous session, in an async session.
+    Its queries, and its writes waiting for group commit, do not block the event loop.
+    """
+    async with AsyncSession() as session:
+        route_response = await session.run_sync(route)
+    return to_response(route_response)
+
+
+async def read_stream(stream):
+    """
+    Yields the chunks of a streamed body, each read in the async session of the response, and sleeps
+    the waits between them without blocking the event loop.
+    """
+    async with AsyncSession() as session:
+        chunks = await session.run_sync(stream)
+        while True:
+            chunk = await session.run_sync(lambda _: next(chunks, None))
+            if chunk is None:
+                break
+            if isinstance(chunk, bytes):
+                yield chunk
+            else:
+                await asyncio.sleep(chunk)
+
+
+async def parse(request: Request, schema: type[BaseModel], source: str) -> BaseModel:
+    """
+    Validates the query string, the form or the JSON body of the request with the schema, as flask-openapi3 does.
+    """
+    if source == "json":
+        return schema.model_validate_json(await request.body())
+    if source == "form":
+        data = dict(await request.form())
+    else:
+        data = dict(request.query_params)
+    return schema(**data)
+
+
+def validation_error(e: ValidationError) -> Response:
+    """
+    Returns the 422 response for a request that does not match its schema.
+    """
+    return Response(e.json(), status_code=422, media_type="application/json")
+
+
+def mimetype(request: Request) -> str:
+    """
+    Returns the content type of the request body, without its parameters, like Flask's request.mimetype.
+    """
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+async def post_aas(request: Request) -> Response:
+    """
+    Creates a new Asset Administration Shell.
+    """
+    try:
+        form = await parse(request, AASSchema, "form")
+    except ValidationError as e:
+        return validation_error(e)
+    return await run_route(lambda session: AASRouteService.create(session, form))
+
+
+async def post_aas_bulk(request: Request) -> Response:
+    """
+    Creates many Asset Administration Shells at once from a JSON array or an NDJSON stream.
+    With 'upsert', existing Asset Administration Shells are updated instead of reported as conflicts.
+    """
+    try:
+        query = await parse(request, AASBulkQuerySchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    body = io.BytesIO(await request.body())
+    return await run_route(lambda session: AASRouteService.bulk(session, body, mimetype(request), query.upsert))
+
+
+async def export_aas(request: Request) -> Response:
+    """
+    Exports every Asset Administration Shell as NDJSON, compressed with gzip or inside a zip archive.
+    The export is streamed in batches, so memory usage does not depend on the size of the repository.
+    """
+    try:
+        query = await parse(request, AASExportQuerySchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    return to_response(AASRouteService.export(query))
+
+
+async def import_aas(request: Request) -> Response:
+    """
+    Imports an export of the repository, sent as NDJSON, gzip or zip, in chunks of one transaction each.
+    Conflicting Asset Administration Shells are skipped, overwritten or stop the import, following 'policy'.
+    """
+    try:
+        query = await parse(request, AASImportQuerySchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+
+    # The upload is received without blocking the event loop, then read by the synchronous bulk service
+    with SpooledTemporaryFile(max_size=AASTransferService.SPOOL_MAX_SIZE) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        return await run_route(lambda session: AASRouteService.import_items(
+            session, query, spool, mimetype(request), request.headers.get("content-encoding")))
+
+
+async def get_aas_list(request: Request) -> Response:
+    """
+    Returns all Asset Administration Shells.
+    Use 'limit' and 'cursor' to page through the list, or 'stream' to receive it as NDJSON or chunked JSON.
+    Use 'fields' to read and return only some fields, e.g. 'aas_id,id_short', and 'depth' to include
+    the Submodels.
+    """
+    try:
+        query = await parse(request, AASListQuerySchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    if_none_match = parse_etags(request.headers.get("if-none-match"))
+    return await run_route(lambda session: AASRouteService.get_list(session, query, request.scope["query_string"],
+                                                                    if_none_match))
+
+
+async def filter_aas(request: Request) -> Response:
+    """
+    Returns the Asset Administration Shells matching all the given filters, one page at a time.
+    """
+    try:
+        query = await parse(request, AASFilterSchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    return await run_route(lambda session: AASRouteService.filter(session, query))
+
+
+async def search_aas(request: Request) -> Response:
+    """
+    Searches the id_short and description of the Asset Administration Shells,
+    returning the best matches first with the matched words highlighted.
+    """
+    try:
+        query = await parse(request, AASTextSearchSchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    return await run_route(lambda session: AASRouteService.search(session, query))
+
+
+async def get_aas(request: Request) -> Response:
+    """
+    Returns a specific Asset Administration Shell by its Unique Identifier.
+    Use 'fields' to read and return only some fields, e.g. 'aas_id,id_short', and 'depth' to include
+    the Submodels.
+    """
+    try:
+        query = await parse(request, AASViewQuerySchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    if_none_match = parse_etags(request.headers.get("if-none-match"))
+    return await run_route(lambda session: AASRouteService.get(session, query, if_none_match))
+
+
+async def delete_aas(request: Request) -> Response:
+    """
+    Deletes an Asset Administration Shell.
+    """
+    try:
+        query = await parse(request, AASSearchSchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    if_match = parse_etags(request.headers.get("if-match"))
+    return await run_route(lambda session: AASRouteService.delete(session, query, if_match))
+
+
+async def put_aas(request: Request) -> Response:
+    """
+    Updates an existing Asset Administration Shell.
+    """
+    try:
+        form = await parse(request, AASUpdateSchema, "form")
+    except ValidationError as e:
+        return validation_error(e)
+    if_match = parse_etags(request.headers.get("if-match"))
+    return await run_route(lambda session: AASRouteService.update(session, form, if_match))
+
+
+async def get_aas_changes(request: Request) -> Response:
+    """
+    Returns the changes of the Asset Administration Shells after the seq 'since', oldest first,
+    so that clients sync the deltas instead of reloading the whole list.
+    """
+    try:
+        query = await parse(request, AASChangeQuerySchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    return await run_route(lambda session: AASRouteService.changes(session, query))
+
+
+async def stream_aas_changes(request: Request) -> Response:
+    """
+    Streams the changes of the Asset Administration Shells as Server-Sent Events.
+    Clients that reconnect with the Last-Event-ID header resume after the last change they received.
+    """
+    try:
+        query = await parse(request, AASChangeStreamQuerySchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    last_event_id = request.headers.get("last-event-id", "")
+    return await run_route(lambda session: AASRouteService.stream_changes(session, query, last_event_id))
+
+
+async def post_submodel(request: Request) -> Response:
+    """
+    Adds a Submodel, with its tree of elements, to an Asset Administration Shell.
+    The Submodels are part of the representation of the AAS, so its version is incremented.
+    """
+    try:
+        query = await parse(request, AASSearchSchema, "query")
+        body = await parse(request, SubmodelSchema, "json")
+    except ValidationError as e:
+        return validation_error(e)
+    return await run_route(lambda session: AASRouteService.add_submodel(session, query, body))
+
+
+async def delete_submodel(request: Request) -> Response:
+    """
+    Deletes a Submodel of an Asset Administration Shell, with its elements.
+    """
+    try:
+        query = await parse(request, SubmodelSearchSchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    if_match = parse_etags(request.headers.get("if-match"))
+    return await run_route(lambda session: AASRouteService.delete_submodel(session, query, if_match))
+
+
+async def get_aas_cache_stats(request: Request) -> Response:
+    """
+    Returns the hit, miss and eviction counters of the Asset Administration Shell cache.
+    """
+    return to_response(RouteResponse(aas_cache.stats()))
+
+
+async def get_aas_stats(request: Request) -> Response:
+    """
+    Returns the statistics of the Asset Administration Shells, computed from the columnar snapshot.
+    """
+    try:
+        query = await parse(request, AASStatsQuerySchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+
+    # Only the first read waits, in a worker thread, for the snapshot to be built
+    snapshot = aas_snapshot.snapshot or await asyncio.to_thread(aas_snapshot.get)
+    return to_response(AASRouteService.stats(snapshot, query))
+
+
+async def encode_ids(request: Request) -> Response:
+    """
+    Encodes many IDs at once, from a JSON array, an NDJSON stream or a text stream with one ID per line.
+    Each invalid ID is reported in its result without failing the batch.
+    """
+    body = io.BytesIO(await request.body())
+    return to_response(AASRouteService.convert_ids(body, mimetype(request), encode=True))
+
+
+async def decode_ids(request: Request) -> Response:
+    """
+    Decodes many URL-safe Base64 IDs at once, from a JSON array, an NDJSON stream or a text stream
+    with one ID per line. Each invalid ID is reported in its result without failing the batch.
+    """
+    body = io.BytesIO(await request.body())
+    return to_response(AASRouteService.convert_ids(body, mimetype(request), encode=False))
+
+
+async def generate_id(request: Request) -> Response:
+    """
+    Generate examples for aas_id or asset_id and show them with Base64Encode parameter.
+    With 'count' greater than 1, a list of distinct IDs is returned.
+    """
+    try:
+        query = await parse(request, ModelTypeSchema, "query")
+    except ValidationError as e:
+        return validation_error(e)
+    return to_response(AASRouteService.generate_ids(query))
+
+
+async def get_metrics(request: Request) -> Response:
+    """
+    Returns the latency, database queries and serialization time of the requests, by route,
+    in the Prometheus text format.
+    """
+    return Response(request_metrics.render(), headers={"Content-Type": request_metrics.CONTENT_TYPE})
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the metrics of every request by route and reports them in the Server-Timing header,
+    like the request hooks of the Flask application.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = request_metrics.begin()
+
+        async def send_with_metrics(message) -> None:
+            if stats is not None and message["type"] == "http.response.start":
+                # The router stores the matched route in the scope
+                route = scope.get("route")
+                request_metrics.observe(stats, scope["method"], route.path if route else "unmatched",
+                                        message["status"])
+                MutableHeaders(scope=message).append("Server-Timing", request_metrics.server_timing(stats))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            request_metrics.end(stats)
+
+
+class LoadLimitMiddleware:
+    """
+    Rejects the requests while the repository is overloaded, unless they are cheap reads, and the requests
+    of the clients that used up their rate limit, like the limit_request hook of the Flask application.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        address = scope["client"][0] if scope.get("client") else None
+        headers = Headers(scope=scope)
+        response = AASRouteService.admit(scope["method"], scope["path"], headers.get(API_KEY_HEADER), address,
+                                         headers.get(FORWARDED_FOR_HEADER))
+        if response is not None:
+            await to_response(response)(scope, receive, send)
+            return
+
+        streamed = False
+
+        async def send_counted(message) -> None:
+            nonlocal streamed
+            # A body sent in several messages is a stream, counted apart from the running requests
+            if not streamed and message["type"] == "http.response.body" and message.get("more_body", False):
+                streamed = True
+                load_shedder.start_stream()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_counted)
+        finally:
+            if streamed:
+                load_shedder.end_stream()
+            else:
+                load_shedder.leave()
+
+
+class CompressionMiddleware:
+    """
+    Compresses the responses with the coding negotiated with Accept-Encoding, like the compress_response
+    hook of the Flask application. Responses sent in a single body below the size threshold are sent as
+    they are, streamed responses are compressed body message by body message.
+    """
+
+    CONDITIONAL_HEADERS = (b"if-match", b"if-none-match")
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # The ETags of compressed responses match the ETags computed by the routes
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        scope["headers"] = [
+            (name, ETagService.strip_encodings(value.decode("latin-1")).encode("latin-1"))
+            if name in self.CONDITIONAL_HEADERS else (name, value)
+            for name, value in scope["headers"]
+        ]
+        encoding = CompressionService.negotiate(Headers(scope=scope).get("accept-encoding"))
+        start_message = None
+        encoder = None
+
+        async def send_compressed(message) -> None:
+            nonlocal start_message, encoder
+            if message["type"] == "http.response.start":
+                # Held back until the first body message tells whether the response is large enough
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                if encoder is not None and message["type"] == "http.response.body":
+                    more_body = message.get("more_body", False)
+                    data = encoder.encode(message.get("body", b""))
+                    if not more_body:
+                        data += encoder.finish()
+                    message = {"type": "http.response.body", "body": data, "more_body": more_body}
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            etag, weak = unquote_etag(headers.get("etag"))
+            if start_message["status"] == 304 and etag:
+                headers["ETag"] = quote_etag(ETagService.not_modified_etag(etag, encoding, if_none_match), weak)
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            mimetype = headers.get("content-type", "").split(";")[0].strip()
+            if CompressionService.is_compressible(start_message["status"], mimetype,
+                                                  headers.get("content-encoding")):
+                headers["Vary"] = CompressionService.add_vary(headers.get("vary"))
+                if encoding is not None and (more_body or len(body) >= CompressionService.MIN_SIZE):
+                    headers["Content-Encoding"] = encoding
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                    if etag:
+                        headers["ETag"] = quote_etag(ETagService.encoded_etag(etag, encoding), weak)
+                    if more_body:
+                        encoder = CompressionService.encoder(encoding)
+                        body = encoder.encode(body)
+                    else:
+                        body = CompressionService.compress(body, encoding)
+                    message = {"type": "http.response.body", "body": body, "more_body": more_body}
+
+            await send(start_message)
+            start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+class IdempotencyMiddleware:
+    """
+    Replays the stored response of a write retried with the same Idempotency-Key, without running the route,
+    like the replay_idempotent_request and store_idempotent_response hooks of the Flask application.
+    Runs inside CompressionMiddleware, so that the uncompressed body is stored.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        key = Headers(scope=scope).get(IdempotencyService.HEADER) if scope["type"] == "http" else None
+        if key is None or not IdempotencyService.applies(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        # The body is read to fingerprint the request, and handed over again to the route
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        async with AsyncSession() as session:
+            replayed = await session.run_sync(lambda sync_session: IdempotencyService.begin(
+                sync_session, key, scope["method"], scope["path"], scope["query_string"], body))
+        if replayed is not None:
+            await to_response(replayed)(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def receive_body() -> dict:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        response = {"status": 500, "headers": Headers(), "body": b"", "streamed": False}
+
+        async def send_and_keep(message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = Headers(raw=message["headers"])
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+                response["streamed"] = response["streamed"] or message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_keep)
+        finally:
+            headers = response["headers"]
+            etag = unquote_etag(headers["etag"])[0] if "etag" in headers else None
+            async with AsyncSession() as session:
+                await session.run_sync(lambda sync_session: IdempotencyService.finish(
+                    sync_session, key, response["status"], response["body"], headers.get("content-type"), etag,
+                    response["streamed"]))
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """
+    Configures the logging and sets up the database when the server starts, rather than on import.
+    """
+    configure_logging()
+    setup_database()
+    yield
+
+
+app = Starlette(lifespan=lifespan, routes=[
+    Route("/aas", post_aas, methods=["POST"]),
+    Route("/aas", get_aas, methods=["GET"]),
+    Route("/aas", put_aas, methods=["PUT"]),
+    Route("/aas", delete_aas, methods=["DELETE"]),
+    Route("/aas/bulk", post_aas_bulk, methods=["POST"]),
+    Route("/aas/export", export_aas, methods=["GET"]),
+    Route("/aas/import", import_aas, methods=["POST"]),
+    Route("/aas/changes", get_aas_changes, methods=["GET"]),
+    Route("/aas/changes/stream", stream_aas_changes, methods=["GET"]),
+    Route("/aas_list", get_aas_list, methods=["GET"]),
+    Route("/aas/filter", filter_aas, methods=["GET"]),
+    Route("/aas/search", search_aas, methods=["GET"]),
+    Route("/aas/cache", get_aas_cache_stats, methods=["GET"]),
+    Route("/aas/stats", get_aas_stats, methods=["GET"]),
+    Route("/aas/submodels", post_submodel, methods=["POST"]),
+    Route("/aas/submodels", delete_submodel, methods=["DELETE"]),
+    Route("/ids/encode", encode_ids, methods=["POST"]),
+    Route("/ids/decode", decode_ids, methods=["POST"]),
+    Route("/generate_id", generate_id, methods=["GET"]),
+    Route("/metrics", get_metrics, methods=["GET"]),
+])
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(LoadLimitMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
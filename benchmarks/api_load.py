@@ -0,0 +1,366 @@
+"""
+Load benchmark of the routes of the Flask application.
+
+For each table size, seeds the asset_administration_shell table on a fresh SQLite database, then drives
+post_aas, get_aas, get_aas_list, put_aas, delete_aas and generate_id in turn, through the Flask test client
+(in process) and through a multi-worker gunicorn server (over HTTP). For each route, reports the throughput,
+the p50/p95/p99 latency and the peak RSS: of the process for the test client, summed over the workers for
+the server.
+
+The results are written as JSON. Pass a previous result file as --baseline to print the change of each
+measure, and --max-regression to exit with an error when a route got slower than allowed.
+
+The server mode requires gunicorn and httpx. The peak RSS of the server is read from /proc, so it is
+only reported on Linux.
+
+Usage:
+    python benchmarks/api_load.py --sizes 1000 100000 1000000 --output results.json
+    python benchmarks/api_load.py --modes client --baseline results.json --max-regression 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = ["post_aas", "get_aas", "get_aas_list", "put_aas", "delete_aas", "generate_id"]
+MODES = ["client", "server"]
+
+
+def seed(size: int, batch_size: int = 50000) -> None:
+    """
+    Fills the table, on the database configured by the environment, with the given number of
+    Asset Administration Shells.
+    """
+    from sqlalchemy import insert
+    from model import Session
+    from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+
+    session = Session()
+    for start in range(0, size, batch_size):
+        session.execute(insert(AssetAdministrationShell), [
+            {
+                "aas_id": f"https://example.com/ids/aas/{i:08d}",
+                "id_short": f"Asset_{i:08d}_AAS",
+                "asset_kind": AssetKind.INSTANCE if i % 3 else AssetKind.TYPE,
+                "global_asset_id": f"https://example.com/ids/asset/{i:08d}",
+                "version": "1.0",
+                "revision": str(i % 10),
+                "description": "Description or comments on the element",
+                "creation_date": datetime.now(),
+                "row_version": 1,
+            }
+            for i in range(start, min(start + batch_size, size))
+        ])
+        session.commit()
+    Session.remove()
+
+
+def build_requests(route: str, size: int, count: int, list_limit: int, rng: random.Random) -> list:
+    """
+    Returns the (method, url, form) of the requests to a route. The AAS created by post_aas are
+    the ones updated by put_aas and deleted by delete_aas, so the routes must run in the order of ROUTES.
+    """
+    from utils.id_decoder_service import IDDecoderService
+
+    def form(i: int, description: str) -> dict:
+        return {"aas_id": f"https://example.com/ids/aas/bench/{i:08d}", "id_short": f"Bench_{i:08d}_AAS",
+                "asset_kind": "Instance", "global_asset_id": f"https://example.com/ids/asset/bench/{i:08d}",
+                "version": "1.0", "revision": "0", "description": description}
+
+    def aas_query(aas_id: str) -> str:
+        return urlencode({"aas_id": IDDecoderService.encode_id(aas_id)})
+
+    if route == "post_aas":
+        return [("POST", "/aas", form(i, "Created by the benchmark")) for i in range(count)]
+    if route == "get_aas":
+        return [("GET", f"/aas?{aas_query(f'https://example.com/ids/aas/{rng.randrange(size):08d}')}", None)
+                for _ in range(count)]
+    if route == "get_aas_list":
+        return [("GET", f"/aas_list?{urlencode({'limit': list_limit, 'cursor': rng.randrange(size)})}", None)
+                for _ in range(count)]
+    if route == "put_aas":
+        return [("PUT", "/aas", form(i, "Updated by the benchmark")) for i in range(count)]
+    if route == "delete_aas":
+        return [("DELETE", f"/aas?{aas_query(form(i, '')['aas_id'])}", None) for i in range(count)]
+    if route == "generate_id":
+        return [("GET", "/generate_id?type_model=aas", None) for _ in range(count)]
+    raise ValueError(f"Unknown route: {route}")
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run_route(send, requests: list, concurrency: int) -> dict:
+    """
+    Sends the requests from a pool of threads and returns the throughput, the latency percentiles
+    and the number of errors. Only 200 responses count as successful.
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def run(request) -> None:
+        nonlocal errors
+        method, url, form = request
+        start = time.perf_counter()
+        try:
+            status = send(method, url, form)
+        except Exception:
+            status = None
+        latency = time.perf_counter() - start
+        with lock:
+            latencies.append(latency)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, requests))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "requests_per_second": round(len(requests) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def process_peak_rss() -> float:
+    """
+    Returns the peak RSS of the current process, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def server_peak_rss(master_pid: int):
+    """
+    Returns the peak RSS of the gunicorn master and its workers, summed, in MB, or None outside Linux.
+    """
+    total = 0
+    try:
+        pids = [master_pid] + [int(pid) for pid in os.listdir("/proc")
+                               if pid.isdigit() and _parent(int(pid)) == master_pid]
+        for pid in pids:
+            with open(f"/proc/{pid}/status") as status:
+                total += next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return None
+    return round(total / 1024, 1)
+
+
+def _parent(pid: int):
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # The command name may hold spaces, the fields after it do not
+            return int(stat.read().rsplit(")", 1)[1].split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def run_client(args) -> list:
+    """
+    Drives the routes through the Flask test client, in the current process.
+    """
+    from app import app
+
+    local = threading.local()
+
+    def send(method: str, url: str, form: dict) -> int:
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        return local.client.open(url, method=method, data=form).status_code
+
+    rng = random.Random(args.random_seed)
+    results = []
+    for route in args.routes:
+        requests = build_requests(route, args.size, args.requests, args.list_limit, rng)
+        result = run_route(send, requests, args.concurrency)
+        results.append({"route": route, **result, "peak_rss_mb": process_peak_rss()})
+    return results
+
+
+def run_server(args, work_dir: str, env: dict) -> list:
+    """
+    Drives the routes through a gunicorn server started on the seeded database.
+    """
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        ["gunicorn", "--workers", str(args.workers), "--threads", str(args.threads),
+         "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    local = threading.local()
+
+    def send(method: str, url: str, form: dict) -> int:
+        if not hasattr(local, "client"):
+            local.client = httpx.Client(base_url=base_url, timeout=60)
+        return local.client.request(method, url, data=form).status_code
+
+    try:
+        wait_until_ready(base_url)
+        rng = random.Random(args.random_seed)
+        results = []
+        for route in args.routes:
+            requests = build_requests(route, args.size, args.requests, args.list_limit, rng)
+            result = run_route(send, requests, args.concurrency)
+            results.append({"route": route, **result, "peak_rss_mb": server_peak_rss(server.pid)})
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, timeout: float = 60) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/generate_id")
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise TimeoutError("Server did not start")
+
+
+def run_worker(args, extra: list) -> list:
+    """
+    Runs a step of the benchmark in a child process, so that each size starts from a fresh
+    process and its peak RSS is not inherited from the previous sizes.
+    """
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", *extra,
+         "--size", str(args.size), "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+         "--list-limit", str(args.list_limit), "--random-seed", str(args.random_seed),
+         "--routes", *args.routes],
+        cwd=args.work_dir, env=args.env, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()
+    return json.loads(output[-1]) if output else []
+
+
+def compare(results: list, baseline_path: str, max_regression) -> bool:
+    """
+    Prints the change of each result against the baseline, and returns False if the throughput or
+    the p95 latency of a route regressed by more than max_regression.
+    """
+    with open(baseline_path) as file:
+        baseline = {(item["size"], item["mode"], item["route"]): item for item in json.load(file)["results"]}
+
+    passed = True
+    print(f"\nCompared with {baseline_path}:")
+    for item in results:
+        previous = baseline.get((item["size"], item["mode"], item["route"]))
+        if not previous:
+            continue
+        throughput = item["requests_per_second"] / previous["requests_per_second"] - 1
+        p95 = item["p95_ms"] / previous["p95_ms"] - 1 if previous["p95_ms"] else 0.0
+        regressed = max_regression is not None and (throughput < -max_regression or p95 > max_regression)
+        passed = passed and not regressed
+        print(f"{item['size']:>9} {item['mode']:>7} {item['route']:>13} throughput {throughput:>+8.1%}  "
+              f"p95 {p95:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--routes", nargs="+", default=ROUTES, choices=ROUTES)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads sending the requests")
+    parser.add_argument("--workers", type=int, default=4, help="Gunicorn workers of the server mode")
+    parser.add_argument("--threads", type=int, default=4, help="Threads per gunicorn worker")
+    parser.add_argument("--list-limit", type=int, default=50, help="Page size of get_aas_list")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--cache", action="store_true", help="Enables the AAS cache, which hides the database")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="Previous result file to compare with")
+    parser.add_argument("--max-regression", type=float,
+                        help="Largest allowed drop of throughput or rise of p95 latency, e.g. 0.1 for 10%%")
+    parser.add_argument("--worker", choices=["seed", "client"], help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker == "seed":
+        seed(args.size)
+        return
+    if args.worker == "client":
+        print(json.dumps(run_client(args)))
+        return
+
+    # The application writes its logs to the working directory
+    args.output = os.path.abspath(args.output)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    os.chdir(tempfile.mkdtemp())
+
+    results = []
+    print(f"{'rows':>9} {'mode':>7} {'route':>13} {'req/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'errors':>7} {'RSS (MB)':>9}")
+    for size in args.sizes:
+        for mode in args.modes:
+            with tempfile.TemporaryDirectory() as work_dir:
+                args.size, args.work_dir = size, work_dir
+                args.env = {**os.environ, "PYTHONPATH": ROOT, "DATABASE_URL": f"sqlite:///{work_dir}/bench.sqlite3"}
+                args.env["AAS_CACHE_ENABLED"] = "1" if args.cache else "0"
+
+                run_worker(args, ["seed"])
+                if mode == "client":
+                    mode_results = run_worker(args, ["client"])
+                else:
+                    mode_results = run_server(args, work_dir, args.env)
+
+            for result in mode_results:
+                result = {"size": size, "mode": mode, **result}
+                results.append(result)
+                rss = "-" if result["peak_rss_mb"] is None else result["peak_rss_mb"]
+                print(f"{size:>9} {mode:>7} {result['route']:>13} {result['requests_per_second']:>9,.0f} "
+                      f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                      f"{result['errors']:>7} {rss:>9}")
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: getattr(args, key) for key in ("requests", "concurrency", "workers", "threads",
+                                                         "list_limit", "random_seed", "cache")},
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline and not compare(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Load test comparing the Flask (WSGI) and the async (ASGI) deployments.
+
+Starts each server as a single process on a fresh SQLite database, seeds it through POST /aas/bulk,
+then keeps a fixed number of concurrent clients requesting GET /aas and GET /aas_list?limit=50,
+and prints the requests per second and the p50/p99 latency of each server.
+
+Requires gunicorn, uvicorn and httpx (see requirements-async.txt).
+
+Usage:
+    python benchmarks/asgi_vs_wsgi.py --concurrency 200 --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SERVERS = {
+    "Flask (gunicorn, 32 threads)": ["gunicorn", "--workers", "1", "--threads", "32", "--bind", "127.0.0.1:{port}",
+                                     "app:app"],
+    "ASGI (uvicorn)": ["uvicorn", "--workers", "1", "--log-level", "warning", "--host", "127.0.0.1",
+                       "--port", "{port}", "asgi:app"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get("/aas/cache")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError("Server did not start")
+
+
+async def run_load(base_url: str, seed: int, concurrency: int, requests: int) -> dict:
+    from utils.id_decoder_service import IDDecoderService
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_until_ready(client)
+        await client.post("/aas/bulk", json=[
+            {"aas_id": f"https://example.com/ids/aas/{i}", "id_short": f"AAS_{i}",
+             "global_asset_id": f"https://example.com/ids/asset/{i}"}
+            for i in range(seed)
+        ])
+        urls = [
+            "/aas_list?limit=50" if i % 10 == 0 else
+            f"/aas?aas_id={IDDecoderService.encode_id(f'https://example.com/ids/aas/{i % seed}')}"
+            for i in range(requests)
+        ]
+
+        latencies = []
+        errors = 0
+        queue = iter(urls)
+
+        async def worker():
+            nonlocal errors
+            for url in queue:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests_per_second": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1000)
+    args = parser.parse_args()
+
+    for name, command in SERVERS.items():
+        port = free_port()
+        with tempfile.TemporaryDirectory() as work_dir:
+            # The cache is disabled so that every request reaches the database
+            env = {**os.environ, "PYTHONPATH": ROOT, "AAS_CACHE_ENABLED": "0",
+                   "DATABASE_URL": f"sqlite:///{work_dir}/bench.sqlite3"}
+            server = subprocess.Popen([part.format(port=port) for part in command], cwd=work_dir, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                result = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.seed, args.concurrency,
+                                              args.requests))
+            finally:
+                server.terminate()
+                server.wait()
+        print(f"{name:>30}: {result['requests_per_second']:>8.1f} req/s, p50 {result['p50_ms']:>7.1f} ms, "
+              f"p99 {result['p99_ms']:>7.1f} ms, {result['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Concurrent load benchmark of the database engine settings.
+
+Runs the same mixed read/write workload against the Flask application, once with the
+SQLite defaults (rollback journal, FULL synchronous), once with the settings used by
+model/__init__.py (WAL, NORMAL synchronous), and with group commit (AAS_GROUP_COMMIT),
+and prints the throughput of each run. Group commit pays off most when every commit syncs
+to disk, so it is also compared with WAL and FULL synchronous on its own; use a write-heavy
+workload to see it.
+
+Usage:
+    python benchmarks/concurrent_load.py --threads 16 --requests 4000 --write-ratio 0.2
+    python benchmarks/concurrent_load.py --threads 64 --requests 4000 --write-ratio 1
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGURATIONS = {
+    "rollback journal": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "WAL": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"},
+    "WAL group": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "AAS_GROUP_COMMIT": "1"},
+    "WAL FULL": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "FULL"},
+    "WAL FULL group": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "FULL", "AAS_GROUP_COMMIT": "1"},
+}
+
+
+def run_workload(threads: int, requests: int, write_ratio: float) -> dict:
+    """
+    Runs the workload in the current process, against the database configured by the environment.
+    """
+    from app import app
+    from utils.id_decoder_service import IDDecoderService
+
+    client = app.test_client()
+    seed = 200
+    for i in range(seed):
+        client.post("/aas", data={"aas_id": f"seed_{i}", "id_short": f"seed_{i}", "global_asset_id": "bench"})
+    encoded_ids = [IDDecoderService.encode_id(f"seed_{i}") for i in range(seed)]
+    writes_every = max(1, round(1 / write_ratio)) if write_ratio else 0
+
+    def request(i: int) -> int:
+        local_client = app.test_client()
+        if writes_every and i % writes_every == 0:
+            response = local_client.post("/aas", data={"aas_id": f"load_{i}", "id_short": f"load_{i}",
+                                                       "global_asset_id": "bench"})
+        else:
+            response = local_client.get(f"/aas?aas_id={encoded_ids[i % seed]}")
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        statuses = list(executor.map(request, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "errors": sum(1 for status in statuses if status >= 500),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_workload(args.threads, args.requests, args.write_ratio)))
+        return
+
+    # The cache would hide the database from the reads
+    base_env = {**os.environ, "PYTHONPATH": ROOT, "AAS_CACHE_ENABLED": "0"}
+    for name, settings in CONFIGURATIONS.items():
+        with tempfile.TemporaryDirectory() as work_dir:
+            env = {**base_env, **settings, "DATABASE_URL": f"sqlite:///{work_dir}/bench.sqlite3"}
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", "--threads", str(args.threads),
+                 "--requests", str(args.requests), "--write-ratio", str(args.write_ratio)],
+                cwd=work_dir, env=env, capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        print(f"{name:>16}: {result['requests_per_second']:>8} req/s "
+              f"({result['requests']} requests in {result['seconds']} s, {result['errors']} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Checks that every filter of GET /aas/filter is answered through an index.
+
+Seeds a temporary database, calls the endpoint once per filter, captures the SELECT it runs and
+prints its EXPLAIN QUERY PLAN. Exits with an error if any of them scans the whole table.
+
+Usage:
+    python benchmarks/explain_filters.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FILTERS = {
+    "global_asset_id": "global_asset_id=https://example.com/ids/asset/00000042",
+    "asset_kind": "asset_kind=Type",
+    "creation date range": "created_after=2024-01-01T00:00:00&created_before=2024-02-01T00:00:00",
+    "asset_kind and creation date": "asset_kind=Type&created_after=2024-01-01T00:00:00",
+    "id_short prefix": "id_short_prefix=Asset_000001",
+}
+
+
+def main():
+    work_dir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work_dir}/explain.sqlite3"
+    os.chdir(work_dir)
+    sys.path.insert(0, ROOT)
+
+    from datetime import datetime, timedelta
+    from sqlalchemy import event, insert
+    from app import app
+    from model import Session, get_engine
+    from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+
+    session = Session()
+    start = datetime(2023, 1, 1)
+    session.execute(insert(AssetAdministrationShell), [
+        {
+            "aas_id": f"https://example.com/ids/aas/{i:08d}",
+            "id_short": f"Asset_{i:08d}",
+            "asset_kind": AssetKind.TYPE if i % 10 == 0 else AssetKind.INSTANCE,
+            "global_asset_id": f"https://example.com/ids/asset/{i:08d}",
+            "creation_date": start + timedelta(minutes=i),
+            "row_version": 1,
+        }
+        for i in range(10000)
+    ])
+    session.commit()
+    Session.remove()
+
+    engine = get_engine()
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM asset_administration_shell" in statement and "EXPLAIN" not in statement:
+            statements.append((statement, parameters))
+
+    client = app.test_client()
+    failures = []
+    for name, query_string in FILTERS.items():
+        statements.clear()
+        response = client.get(f"/aas/filter?{query_string}")
+        assert response.status_code == 200, response.data
+        statement, parameters = statements[-1]
+
+        with engine.connect() as connection:
+            plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+        full_scan = any(detail.startswith("SCAN asset_administration_shell") for detail in plan)
+        print(f"{'FULL SCAN' if full_scan else 'index':>9}  {name}: {'; '.join(plan)}")
+        if full_scan:
+            failures.append(name)
+
+    if failures:
+        sys.exit(f"Filters scanning the whole table: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
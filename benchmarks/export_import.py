@@ -0,0 +1,127 @@
+"""
+Benchmark of the export and import of the repository.
+
+For each table size, exports every Asset Administration Shell in each format to a temporary file,
+then empties the table and imports the file back, reporting the throughput and the peak memory
+allocated by Python. Peak memory should stay flat as the table grows.
+
+Usage:
+    python benchmarks/export_import.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "gzip": "application/gzip",
+    "zip": "application/zip",
+}
+
+
+def seed(session, size: int, batch_size: int = 50000) -> None:
+    """
+    Fills the table with the given number of Asset Administration Shells.
+    """
+    from datetime import datetime
+    from sqlalchemy import insert, delete
+    from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+
+    session.execute(delete(AssetAdministrationShell))
+    for start in range(0, size, batch_size):
+        session.execute(insert(AssetAdministrationShell), [
+            {
+                "aas_id": f"https://example.com/ids/aas/{i:08d}",
+                "id_short": f"Asset_{i:08d}_AAS",
+                "asset_kind": AssetKind.INSTANCE if i % 3 else AssetKind.TYPE,
+                "global_asset_id": f"https://example.com/ids/asset/{i:08d}",
+                "version": "1.0",
+                "revision": str(i % 10),
+                "description": "Description or comments on the element",
+                "creation_date": datetime.now(),
+                "row_version": 1,
+            }
+            for i in range(start, min(start + batch_size, size))
+        ])
+    session.commit()
+
+
+def measure(function, trace_memory: bool):
+    """
+    Runs the function and returns its result, its duration in seconds and its peak allocation in MB.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    peak = 0.0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return result, duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--formats", nargs="+", default=list(CONTENT_TYPES), choices=list(CONTENT_TYPES))
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="Skips the measure of the peak memory, which slows down both directions")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work_dir}/bench.sqlite3"
+    os.chdir(work_dir)
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import delete
+    from model import Session
+    from model.asset_administration_shell import AssetAdministrationShell
+    from schemas.asset_administration_shell import ExportFormat, ImportPolicy
+    from utils.aas_route_service import AASRouteService
+    from utils.aas_transfer_service import AASTransferService
+
+    trace_memory = not args.no_trace_memory
+    print(f"{'rows':>9} {'format':>7} {'size (MB)':>10} {'export (rows/s)':>16} {'peak (MB)':>10} "
+          f"{'import (rows/s)':>16} {'peak (MB)':>10}")
+
+    for size in args.sizes:
+        for export_format in args.formats:
+            session = Session()
+            seed(session, size)
+            path = os.path.join(work_dir, f"export.{export_format}")
+
+            def export():
+                with open(path, "wb") as file:
+                    for chunk in AASTransferService.export(session, ExportFormat(export_format),
+                                                           AASRouteService.STREAM_BATCH_SIZE):
+                        file.write(chunk)
+
+            _, export_time, export_peak = measure(export, trace_memory)
+            session.execute(delete(AssetAdministrationShell))
+            session.commit()
+
+            def import_():
+                with open(path, "rb") as file:
+                    items = AASTransferService.read_import(file, CONTENT_TYPES[export_format])
+                    return AASTransferService.import_items(session, items, ImportPolicy.FAIL,
+                                                           AASRouteService.BULK_CHUNK_SIZE)
+
+            result, import_time, import_peak = measure(import_, trace_memory)
+            if not result["completed"] or result["created"] != size:
+                raise AssertionError(f"Import of {size} rows as {export_format} failed: {result}")
+
+            file_size = os.path.getsize(path) / 1024 / 1024
+            print(f"{size:>9} {export_format:>7} {file_size:>10.1f} {size / export_time:>16,.0f} {export_peak:>10.1f} "
+                  f"{size / import_time:>16,.0f} {import_peak:>10.1f}")
+            Session.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cold start benchmark and budget check of the Flask application.
+
+In fresh processes, measures the time to import app.py, to create the application with create_app
+(with and without a precomputed OpenAPI specification) and to serve the first request, and checks
+that importing the application does not create the database or the log directory.
+Exits with an error if the median import and creation time exceeds the budget, or if the import has
+side effects, so that it can run in CI.
+
+Usage:
+    python benchmarks/import_time.py --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process, which prints the durations in milliseconds as JSON
+PROBE = """
+import json, os, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+side_effects = sorted(name for name in ("database", "log") if os.path.exists(name))
+flask_app = app_module.create_app({"OPENAPI_SPEC_PATH": os.environ.get("PROBE_SPEC_PATH")})
+created = time.perf_counter()
+status = flask_app.test_client().get("/aas_list?limit=1").status_code
+served = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "first_request_ms": (served - created) * 1000, "side_effects": side_effects, "status": status}))
+"""
+
+
+def probe(spec_path) -> dict:
+    """
+    Measures a cold start in a new process, on a new database.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = {**os.environ, "PYTHONPATH": ROOT,
+               "DATABASE_URL": f"sqlite:///{work_dir}/bench.sqlite3", "LOG_PATH": os.path.join(work_dir, "log"),
+               "PROBE_SPEC_PATH": spec_path or ""}
+        output = subprocess.run([sys.executable, "-c", PROBE], cwd=work_dir, env=env, capture_output=True,
+                                text=True, check=True).stdout.strip().splitlines()
+    return json.loads(output[-1])
+
+
+def write_spec(path: str) -> None:
+    """
+    Writes the precomputed OpenAPI specification with the flask command.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = {**os.environ, "PYTHONPATH": ROOT, "FLASK_APP": "app", "LOG_PATH": os.path.join(work_dir, "log"),
+               "DATABASE_URL": f"sqlite:///{work_dir}/bench.sqlite3"}
+        subprocess.run([sys.executable, "-m", "flask", "write-openapi-spec", "--output", path], cwd=work_dir,
+                       env=env, capture_output=True, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500,
+                        help="Largest median time to import app.py and create the application from the "
+                             "precomputed specification")
+    args = parser.parse_args()
+
+    spec_dir = tempfile.mkdtemp()
+    spec_path = os.path.join(spec_dir, "openapi.json")
+    write_spec(spec_path)
+
+    passed = True
+    print(f"{'specification':>14} {'import (ms)':>12} {'create_app (ms)':>16} {'first request (ms)':>19}")
+    for name, path in (("generated", None), ("precomputed", spec_path)):
+        runs = [probe(path) for _ in range(args.runs)]
+        medians = {key: statistics.median(run[key] for run in runs)
+                   for key in ("import_ms", "create_app_ms", "first_request_ms")}
+        print(f"{name:>14} {medians['import_ms']:>12.0f} {medians['create_app_ms']:>16.0f} "
+              f"{medians['first_request_ms']:>19.0f}")
+
+        side_effects = {effect for run in runs for effect in run["side_effects"]}
+        if side_effects or any(run["status"] != 200 for run in runs):
+            print(f"  Importing the application created {sorted(side_effects)}, or the first request failed")
+            passed = False
+        if path and medians["import_ms"] + medians["create_app_ms"] > args.budget_ms:
+            print(f"  Import and create_app took more than the budget of {args.budget_ms:.0f} ms")
+            passed = False
+
+    if not passed:
+        sys.exit(1)
+    print(f"Cold start within the budget of {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
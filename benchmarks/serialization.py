@@ -0,0 +1,104 @@
+"""
+Micro-benchmark of the serialization of the Asset Administration Shell list.
+
+Compares the original path (ORM objects, show_aas_list and jsonify) with the fast serializer
+(column tuples, AASSerializer.show_rows and AASSerializer.dumps) for several table sizes, and checks that both
+produce the same bytes.
+
+Usage:
+    python benchmarks/serialization.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(session, size: int) -> None:
+    """
+    Fills the table with the given number of Asset Administration Shells.
+    """
+    from datetime import datetime
+    from sqlalchemy import insert, delete
+    from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+
+    session.execute(delete(AssetAdministrationShell))
+    session.execute(insert(AssetAdministrationShell), [
+        {
+            "aas_id": f"https://example.com/ids/aas/{i:08d}",
+            "id_short": f"Asset_{i:08d}_AAS",
+            "asset_kind": AssetKind.INSTANCE if i % 3 else AssetKind.TYPE,
+            "global_asset_id": f"https://example.com/ids/asset/{i:08d}",
+            "version": "1.0",
+            "revision": str(i % 10),
+            "description": "Description or comments on the element",
+            "creation_date": datetime.now(),
+            "row_version": 1,
+        }
+        for i in range(size)
+    ])
+    session.commit()
+
+
+def measure(function, repeat: int) -> float:
+    """
+    Returns the best time of the function, in milliseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work_dir}/bench.sqlite3"
+    os.chdir(work_dir)
+    sys.path.insert(0, ROOT)
+
+    from flask import jsonify
+    from sqlalchemy import select
+    from app import app
+    from model import Session
+    from model.asset_administration_shell import AssetAdministrationShell
+    from schemas.asset_administration_shell import show_aas_list
+    from utils.aas_serializer import AASSerializer, orjson
+    from utils.route_response import RouteResponse
+
+    print(f"JSON encoder: {'orjson' if orjson else 'json (standard library)'}")
+    print(f"{'rows':>8} {'jsonify (ms)':>14} {'fast (ms)':>12} {'speedup':>8}")
+
+    with app.app_context():
+        for size in args.sizes:
+            session = Session()
+            seed(session, size)
+
+            def original():
+                session.expunge_all()
+                return jsonify(show_aas_list(session.query(AssetAdministrationShell).all())).get_data()
+
+            def fast():
+                rows = session.execute(select(*AASSerializer.COLUMNS)).all()
+                return RouteResponse({"Asset Administration Shells": AASSerializer.show_rows(rows)}).encode()
+
+            if original() != fast():
+                raise AssertionError(f"Serializers differ for {size} rows")
+
+            original_ms = measure(original, args.repeat)
+            fast_ms = measure(fast, args.repeat)
+            print(f"{size:>8} {original_ms:>14.1f} {fast_ms:>12.1f} {original_ms / fast_ms:>7.1f}x")
+            Session.remove()
+
+
+if __name__ == "__main__":
+    main()
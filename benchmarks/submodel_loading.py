@@ -0,0 +1,126 @@
+"""
+Compares the loading strategies of the Submodels of a list of Asset Administration Shells.
+
+Seeds a temporary database with shells holding Submodels with nested elements, then reads lists of
+increasing length at the given depth, with 'selectin' loading (one query per level for the whole list)
+and with 'lazy' loading (one query per shell and per Submodel). Prints the number of queries and the
+time of each read, and exits with an error if 'selectin' runs more queries than one per level and per
+batch of the loader.
+
+Usage:
+    python benchmarks/submodel_loading.py [--shells 10,100,1000] [--submodels 3] [--elements 10] [--depth 3]
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Number of parent keys in the IN list of each query of selectinload
+SELECTIN_BATCH_SIZE = 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shells", default="10,100,1000", help="Comma-separated lengths of the lists to read")
+    parser.add_argument("--submodels", type=int, default=3, help="Submodels per shell")
+    parser.add_argument("--elements", type=int, default=10, help="Collections per Submodel, with 2 Properties each")
+    parser.add_argument("--depth", type=int, default=3, help="Depth of the representation")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.shells.split(",")]
+
+    work_dir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work_dir}/submodels.sqlite3"
+    os.chdir(work_dir)
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import event, insert, select
+    from model import Session, get_engine
+    from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+    from model.submodel import Submodel
+    from model.submodel_element import SubmodelElement, SubmodelElementType
+    from utils.submodel_service import SubmodelService
+
+    session = Session()
+    shell_count = max(sizes)
+    session.execute(insert(AssetAdministrationShell), [
+        {
+            "id": i,
+            "aas_id": f"https://example.com/ids/aas/{i:08d}",
+            "id_short": f"Asset_{i:08d}",
+            "asset_kind": AssetKind.INSTANCE,
+            "global_asset_id": f"https://example.com/ids/asset/{i:08d}",
+            "row_version": 1,
+        }
+        for i in range(1, shell_count + 1)
+    ])
+    session.execute(insert(Submodel), [
+        {
+            "id": (i - 1) * args.submodels + s + 1,
+            "aas_pk": i,
+            "submodel_id": f"https://example.com/ids/sm/{i:08d}/{s}",
+            "id_short": f"Submodel_{s}",
+        }
+        for i in range(1, shell_count + 1) for s in range(args.submodels)
+    ])
+    element_rows = []
+    for position in range(args.elements):
+        path = SubmodelElement.child_path("", position)
+        element_rows.append({"path": path, "depth": 1, "id_short": f"Collection_{position}",
+                             "model_type": SubmodelElementType.SUBMODEL_ELEMENT_COLLECTION, "value": None})
+        element_rows += [{"path": SubmodelElement.child_path(path, child), "depth": 2, "id_short": f"Property_{child}",
+                          "model_type": SubmodelElementType.PROPERTY, "value": str(child)} for child in range(2)]
+    session.execute(insert(SubmodelElement), [
+        {**row, "submodel_pk": submodel_pk}
+        for submodel_pk in range(1, shell_count * args.submodels + 1) for row in element_rows
+    ])
+    session.commit()
+    Session.remove()
+
+    query_count = 0
+
+    @event.listens_for(get_engine(), "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        nonlocal query_count
+        query_count += 1
+
+    print(f"{'strategy':>9} {'shells':>7} {'queries':>8} {'ms':>9}")
+    failures = []
+    for strategy in SubmodelService.STRATEGIES:
+        for size in sizes:
+            session = Session()
+            query_count = 0
+            start = time.perf_counter()
+            aas_list = session.scalars(select(AssetAdministrationShell).options(
+                *SubmodelService.load_options(args.depth, strategy)).order_by(
+                AssetAdministrationShell.id).limit(size)).all()
+            views = [SubmodelService.show_aas(aas, args.depth) for aas in aas_list]
+            elapsed = (time.perf_counter() - start) * 1000
+            Session.remove()
+
+            assert len(views) == size
+            print(f"{strategy:>9} {size:>7} {query_count:>8} {elapsed:>9.1f}")
+            if strategy == "selectin" and query_count > expected_queries(size, args.submodels, args.depth):
+                failures.append(size)
+
+    if failures:
+        sys.exit(f"Selectin loading runs too many queries for {', '.join(map(str, failures))} shells")
+
+
+def expected_queries(shells: int, submodels: int, depth: int) -> int:
+    """
+    Returns the number of queries of selectin loading: the shells, then each level in batches.
+    """
+    queries = 1
+    if depth > 0:
+        queries += math.ceil(shells / SELECTIN_BATCH_SIZE)
+    if depth > 1:
+        queries += math.ceil(shells * submodels / SELECTIN_BATCH_SIZE)
+    return queries
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,225 @@
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import itertools
+import json
 import logging
 import os
+import queue
+import random
+import sys
 
 
-log_path = "log/"
-# Check if the directory to store logs does not exist
-if not os.path.exists(log_path):
-    # If it doesn't exist, create the directory
-    os.makedirs(log_path)
+log_path = os.environ.get("LOG_PATH", "log/")
 
+# Level of the application loggers, DEBUG adds a few lines per request
+log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
 
-dictConfig({
-    "version": 1,
-    "disable_existing_loggers": True,
-    "formatters": {
-        "default": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s",
-        },
-        "detailed": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%("
-                      "pathname)s L%(lineno)-4d",
+# "text" for the human-readable format, "json" for one JSON object per line
+log_format = os.environ.get("LOG_FORMAT", "text")
+
+# Fraction of the DEBUG records kept, to follow the requests under load without writing them all
+log_debug_sample_rate = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 1.0))
+
+# Size of a log file before it is rotated, and number of rotated files kept
+log_max_bytes = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+log_backup_count = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+
+# Set LOG_CONSOLE=0 to write the logs only to the files
+log_console = os.environ.get("LOG_CONSOLE", "1") != "0"
+
+DEFAULT_FORMAT = "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s"
+DETAILED_FORMAT = "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%(" \
+                  "pathname)s L%(lineno)-4d"
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats every record as a single-line JSON object, for log collectors.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "function": record.funcName,
+            "line": record.lineno,
+            "pid": record.process,
+            "message": record.getMessage(),
         }
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
-            "stream": "ext://sys.stdout",
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps a random fraction of the DEBUG records and all the records of the other levels.
+    \f
+    :param rate: Fraction of the DEBUG records kept, between 0 and 1.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno != logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+def create_formatter(fmt: str) -> logging.Formatter:
+    """
+    Returns the formatter selected by LOG_FORMAT, with the given format for text output.
+    """
+    return JSONFormatter() if log_format == "json" else logging.Formatter(fmt)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queues the records without formatting them, so that the listener thread formats them with the
+    formatter of each of its handlers, tracebacks included. QueueHandler.prepare formats the record in
+    the thread of the request and drops its exception, which the JSON formatter would not see.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The arguments are merged now, since they may change before the listener formats the record
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def claim_log_slot() -> str:
+    """
+    Returns the number of the log files of the current process: the lowest slot not held by another
+    process, held with a lock until the process exits. A restarted gunicorn worker thus takes over
+    the files of the worker it replaces, instead of starting files named after its PID.
+    Falls back to the PID where file locks are not available.
+    """
+    global log_slot_file
+
+    try:
+        import fcntl
+    except ImportError:
+        return str(os.getpid())
+
+    # A forked process shares the lock of its parent, and must take a slot of its own
+    if log_slot_file is not None:
+        log_slot_file.close()
+    for slot in itertools.count():
+        slot_file = open(os.path.join(log_path, f"gunicorn.{slot}.lock"), "a")
+        try:
+            fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            slot_file.close()
+            continue
+        log_slot_file = slot_file
+        return str(slot)
+
+
+def create_file_handler(name: str, slot: str) -> RotatingFileHandler:
+    """
+    Returns a rotating handler writing to a file of the current process. Each gunicorn worker
+    has its own files, since processes sharing a file overwrite each other's lines when rotating.
+    """
+    handler = RotatingFileHandler(os.path.join(log_path, f"gunicorn.{name}.{slot}.log"),
+                                  maxBytes=log_max_bytes, backupCount=log_backup_count, delay=True)
+    handler.setFormatter(create_formatter(DETAILED_FORMAT))
+    return handler
+
+
+# Handler of the loggers, passing the records to the thread that formats and writes them
+queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+queue_handler.addFilter(DebugSampler(log_debug_sample_rate))
+listener = None
+log_slot_file = None
+
+
+def start_listener() -> None:
+    """
+    Starts the thread writing the queued records to the console and to the files of the process.
+    Called again in every process forked from this one (e.g. gunicorn workers), since the thread
+    does not survive a fork and each process writes its own files.
+    """
+    global listener
+
+    # A queue of the parent process may have been locked by one of its threads during the fork
+    queue_handler.queue = queue.SimpleQueue()
+
+    # Records of gunicorn.error go to the error file, all the others to the detailed file
+    slot = claim_log_slot()
+    error_file = create_file_handler("error", slot)
+    error_file.addFilter(logging.Filter("gunicorn.error"))
+    detailed_file = create_file_handler("detailed", slot)
+    detailed_file.addFilter(lambda record: not record.name.startswith("gunicorn.error"))
+    handlers = [error_file, detailed_file]
+
+    if log_console:
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(create_formatter(DEFAULT_FORMAT))
+        handlers.append(console)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+
+def stop_listener() -> None:
+    """
+    Writes the records still in the queue and stops the thread, when the process exits.
+    """
+    global listener
+
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        listener = None
+
+
+def configure_logging() -> None:
+    """
+    Creates the log directory, routes the loggers to the queue and starts the writing thread.
+    Called by the application when it starts rather than on import, and only once per process.
+    """
+    global logging_configured
+
+    if logging_configured:
+        return
+    logging_configured = True
+
+    # Check if the directory to store logs does not exist
+    if not os.path.exists(log_path):
+        # If it doesn't exist, create the directory
+        os.makedirs(log_path)
+
+    # The loggers only put the records in the queue, which does not block the request
+    dictConfig({
+        "version": 1,
+        "disable_existing_loggers": True,
+        "handlers": {
+            "queue": {
+                "()": lambda: queue_handler,
+            }
         },
-        "error_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.error.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
+        "loggers": {
+            "gunicorn.error": {
+                "handlers": ["queue"],
+                "level": "INFO",
+                "propagate": False,
+            },
+            # Created on import, before the configuration, so it must be listed to stay enabled
+            __name__: {},
         },
-        "detailed_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.detailed.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
-        }
-    },
-    "loggers": {
-        "gunicorn.error": {
-            "handlers": ["console", "error_file"],
-            "level": "INFO",
-            "propagate": False,
+        "root": {
+            "handlers": ["queue"],
+            "level": log_level,
         }
-    },
-    "root": {
-        "handlers": ["console", "detailed_file"],
-        "level": "INFO",
-    }
-})
+    })
+
+    start_listener()
+    atexit.register(stop_listener)
+    os.register_at_fork(after_in_child=start_listener)
+
 
+logging_configured = False
 logger = logging.getLogger(__name__)
@@ -1,33 +1,292 @@
-from sqlalchemy_utils import database_exists, create_database
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import Session as PlainSession, sessionmaker, scoped_session
+from sqlalchemy import MetaData, create_engine, event, func, inspect, select, text, update
+from sqlalchemy.schema import CreateTable, DropTable
 import os
+import threading
+import time
 
 # Importing elements defined in model
 from model.base import Base
 from model.asset_administration_shell import AssetAdministrationShell
+from model.repository_state import RepositoryState
+from model.aas_change import AASChange, ChangeOperation
+from model.aas_change_relay import AASChangeRelay
+from model.aas_fulltext import AASFullText
+from model.aas_shard_index import AASShardIndex
+from model.submodel import Submodel
+from model.submodel_element import SubmodelElement, SubmodelElementType
+from model.idempotency_key import IdempotencyKey
+from utils.load_shedder import load_shedder
+from utils.request_metrics import request_metrics
 
 
 db_path = "database/"
+default_db_url = 'sqlite:///%s/db.sqlite3' % db_path
 
-# Verifies if the directory does not exist
-if not os.path.exists(db_path):
+# Database URL, local SQLite unless DATABASE_URL points to another database (e.g. PostgreSQL)
+db_url = os.environ.get("DATABASE_URL", default_db_url)
+is_sqlite = db_url.startswith("sqlite")
 
-    # If it doesn't exist, creates the directory
-    os.makedirs(db_path)
+# Connection pool settings, shared by SQLite and server databases
+pool_size = int(os.environ.get("DB_POOL_SIZE", 10))
+max_overflow = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", 30))
 
-# Database URL for local SQLite access
-db_url = 'sqlite:///%s/db.sqlite3' % db_path
+# SQLite settings: WAL lets readers run while a writer commits, and NORMAL synchronous
+# is durable in WAL mode except for the last transactions on a power loss
+sqlite_journal_mode = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+sqlite_busy_timeout = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+sqlite_synchronous = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
 
-# Creates the connection engine to the database
-engine = create_engine(db_url, echo=False)
+# Sharding: AAS_SHARDS stores the Asset Administration Shells in several databases, as a number of
+# SQLite files in the database directory or as name=url pairs. Every shard logs the changes of its
+# shells, and the main database keeps the shard index, the merged change log and the other tables.
+# AAS_SHARD_SITES places the shells by the prefix of their aas_id, as prefix=shard pairs, and the
+# others by a hash of their aas_id
+shard_urls = {}
+shard_router = None
+if os.environ.get("AAS_SHARDS", "").strip():
+    from model.sharding import AASShardedSession, ShardRouter, INDEX_SHARD, parse_shards, parse_sites
+    shard_urls = parse_shards(os.environ["AAS_SHARDS"], db_path)
+    shard_router = ShardRouter(list(shard_urls), parse_sites(os.environ.get("AAS_SHARD_SITES", "")))
 
-# Session maker instance bound to the engine
-Session = sessionmaker(bind=engine)
+# The engine is created, and the database set up, on first use rather than on import,
+# so that importing the application (CLI commands, workers, tests) does not touch the database
+engine = None
+shard_engines = {}
+fulltext_enabled = False
+database_ready = False
+setup_lock = threading.RLock()
 
-# Creates the database if it doesn't exist
-if not database_exists(engine.url):
-    create_database(engine.url)
 
-# Creates the tables in the database if they do not exist
-Base.metadata.create_all(engine)
+def configure_database(url: str) -> None:
+    """
+    Sets the URL of the database, e.g. from the configuration of create_app.
+    Must be called before the engine is created.
+    """
+    global db_url, is_sqlite
+
+    if engine is not None and url != db_url:
+        raise RuntimeError("The database URL cannot be changed after the engine was created")
+    db_url = url
+    is_sqlite = db_url.startswith("sqlite")
+
+
+def get_engine():
+    """
+    Returns the engine of the database, creating it on first use.
+    """
+    global engine
+
+    if engine is not None:
+        return engine
+    with setup_lock:
+        if engine is None:
+            main_engine = create_db_engine(db_url)
+            if shard_urls:
+                shard_engines.update({name: create_db_engine(url) for name, url in shard_urls.items()})
+                session_factory.configure(router=shard_router, shards={INDEX_SHARD: main_engine, **shard_engines})
+            else:
+                session_factory.configure(bind=main_engine)
+            engine = main_engine
+    return engine
+
+
+def get_aas_engines() -> list:
+    """
+    Returns the engines of the databases storing the Asset Administration Shells: the shards,
+    or the main database when the repository is not sharded.
+    """
+    main_engine = get_engine()
+    return list(shard_engines.values()) or [main_engine]
+
+
+def create_db_engine(url: str):
+    """
+    Creates the connection engine to a database, with the listeners of the settings and the metrics.
+    """
+    url_is_sqlite = url.startswith("sqlite")
+    connect_args = {}
+    if url_is_sqlite:
+        # Verifies if the directory does not exist
+        if url.startswith(f"sqlite:///{db_path}") and not os.path.exists(db_path):
+
+            # If it doesn't exist, creates the directory
+            os.makedirs(db_path)
+
+        # Connections are handed over between the threads of the pool
+        connect_args = {"check_same_thread": False, "timeout": sqlite_busy_timeout / 1000}
+
+    new_engine = create_engine(
+        url,
+        echo=False,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=not url_is_sqlite,
+        connect_args=connect_args
+    )
+
+    if url_is_sqlite:
+        event.listen(new_engine, "connect", set_sqlite_pragmas)
+    event.listen(new_engine, "before_cursor_execute", start_query_timer)
+    event.listen(new_engine, "after_cursor_execute", record_query_time)
+    event.listen(new_engine, "handle_error", record_failed_query_time)
+    return new_engine
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Applies the SQLite settings to every new connection of the pool.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA busy_timeout={sqlite_busy_timeout}")
+    cursor.execute(f"PRAGMA synchronous={sqlite_synchronous}")
+    cursor.close()
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    """
+    Records the start of a query on its execution context, which is discarded even if the query fails.
+    """
+    if context is not None:
+        context.query_start_time = time.perf_counter()
+
+
+def record_query_time(conn, cursor, statement, parameters, context, executemany):
+    """
+    Adds the duration of a query to the metrics of the running request and to the load of the database.
+    """
+    if context is not None:
+        duration = time.perf_counter() - context.query_start_time
+        request_metrics.record_query(duration)
+        load_shedder.observe_query(duration)
+
+
+def record_failed_query_time(exception_context):
+    """
+    Adds the duration of a failed query, such as an insert rejected by a unique constraint.
+    """
+    context = exception_context.execution_context
+    if context is not None and hasattr(context, "query_start_time"):
+        duration = time.perf_counter() - context.query_start_time
+        request_metrics.record_query(duration)
+        load_shedder.observe_query(duration)
+
+
+def setup_database() -> None:
+    """
+    Creates the database, its tables, indexes and full-text index if they do not exist, once per process.
+    Runs on the first session, or when the application starts if SETUP_DATABASE_ON_START is set.
+    """
+    global fulltext_enabled, database_ready
+
+    if database_ready:
+        return
+    with setup_lock:
+        if database_ready:
+            return
+        db_engine = get_engine()
+
+        # Imported here, since it takes longer to import than the rest of the model
+        from sqlalchemy_utils import database_exists, create_database
+
+        # Creates the databases if they don't exist
+        for new_engine in [db_engine] + list(shard_engines.values()):
+            if not database_exists(new_engine.url):
+                create_database(new_engine.url)
+
+        # Creates the tables in the database if they do not exist. The AAS table is in the shards,
+        # if any, with their change log and state, and the shard index in the main database
+        aas_table = AssetAdministrationShell.__table__
+        sharding_tables = {AASShardIndex.__table__, AASChangeRelay.__table__}
+        Base.metadata.create_all(db_engine, tables=[
+            table for table in Base.metadata.sorted_tables
+            if table not in ({aas_table} if shard_engines else sharding_tables)])
+        for shard_engine in shard_engines.values():
+            Base.metadata.create_all(shard_engine, tables=[RepositoryState.__table__, AASChange.__table__])
+
+        fulltext_enabled = True
+        for aas_engine in get_aas_engines():
+            aas_table.create(aas_engine, checkfirst=True)
+
+            # Adds the columns introduced after the first release to databases created before them
+            columns = {column["name"] for column in inspect(aas_engine).get_columns("asset_administration_shell")}
+            if "row_version" not in columns:
+                with aas_engine.begin() as connection:
+                    connection.execute(text("ALTER TABLE asset_administration_shell "
+                                            "ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1"))
+            if aas_engine.dialect.name == "sqlite":
+                add_sqlite_autoincrement(aas_engine)
+
+            # Creates the indexes added after the first release, which create_all skips for existing tables
+            for index in aas_table.indexes:
+                index.create(aas_engine, checkfirst=True)
+
+            # Full-text search is only available on SQLite builds with FTS5
+            fulltext_enabled = fulltext_enabled and aas_engine.dialect.name == "sqlite" and \
+                AASFullText.create(aas_engine)
+
+        # Creates the single row holding the state of the repository, and of each shard. The change stamp
+        # numbers the change log, whose entries were numbered by the database before, so it starts after
+        # the last of them
+        for state_engine in [db_engine] + list(shard_engines.values()):
+            with PlainSession(bind=state_engine) as session:
+                if session.get(RepositoryState, 1) is None:
+                    session.add(RepositoryState(id=1, change_stamp=0))
+                    session.flush()
+                last_seq = session.scalar(select(func.max(AASChange.seq))) or 0
+                if RepositoryState.get_change_stamp(session) < last_seq:
+                    session.execute(update(RepositoryState).where(RepositoryState.id == 1).values(
+                        change_stamp=last_seq))
+                session.commit()
+        database_ready = True
+
+
+def add_sqlite_autoincrement(aas_engine) -> None:
+    """
+    Rebuilds the AAS table of an SQLite database created before it used AUTOINCREMENT, which reuses the
+    primary key of the last shells once they are deleted, and with it their ETags. The rows keep their
+    primary key, the indexes and the full-text triggers dropped with the table are created again by
+    setup_database.
+    """
+    aas_table = AssetAdministrationShell.__table__
+    with aas_engine.begin() as connection:
+        table_sql = connection.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                                      {"name": aas_table.name})
+        if "AUTOINCREMENT" in table_sql.upper():
+            return
+
+        # The new table is renamed last, since renaming the old one would also rename the references
+        # of the other tables to it
+        rebuilt_table = aas_table.to_metadata(MetaData(), name=f"{aas_table.name}_rebuilt")
+        columns = ", ".join(column.name for column in aas_table.columns)
+        connection.execute(DropTable(rebuilt_table, if_exists=True))
+        connection.execute(CreateTable(rebuilt_table))
+        connection.execute(text(f"INSERT INTO {rebuilt_table.name} ({columns}) SELECT {columns} FROM {aas_table.name}"))
+        connection.execute(DropTable(aas_table))
+        connection.execute(text(f"ALTER TABLE {rebuilt_table.name} RENAME TO {aas_table.name}"))
+
+
+def is_fulltext_enabled() -> bool:
+    """
+    Tells whether the database supports full-text search, setting it up if needed.
+    """
+    setup_database()
+    return fulltext_enabled
+
+
+def create_session():
+    """
+    Opens a session, setting up the database on first use.
+    """
+    setup_database()
+    return session_factory()
+
+
+# Session maker instance, bound to the engine (or the shards) when it is created
+session_factory = sessionmaker(class_=AASShardedSession) if shard_urls else sessionmaker()
+
+# Thread-local sessions, removed at the end of every request by the application
+Session = scoped_session(create_session)
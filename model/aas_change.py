@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+import enum
+import os
+import time
+from typing import Dict, List, Union
+
+from sqlalchemy import Column, String, Enum, DateTime, Integer, Index, delete, func, insert, select
+from model.base import Base
+from model.repository_state import RepositoryState
+
+
+class ChangeOperation(enum.Enum):
+    """
+    Enumeration of the writes recorded in the change log.
+    """
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+
+class AASChange(Base):
+    """
+    Represents an entry of the append-only log of the writes to the Asset Administration Shells,
+    which lets clients sync the changes instead of polling the whole list. In a sharded repository,
+    every shard logs the writes to its shells, and the log of the main database, which the clients
+    read, merges the logs of the shards (see AASChangeRelay).
+    \f
+    :param seq: Position of the change in the log, increasing and never reused. Taken from the change stamp
+        of the repository, which is locked until the write commits, so that a change never commits after
+        a change of a higher seq, which the clients reading the log would then have passed.
+    :param operation: Whether the AAS was created, updated or deleted.
+    :param aas_id: The aas_id of the AAS after the change.
+    :param previous_aas_id: The aas_id of the AAS before the change, if the update changed it.
+    :param row_version: The version of the AAS after the change, None for deletions.
+    :param changed_at: Date of the change, used to compact the log.
+    """
+    __tablename__ = 'aas_change'
+    # The seq is set explicitly; AUTOINCREMENT is kept for the databases created before
+    __table_args__ = (
+        Index('ix_aas_change_changed_at', 'changed_at'),
+        {'sqlite_autoincrement': True},
+    )
+
+    seq = Column(Integer, primary_key=True)
+    operation = Column(Enum(ChangeOperation, name='change_operation_enum'), nullable=False)
+    aas_id = Column(String(2000), nullable=False)
+    previous_aas_id = Column(String(2000))
+    row_version = Column(Integer)
+    changed_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    # Changes older than the retention window, in seconds, are removed from the log
+    retention = float(os.environ.get("AAS_CHANGES_RETENTION", 7 * 24 * 3600))
+
+    # Minimum time, in seconds, between two compactions of a log run by the writes
+    compaction_interval = float(os.environ.get("AAS_CHANGES_COMPACTION_INTERVAL", 3600))
+    # Time of the last compaction of each log, by shard, None for the main database
+    last_compactions: Dict[Union[str, None], float] = {}
+
+    @staticmethod
+    def record(session, operation: ChangeOperation, aas_id: str, row_version: Union[int, None] = None,
+               previous_aas_id: Union[str, None] = None, shard: Union[str, None] = None) -> None:
+        """
+        Appends a change to the log and stamps the repository. Must be called in the same transaction
+        as the write it records.
+        """
+        AASChange.record_many(session, [{
+            "operation": operation,
+            "aas_id": aas_id,
+            "previous_aas_id": previous_aas_id,
+            "row_version": row_version,
+        }], shard)
+
+    @staticmethod
+    def record_many(session, changes: List[dict], shard: Union[str, None] = None) -> None:
+        """
+        Appends many changes to the log with a single statement, numbered by the change stamp of the
+        repository, and compacts the log when it is due.
+        \f
+        :param session: The database session of the writes.
+        :param changes: The operation, aas_id, previous_aas_id and row_version of each change.
+        :param shard: In a sharded repository, the shard of the changed AAS, whose log records the changes
+                      in the transaction of the write, so that the write does not lock the main database.
+        """
+        now = datetime.now()
+        first_seq = RepositoryState.touch(session, len(changes), shard) - len(changes) + 1
+        session.execute(insert(AASChange), [{"seq": first_seq + position, "changed_at": now, **change}
+                                            for position, change in enumerate(changes)],
+                        bind_arguments=RepositoryState.bind_arguments(shard))
+
+        if AASChange.is_compaction_due(shard):
+            AASChange.compact(session, shard=shard)
+
+    @staticmethod
+    def is_compaction_due(shard: Union[str, None] = None) -> bool:
+        """
+        Tells whether the log of the main database, or of a shard, was not compacted for the compaction interval.
+        """
+        return time.monotonic() - AASChange.last_compactions.get(shard, 0.0) >= AASChange.compaction_interval
+
+    @staticmethod
+    def compact(session, retention: Union[float, None] = None, shard: Union[str, None] = None) -> int:
+        """
+        Removes the changes older than the retention window, always keeping the latest one,
+        so that the first seq left tells clients whether the changes they missed were removed.
+        \f
+        :param shard: The shard whose log is compacted, None for the main database.
+        :return: The number of removed changes.
+        """
+        AASChange.last_compactions[shard] = time.monotonic()
+        cutoff = datetime.now() - timedelta(seconds=AASChange.retention if retention is None else retention)
+        latest_seq = select(func.max(AASChange.seq)).scalar_subquery()
+        result = session.execute(delete(AASChange).where(AASChange.changed_at < cutoff, AASChange.seq < latest_seq),
+                                 bind_arguments=RepositoryState.bind_arguments(shard))
+        return result.rowcount
+
+    @staticmethod
+    def since_statement(since: int, limit: int):
+        """
+        Returns the query of the changes after the given seq, oldest first.
+        """
+        return select(AASChange).where(AASChange.seq > since).order_by(AASChange.seq).limit(limit)
+
+    @staticmethod
+    def bounds_statement():
+        """
+        Returns the query of the first and the last seq of the log, both None if it is empty.
+        """
+        return select(func.min(AASChange.seq), func.max(AASChange.seq))
+
+    @staticmethod
+    def is_compacted(first_seq: Union[int, None], since: int) -> bool:
+        """
+        Tells whether changes after the given seq were removed by a compaction.
+        """
+        return first_seq is not None and since < first_seq - 1
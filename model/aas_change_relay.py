@@ -0,0 +1,84 @@
+from sqlalchemy import Column, String, Integer, insert, select
+
+from model.base import Base
+from model.aas_change import AASChange
+from model.repository_state import RepositoryState
+
+
+class AASChangeRelay(Base):
+    """
+    Represents the position up to which the change log of a shard was copied to the change log of the main
+    database, in a sharded repository. The writes log their changes in their shard, so that they do not lock
+    the main database, and the readers of the change log copy them to the main log, which numbers them in
+    a single sequence.
+    \f
+    :param shard: The name of the shard.
+    :param seq: The seq, in the log of the shard, of the last change copied to the main log.
+    """
+    __tablename__ = 'aas_change_relay'
+
+    shard = Column(String(64), primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+
+    # Columns of the changes copied from the shards, all but the seq, which the main log gives them
+    COLUMNS = ("operation", "aas_id", "previous_aas_id", "row_version", "changed_at")
+
+    @staticmethod
+    def relay(session) -> int:
+        """
+        Copies the changes committed in the shards since the last copy to the main log, and commits them.
+        Does nothing if the repository is not sharded, or if no change was committed since the last copy.
+        The change stamp of a shard is locked until the write commits, like the change stamp of a repository
+        that is not sharded, so the changes of a shard are committed in the order of their seq: no change is
+        committed in a shard after a change of a higher seq was copied.
+        \f
+        :param session: A session without pending writes, whose transaction is ended.
+        :return: The number of copied changes.
+        """
+        router = getattr(session, "router", None)
+        if router is None:
+            return 0
+        stamps = {shard: RepositoryState.get_change_stamp(session, shard) for shard in router.shards}
+        if all(stamp <= seq for stamp, seq in zip(stamps.values(), AASChangeRelay.positions(session, stamps))):
+            session.rollback()
+            return 0
+
+        # Locks the main log, then reads the positions again, since another reader may have copied the changes
+        RepositoryState.touch(session, 0)
+        positions = dict(zip(stamps, AASChangeRelay.positions(session, stamps)))
+        changes = []
+        missed = False
+        for shard, position in positions.items():
+            shard_changes = session.execute(
+                select(AASChange.seq, *(getattr(AASChange, name) for name in AASChangeRelay.COLUMNS)).where(
+                    AASChange.seq > position).order_by(AASChange.seq),
+                bind_arguments=RepositoryState.bind_arguments(shard)).all()
+            if not shard_changes:
+                continue
+            # The log of the shard was compacted past the changes that were not copied yet
+            missed = missed or shard_changes[0].seq > position + 1
+            changes.extend(shard_changes)
+            session.merge(AASChangeRelay(shard=shard, seq=shard_changes[-1].seq))
+
+        if changes:
+            changes.sort(key=lambda change: change.changed_at)
+            first_seq = RepositoryState.touch(session, len(changes)) - len(changes) + 1
+            session.execute(insert(AASChange), [
+                {"seq": first_seq + position, **{name: getattr(change, name) for name in AASChangeRelay.COLUMNS}}
+                for position, change in enumerate(changes)
+            ])
+        if missed:
+            # Only the latest change is kept, so that the clients reload the list instead of missing changes
+            AASChange.compact(session, retention=0)
+        elif AASChange.is_compaction_due():
+            AASChange.compact(session)
+        session.commit()
+        return len(changes)
+
+    @staticmethod
+    def positions(session, shards) -> list:
+        """
+        Returns the position of the copy of each shard, 0 for the shards never copied.
+        """
+        seqs = dict(session.execute(select(AASChangeRelay.shard, AASChangeRelay.seq)).all())
+        return [seqs.get(shard, 0) for shard in shards]
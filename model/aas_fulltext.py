@@ -0,0 +1,108 @@
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+class AASFullText:
+    """
+    Full-text index over the id_short and description of the Asset Administration Shells,
+    kept in an SQLite FTS5 table that triggers synchronize with asset_administration_shell.
+    """
+
+    TABLE = "aas_fts"
+
+    # External content table: the index stores only the tokens, the text is read from the AAS table
+    DDL = [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS aas_fts USING fts5(
+            id_short, description, content='asset_administration_shell', content_rowid='pk_aas'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS aas_fts_insert AFTER INSERT ON asset_administration_shell BEGIN
+            INSERT INTO aas_fts(rowid, id_short, description) VALUES (new.pk_aas, new.id_short, new.description);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS aas_fts_delete AFTER DELETE ON asset_administration_shell BEGIN
+            INSERT INTO aas_fts(aas_fts, rowid, id_short, description)
+            VALUES ('delete', old.pk_aas, old.id_short, old.description);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS aas_fts_update AFTER UPDATE OF id_short, description
+        ON asset_administration_shell BEGIN
+            INSERT INTO aas_fts(aas_fts, rowid, id_short, description)
+            VALUES ('delete', old.pk_aas, old.id_short, old.description);
+            INSERT INTO aas_fts(rowid, id_short, description) VALUES (new.pk_aas, new.id_short, new.description);
+        END
+        """,
+    ]
+
+    # Marks around the matched terms in the snippets
+    HIGHLIGHT_START = "<mark>"
+    HIGHLIGHT_END = "</mark>"
+
+    @staticmethod
+    def create(engine) -> bool:
+        """
+        Creates the full-text table and its triggers if they do not exist, and indexes the existing
+        Asset Administration Shells when the table is new.
+        \f
+        :param engine: An engine connected to an SQLite database.
+        :return: False if the SQLite library was built without FTS5.
+        """
+        with engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": AASFullText.TABLE}).first() is not None
+            try:
+                for statement in AASFullText.DDL:
+                    connection.execute(text(statement))
+            except OperationalError:
+                return False
+            if not exists:
+                AASFullText.rebuild(connection)
+        return True
+
+    @staticmethod
+    def rebuild(connection) -> None:
+        """
+        Rebuilds the full-text index from the content of the Asset Administration Shell table.
+        """
+        connection.execute(text("INSERT INTO aas_fts(aas_fts) VALUES ('rebuild')"))
+
+    @staticmethod
+    def to_match_expression(search_text: str) -> str:
+        """
+        Turns free text into an FTS5 query where every word must match, as a word or word prefix.
+        Quoting each word keeps FTS5 operators and punctuation typed by users from being interpreted.
+        """
+        terms = [term.replace('"', '""') for term in search_text.split()]
+        return " ".join(f'"{term}"*' for term in terms)
+
+    @staticmethod
+    def search(session, search_text: str, limit: int) -> List:
+        """
+        Returns the Asset Administration Shells matching the text, best matches first.
+        Each row has the columns of the AAS, its BM25 rank and a highlighted snippet of each indexed field.
+        In a sharded repository, every shard returns its best matches, merged by rank, and the best of
+        them are kept. The ranks are computed from the statistics of each shard.
+        """
+        return session.execute(text("""
+            SELECT aas.pk_aas AS id, aas.aas_id, aas.id_short, aas.asset_kind, aas.global_asset_id,
+                   aas.version, aas.revision, aas.description,
+                   bm25(aas_fts) AS rank,
+                   snippet(aas_fts, 0, :start, :end, '...', 8) AS id_short_snippet,
+                   snippet(aas_fts, 1, :start, :end, '...', 16) AS description_snippet
+            FROM aas_fts JOIN asset_administration_shell AS aas ON aas.pk_aas = aas_fts.rowid
+            WHERE aas_fts MATCH :match
+            ORDER BY rank
+            LIMIT :limit
+        """), {
+            "match": AASFullText.to_match_expression(search_text),
+            "start": AASFullText.HIGHLIGHT_START,
+            "end": AASFullText.HIGHLIGHT_END,
+            "limit": limit,
+        }, execution_options={"fan_out": True, "merge_key": "rank"}).all()[:limit]
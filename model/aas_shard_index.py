@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, Union
+
+from sqlalchemy import Column, String, Integer, delete, insert, select
+from model.base import Base
+from model.asset_administration_shell import AssetAdministrationShell
+
+
+class AASShardIndex(Base):
+    """
+    Represents the entry of an Asset Administration Shell in the index of a sharded repository,
+    kept in the main database while the shells are stored in the shards.
+    The unique constraints enforce aas_id and id_short across all the shards, and the autoincrement
+    key is the primary key of the shell in its shard, so that keys, cursors and ETags stay global.
+    \f
+    :param id: The primary key of the AAS.
+    :param aas_id: The globally unique identification of the AAS.
+    :param id_short: The short name of the AAS, unique across the shards.
+    :param shard: The name of the shard storing the AAS.
+    """
+    __tablename__ = 'aas_shard_index'
+    # AUTOINCREMENT keeps SQLite from handing out the key of a deleted AAS again
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column("pk_aas", Integer, primary_key=True)
+    aas_id = Column(String(2000), unique=True, nullable=False)
+    id_short = Column(String(128), unique=True)
+    shard = Column(String(64), nullable=False)
+
+    @staticmethod
+    def shards_by_aas_id(session, aas_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Returns the shard of each indexed aas_id.
+        """
+        return dict(session.execute(select(AASShardIndex.aas_id, AASShardIndex.shard).where(
+            AASShardIndex.aas_id.in_(list(aas_ids)))).all())
+
+    @staticmethod
+    def shard_of(session, aas_pk: int) -> Union[str, None]:
+        """
+        Returns the shard of an Asset Administration Shell, None if the repository is not sharded.
+        """
+        if getattr(session, "router", None) is None:
+            return None
+        return AASShardIndex.shards_by_pk(session, [aas_pk]).get(aas_pk)
+
+    @staticmethod
+    def shards_by_pk(session, pks: Iterable[int]) -> Dict[int, str]:
+        """
+        Returns the shard of each indexed primary key.
+        """
+        return dict(session.execute(select(AASShardIndex.id, AASShardIndex.shard).where(
+            AASShardIndex.id.in_(list(pks)))).all())
+
+    @staticmethod
+    def rebuild(index_connection, shard_connections: Dict[str, object]) -> int:
+        """
+        Rebuilds the index from the content of the shards, e.g. after restoring a shard from a backup
+        or after a crash between the commits of the index and of a shard.
+        \f
+        :param index_connection: A connection to the main database, in a transaction.
+        :param shard_connections: A connection to each shard, by shard name.
+        :return: The number of indexed Asset Administration Shells.
+        """
+        index_connection.execute(delete(AASShardIndex))
+        count = 0
+        for shard, connection in shard_connections.items():
+            rows = connection.execute(select(AssetAdministrationShell.id, AssetAdministrationShell.aas_id,
+                                             AssetAdministrationShell.id_short)).all()
+            if rows:
+                index_connection.execute(insert(AASShardIndex.__table__), [
+                    {"pk_aas": pk, "aas_id": aas_id, "id_short": id_short, "shard": shard}
+                    for pk, aas_id, id_short in rows
+                ])
+            count += len(rows)
+        return count
@@ -1,7 +1,8 @@
 from datetime import datetime
 import enum
 from typing import Union, Any
-from sqlalchemy import Column, String, Enum, DateTime, Integer
+from sqlalchemy import Column, String, Enum, DateTime, Integer, Index
+from sqlalchemy.orm import relationship
 from model.base import Base
 
 
@@ -36,8 +37,21 @@ class AssetAdministrationShell(Base):
     :param revision: Revision of the element (optional).
     :param description: Description or comments on the element (optional).
     :param creation_date: Creation date of the Asset Administration Shell (optional).
+    :param submodels: The Submodels of the AAS, loaded on first access unless they were eager loaded.
+    :param row_version: Counter incremented on every update, used to build the ETag of the AAS.
     """
     __tablename__ = 'asset_administration_shell'
+    # AUTOINCREMENT prevents SQLite from reusing the primary key of deleted rows,
+    # which would make a new AAS share cursors and ETags with a deleted one.
+    # The indexes serve the filters of GET /aas/filter; the id_short prefix filter uses its unique index.
+    # ix_aas_asset_kind keeps the rows of a kind in primary key order, so pages need no sort
+    __table_args__ = (
+        Index('ix_aas_global_asset_id', 'global_asset_id'),
+        Index('ix_aas_asset_kind', 'asset_kind'),
+        Index('ix_aas_asset_kind_creation_date', 'asset_kind', 'creation_date'),
+        Index('ix_aas_creation_date', 'creation_date'),
+        {'sqlite_autoincrement': True},
+    )
 
     id = Column("pk_aas", Integer, primary_key=True)
     aas_id = Column(String(2000), unique=True)
@@ -48,6 +62,14 @@ class AssetAdministrationShell(Base):
     revision = Column(String(4))
     description = Column(String(1023))
     creation_date = Column(DateTime, default=datetime.now())
+    row_version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": row_version}
+
+    # Lazy by default, eager loaded by the routes with SubmodelService.load_options. Read-only, since the
+    # Submodels are written by their own routes
+    submodels = relationship("Submodel", primaryjoin="AssetAdministrationShell.id == foreign(Submodel.aas_pk)",
+                             order_by="Submodel.id", lazy="select", viewonly=True)
 
     def __init__(
             self,
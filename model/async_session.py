@@ -0,0 +1,57 @@
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+# The database and its tables are set up with the synchronous engine, see model.setup_database
+from model import db_url, shard_urls, shard_router, pool_size, max_overflow, pool_timeout, sqlite_busy_timeout, \
+    set_sqlite_pragmas, start_query_timer, record_query_time, record_failed_query_time
+
+# Async drivers for the databases supported by the synchronous engine
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def create_async_db_engine(url: str):
+    """
+    Creates the async engine of a database, with the same settings and metrics as the synchronous engine.
+    """
+    scheme, _, rest = url.partition("://")
+    async_url = f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+    if url.startswith("sqlite"):
+        # aiosqlite opens a new connection (and thread) per session by default, the pool keeps them open
+        new_engine = create_async_engine(async_url, echo=False, poolclass=AsyncAdaptedQueuePool,
+                                         pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+                                         connect_args={"timeout": sqlite_busy_timeout / 1000})
+
+        # Applies the same SQLite settings as the synchronous engine to every new connection
+        event.listen(new_engine.sync_engine, "connect", set_sqlite_pragmas)
+    else:
+        new_engine = create_async_engine(async_url, echo=False, pool_size=pool_size,
+                                         max_overflow=max_overflow, pool_timeout=pool_timeout, pool_pre_ping=True)
+
+    # Queries of the async engine count in the request metrics like those of the synchronous engine
+    event.listen(new_engine.sync_engine, "before_cursor_execute", start_query_timer)
+    event.listen(new_engine.sync_engine, "after_cursor_execute", record_query_time)
+    event.listen(new_engine.sync_engine, "handle_error", record_failed_query_time)
+    return new_engine
+
+
+async_engine = create_async_db_engine(db_url)
+
+# Async session maker bound to the async engine. Objects stay usable after commit,
+# since lazy loading is not available outside the event loop's awaits
+if shard_urls:
+    from model.sharding import AASShardedSession, INDEX_SHARD
+
+    # The synchronous session run by run_sync routes the statements like the sessions of the Flask application
+    async_shard_engines = {name: create_async_db_engine(url) for name, url in shard_urls.items()}
+    AsyncSession = async_sessionmaker(expire_on_commit=False, sync_session_class=AASShardedSession,
+                                      router=shard_router, shards={
+                                          INDEX_SHARD: async_engine.sync_engine,
+                                          **{name: shard_engine.sync_engine
+                                             for name, shard_engine in async_shard_engines.items()}})
+else:
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
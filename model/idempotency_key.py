@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import os
+import time
+from typing import Union
+
+from sqlalchemy import Column, String, DateTime, Integer, LargeBinary, Index, delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from model.base import Base
+
+
+class IdempotencyKey(Base):
+    """
+    Represents the Idempotency-Key of a write request, with the response to replay when the request
+    is retried, e.g. by a gateway on a flaky network.
+    \f
+    :param key: The Idempotency-Key header sent by the client.
+    :param fingerprint: Hash of the method, path, query string and body of the first request.
+    :param status_code: The status code of the response, None while the first request is running.
+    :param content_type: The Content-Type of the response.
+    :param etag: The ETag of the response, without quotes, if any.
+    :param body: The uncompressed body of the response.
+    :param created_at: Date of the first request, used to expire the key.
+    """
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        Index('ix_idempotency_key_created_at', 'created_at'),
+    )
+
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer)
+    content_type = Column(String(255))
+    etag = Column(String(255))
+    body = Column(LargeBinary)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    # Keys older than the time to live, in seconds, are forgotten and may be reused
+    ttl = float(os.environ.get("AAS_IDEMPOTENCY_TTL", 24 * 3600))
+
+    # Time, in seconds, after which a key whose request never completed (e.g. a crashed worker)
+    # may be taken over by a retry
+    lock_timeout = float(os.environ.get("AAS_IDEMPOTENCY_LOCK_TIMEOUT", 60))
+
+    # Minimum time, in seconds, between two purges of the expired keys run by the writes
+    purge_interval = float(os.environ.get("AAS_IDEMPOTENCY_PURGE_INTERVAL", 3600))
+    last_purge = 0.0
+
+    @staticmethod
+    def reserve(session, key: str, fingerprint: str) -> Union["IdempotencyKey", None]:
+        """
+        Reserves a key for a request about to run, unless another request already used it.
+        The reservation is committed, so that concurrent retries see it.
+        \f
+        :return: None if the key was reserved, otherwise the entry of the other request, completed or running.
+        """
+        if time.monotonic() - IdempotencyKey.last_purge >= IdempotencyKey.purge_interval:
+            IdempotencyKey.purge(session)
+
+        now = datetime.now()
+        try:
+            # The primary key lets a single request reserve the key, even across workers
+            session.execute(insert(IdempotencyKey).values(key=key, fingerprint=fingerprint, created_at=now))
+            session.commit()
+            return None
+        except IntegrityError:
+            session.rollback()
+
+        entry = session.get(IdempotencyKey, key)
+        if entry is None:
+            # Removed in between, e.g. released after a server error
+            return IdempotencyKey.reserve(session, key, fingerprint)
+        expired = entry.created_at < now - timedelta(seconds=IdempotencyKey.ttl)
+        abandoned = entry.status_code is None and entry.created_at < now - timedelta(
+            seconds=IdempotencyKey.lock_timeout)
+        if not expired and not abandoned:
+            return entry
+
+        # Takes over the key, unless another retry did it first
+        result = session.execute(update(IdempotencyKey).where(
+            IdempotencyKey.key == key, IdempotencyKey.created_at == entry.created_at).values(
+            fingerprint=fingerprint, status_code=None, content_type=None, etag=None, body=None, created_at=now))
+        session.commit()
+        if result.rowcount == 1:
+            return None
+        session.expire(entry)
+        return session.get(IdempotencyKey, key)
+
+    @staticmethod
+    def complete(session, key: str, status_code: int, body: bytes, content_type: Union[str, None] = None,
+                 etag: Union[str, None] = None) -> None:
+        """
+        Stores the response of a reserved key, replayed to the retries of the request.
+        """
+        session.execute(update(IdempotencyKey).where(IdempotencyKey.key == key).values(
+            status_code=status_code, body=body, content_type=content_type, etag=etag))
+        session.commit()
+
+    @staticmethod
+    def release(session, key: str) -> None:
+        """
+        Removes the reservation of a request that did not complete, e.g. after a server error,
+        so that a retry runs the request again.
+        """
+        session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)))
+        session.commit()
+
+    @staticmethod
+    def purge(session) -> int:
+        """
+        Removes the expired keys.
+        \f
+        :return: The number of removed keys.
+        """
+        IdempotencyKey.last_purge = time.monotonic()
+        cutoff = datetime.now() - timedelta(seconds=IdempotencyKey.ttl)
+        result = session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+        session.commit()
+        return result.rowcount
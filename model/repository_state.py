@@ -0,0 +1,64 @@
+from typing import Union
+
+from sqlalchemy import Column, Integer, select, update
+from model.base import Base
+
+
+class RepositoryState(Base):
+    """
+    Keeps the state of the repository as a whole, in a single row. In a sharded repository, every shard
+    has its own row, stamped by the writes to its Asset Administration Shells, and the row of the main
+    database numbers the change log merged from the shards (see AASChangeRelay).
+    \f
+    :param change_stamp: Counter incremented by every change to the Asset Administration Shells, used to
+        build the ETag of the list and to number the entries of the change log.
+    """
+    __tablename__ = 'repository_state'
+
+    id = Column(Integer, primary_key=True)
+    change_stamp = Column(Integer, nullable=False, default=0)
+
+    @staticmethod
+    def touch(session, count: int = 1, shard: Union[str, None] = None) -> int:
+        """
+        Increments the change stamp. Must be called in the same transaction as the write it stamps.
+        The update locks the row until the transaction ends, so the stamps are handed out in the order
+        of the commits.
+        \f
+        :param count: Number of changes stamped.
+        :param shard: The shard whose stamp is incremented, None for the main database.
+        :return: The new change stamp.
+        """
+        session.execute(
+            update(RepositoryState).where(RepositoryState.id == 1).values(
+                change_stamp=RepositoryState.change_stamp + count),
+            bind_arguments=RepositoryState.bind_arguments(shard))
+        return RepositoryState.get_change_stamp(session, shard)
+
+    @staticmethod
+    def get_change_stamp(session, shard: Union[str, None] = None) -> int:
+        """
+        Returns the current change stamp of the main database, or of a shard.
+        """
+        return session.scalar(
+            select(RepositoryState.change_stamp).where(RepositoryState.id == 1),
+            bind_arguments=RepositoryState.bind_arguments(shard)) or 0
+
+    @staticmethod
+    def get_list_stamp(session) -> int:
+        """
+        Returns the stamp of the list of Asset Administration Shells, used to build its ETag: the change stamp,
+        or in a sharded repository the sum of the change stamps of the shards, which increases with every write
+        without the writes touching the main database.
+        """
+        router = getattr(session, "router", None)
+        if router is None:
+            return RepositoryState.get_change_stamp(session)
+        return sum(RepositoryState.get_change_stamp(session, shard) for shard in router.shards)
+
+    @staticmethod
+    def bind_arguments(shard: Union[str, None]) -> dict:
+        """
+        Returns the bind arguments running a statement on a shard, or on the database of the session.
+        """
+        return {"shard_id": shard} if shard else {}
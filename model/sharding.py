@@ -0,0 +1,439 @@
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from itertools import chain, islice
+from typing import Dict, List, Tuple, Union
+
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.engine.result import IteratorResult
+from sqlalchemy.orm import Session as PlainSession
+from sqlalchemy.ext.horizontal_shard import ShardedSession, set_shard_id
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+from model.aas_shard_index import AASShardIndex
+from model.asset_administration_shell import AssetAdministrationShell
+
+# Name of the main database in the sharded sessions. It holds the shard index, the merged change log
+# and the other tables, while the Asset Administration Shells are stored in the shards, each with
+# its own change log and change stamp
+INDEX_SHARD = "index"
+
+
+def parse_shards(value: str, db_path: str) -> Dict[str, str]:
+    """
+    Returns the URL of each shard configured by AAS_SHARDS: either a number of SQLite files in the
+    database directory, or comma-separated name=url pairs, e.g. to put the shards on other disks.
+    """
+    value = value.strip()
+    if not value:
+        return {}
+    if value.isdigit():
+        return {f"shard{i}": f"sqlite:///{db_path}/shard{i}.sqlite3" for i in range(int(value))}
+
+    shards = {}
+    for pair in value.split(","):
+        name, _, url = pair.strip().partition("=")
+        if not name or not url or name == INDEX_SHARD:
+            raise ValueError(f"Invalid shard '{pair}' in AAS_SHARDS, expected name=url with a name other "
+                             f"than '{INDEX_SHARD}'")
+        shards[name] = url
+    return shards
+
+
+def parse_sites(value: str) -> List[Tuple[str, str]]:
+    """
+    Returns the (aas_id prefix, shard) pairs configured by AAS_SHARD_SITES, as comma-separated prefix=shard pairs.
+    """
+    sites = []
+    for pair in filter(None, (pair.strip() for pair in value.split(","))):
+        prefix, _, shard = pair.rpartition("=")
+        if not prefix or not shard:
+            raise ValueError(f"Invalid site '{pair}' in AAS_SHARD_SITES, expected prefix=shard")
+        sites.append((prefix, shard))
+    return sites
+
+
+class ShardRouter:
+    """
+    Chooses the shard of new Asset Administration Shells: by the site prefix of their aas_id, so that
+    the shells of a plant share a database, and otherwise by a hash of the aas_id, which spreads them evenly.
+    Also runs the queries that fan out to several shards.
+    \f
+    :param shards: The names of the shards.
+    :param sites: The (aas_id prefix, shard) pairs, tried from the longest prefix.
+    """
+
+    def __init__(self, shards: List[str], sites: List[Tuple[str, str]] = ()) -> None:
+        unknown = {shard for _, shard in sites} - set(shards)
+        if unknown:
+            raise ValueError(f"AAS_SHARD_SITES names unknown shards: {', '.join(sorted(unknown))}")
+        self.shards = list(shards)
+        self.sites = sorted(sites, key=lambda site: len(site[0]), reverse=True)
+        self.executor = ThreadPoolExecutor(max_workers=4 * len(self.shards), thread_name_prefix="aas-shard")
+
+    def shard_for(self, aas_id: str) -> str:
+        """
+        Returns the shard where a new Asset Administration Shell is stored.
+        """
+        for prefix, shard in self.sites:
+            if aas_id.startswith(prefix):
+                return shard
+        # crc32 gives the same shard in every process, unlike hash()
+        return self.shards[zlib.crc32(aas_id.encode()) % len(self.shards)]
+
+
+class AASShardedSession(ShardedSession):
+    """
+    Session over a sharded repository, used in place of the plain session when AAS_SHARDS is set.
+    Statements on the Asset Administration Shells go to the shards: lookups by aas_id or primary key
+    to the shard named by the index, and the other queries to every shard in parallel, merging the
+    rows of the shards in primary key order and applying the limit to the merged rows.
+    The statements on the change log and the change stamp run on the shard they are bound to (see
+    AASChange.record_many), and every other statement on the main database.
+    \f
+    Aggregates (count, max) are returned per shard and not combined. Updates by criteria must not
+    change aas_id or id_short, which are only kept in the index by the ORM and by bulk updates by
+    primary key.
+    :param router: The router of the repository, shared by the sessions.
+    """
+
+    def __init__(self, router: ShardRouter, **kwargs) -> None:
+        self.router = router
+        super().__init__(shard_chooser=self.choose_shard, identity_chooser=self.identity_shards,
+                         execute_chooser=self.execute_shards, **kwargs)
+        # Runs before the listener of ShardedSession, which executes the statements bound to one shard
+        event.listen(self, "do_orm_execute", route_aas_statement, retval=True, insert=True)
+
+    def choose_shard(self, mapper, instance, clause=None, **kwargs) -> str:
+        """
+        Returns the shard of a new object: the shard chosen by the router for an AAS, the main database otherwise.
+        """
+        if mapper is None or mapper.class_ is not AssetAdministrationShell:
+            return INDEX_SHARD
+        if instance is None:
+            raise ValueError("The shard of an Asset Administration Shell is chosen from its aas_id")
+        return self.router.shard_for(instance.aas_id)
+
+    def identity_shards(self, mapper, primary_key, **kwargs) -> List[str]:
+        """
+        Returns the shards where an object may be found by its primary key.
+        """
+        if mapper.class_ is not AssetAdministrationShell:
+            return [INDEX_SHARD]
+        return list(AASShardIndex.shards_by_pk(self, primary_key[:1]).values())
+
+    def execute_shards(self, orm_context) -> List[str]:
+        """
+        Returns the shard of the statements that do not involve the Asset Administration Shells.
+        """
+        return [INDEX_SHARD]
+
+    def criteria_shards(self, whereclause) -> List[str]:
+        """
+        Returns the shards a statement must run on: the indexed shards of the aas_id or primary keys
+        it requires, or every shard.
+        """
+        aas_ids = criteria_values(whereclause, "aas_id")
+        if aas_ids is not None:
+            indexed = AASShardIndex.shards_by_aas_id(self, aas_ids)
+            # An aas_id missing from the index is looked up where it would be stored
+            return sorted({indexed.get(aas_id) or self.router.shard_for(aas_id) for aas_id in aas_ids}) or \
+                self.router.shards[:1]
+        pks = criteria_values(whereclause, "pk_aas")
+        if pks is not None:
+            return sorted(set(AASShardIndex.shards_by_pk(self, pks).values())) or self.router.shards[:1]
+        return list(self.router.shards)
+
+
+def criteria_values(whereclause, column_name: str) -> Union[set, None]:
+    """
+    Returns the values a WHERE clause requires of a column of the AAS table, from a `column == value`
+    or `column IN (values)` condition joined by AND to the others, or None if it has no such condition.
+    """
+    if whereclause is None:
+        return None
+    if isinstance(whereclause, BooleanClauseList) and whereclause.operator is operators.and_:
+        clauses = whereclause.clauses
+    else:
+        clauses = [whereclause]
+
+    for clause in clauses:
+        if not isinstance(clause, BinaryExpression) or not isinstance(clause.right, BindParameter):
+            continue
+        column = clause.left
+        if getattr(column, "table", None) is not AssetAdministrationShell.__table__ or column.name != column_name:
+            continue
+        if clause.operator is operators.eq:
+            return {clause.right.value}
+        if clause.operator is operators.in_op:
+            return set(clause.right.value)
+    return None
+
+
+def bound_shard(orm_context) -> Union[str, None]:
+    """
+    Returns the shard a statement is bound to, by the caller or by the ORM when it loads
+    the attributes of an object, as the listener of ShardedSession finds it.
+    """
+    for option in getattr(orm_context.statement, "_with_options", ()):
+        if isinstance(option, set_shard_id):
+            return option.shard_id
+    if orm_context.is_select:
+        options = orm_context.load_options
+    elif orm_context.is_update or orm_context.is_delete:
+        options = orm_context.update_delete_options
+    else:
+        options = None
+    if options is not None and options._identity_token is not None:
+        return options._identity_token
+    return orm_context.execution_options.get("_sa_shard_id") or orm_context.bind_arguments.get("shard_id")
+
+
+def run_on_shard(orm_context, shard: str):
+    """
+    Runs the statement on one shard, the objects it loads being identified as objects of that shard.
+    """
+    orm_context.update_execution_options(identity_token=shard)
+    return orm_context.invoke_statement(bind_arguments={**orm_context.bind_arguments, "shard_id": shard})
+
+
+def route_aas_statement(orm_context):
+    """
+    Listener of the statements run by a sharded session, which routes those on the Asset Administration
+    Shells. The other statements, and those already bound to a shard, are left to ShardedSession.
+    The index is always written before the shards, so that concurrent writes take the locks of the
+    SQLite files in the same order. It is only written when the identifiers of a shell change,
+    so that the other writes lock their shard alone.
+    """
+    is_bulk = orm_context.is_insert or (orm_context.is_update and isinstance(orm_context.parameters, list))
+    shard = bound_shard(orm_context)
+    if shard is not None:
+        # e.g. the change log of a shard, written in the transaction of the write it records
+        return execute_bulk(orm_context.session, shard, orm_context.statement, orm_context.parameters) \
+            if is_bulk else None
+    fan_out = orm_context.execution_options.get("fan_out", False)
+    if not fan_out and not any(mapper.class_ is AssetAdministrationShell for mapper in orm_context.all_mappers):
+        if is_bulk:
+            return execute_bulk(orm_context.session, INDEX_SHARD, orm_context.statement, orm_context.parameters)
+        # Run as is rather than through ShardedSession, whose merged results have no rowcount
+        return run_on_shard(orm_context, INDEX_SHARD)
+
+    session = orm_context.session
+    if orm_context.is_insert:
+        return insert_aas(orm_context)
+    if is_bulk:
+        return update_aas_by_pk(orm_context)
+
+    whereclause = getattr(orm_context.statement, "whereclause", None)
+    if orm_context.is_delete:
+        return delete_aas(orm_context, whereclause)
+
+    shards = session.criteria_shards(whereclause)
+
+    if len(shards) == 1:
+        return run_on_shard(orm_context, shards[0])
+    if orm_context.is_select or fan_out:
+        return select_on_shards(orm_context, shards)
+    results = [run_on_shard(orm_context, shard) for shard in shards]
+    return results[0].merge(*results[1:])
+
+
+def execute_bulk(session, shard: str, statement, parameters):
+    """
+    Runs an insert, or an update by primary key of many rows, on one shard. SQLAlchemy does not run
+    them in a ShardedSession, so they run in a plain session joining the transaction of the shard,
+    which the sharded session commits or rolls back with the others.
+    """
+    connection = session.connection(bind_arguments={"shard_id": shard})
+    with PlainSession(bind=connection) as bulk_session:
+        return bulk_session.execute(statement, parameters)
+
+
+def delete_aas(orm_context, whereclause):
+    """
+    Runs a delete of Asset Administration Shells by criteria on the shards holding the matching shells,
+    after removing them from the index.
+    """
+    session = orm_context.session
+    pks_statement = select(AssetAdministrationShell.id)
+    if whereclause is not None:
+        pks_statement = pks_statement.where(whereclause)
+    pks = session.scalars(pks_statement).all()
+    shards = sorted(set(AASShardIndex.shards_by_pk(session, pks).values())) or session.router.shards[:1]
+    session.execute(delete(AASShardIndex).where(AASShardIndex.id.in_(pks)))
+
+    results = [run_on_shard(orm_context, shard) for shard in shards]
+    return results[0] if len(results) == 1 else results[0].merge(*results[1:])
+
+
+def insert_aas(orm_context):
+    """
+    Runs a bulk insert of Asset Administration Shells: the index allocates their primary keys,
+    rejecting the aas_id and id_short already used in any shard, then each shard inserts its rows.
+    """
+    session = orm_context.session
+    rows = orm_context.parameters
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not rows:
+        raise ValueError("Asset Administration Shells are inserted into a sharded repository with parameters")
+
+    entries = [{"aas_id": row["aas_id"], "id_short": row.get("id_short"),
+                "shard": session.router.shard_for(row["aas_id"])} for row in rows]
+    pks = session.scalars(insert(AASShardIndex).returning(AASShardIndex.id, sort_by_parameter_order=True),
+                          entries).all()
+
+    rows_by_shard = {}
+    for row, entry, pk in zip(rows, entries, pks):
+        rows_by_shard.setdefault(entry["shard"], []).append({**row, "id": pk})
+    results = [execute_bulk(session, shard, orm_context.statement, shard_rows)
+               for shard, shard_rows in rows_by_shard.items()]
+    return results[-1]
+
+
+def update_aas_by_pk(orm_context):
+    """
+    Runs a bulk update of Asset Administration Shells by primary key, updating first the index entries
+    of the shells whose aas_id or id_short changed.
+    """
+    session = orm_context.session
+    rows = orm_context.parameters
+    entries = {entry.id: entry for entry in session.execute(
+        select(AASShardIndex.id, AASShardIndex.aas_id, AASShardIndex.id_short, AASShardIndex.shard).where(
+            AASShardIndex.id.in_([row["id"] for row in rows])))}
+    changed = [
+        {"id": row["id"], **{key: row[key] for key in ("aas_id", "id_short") if key in row}} for row in rows
+        if row["id"] in entries and any(key in row and row[key] != getattr(entries[row["id"]], key)
+                                        for key in ("aas_id", "id_short"))
+    ]
+    if changed:
+        session.execute(update(AASShardIndex), changed)
+
+    rows_by_shard = {}
+    for row in rows:
+        entry = entries.get(row["id"])
+        rows_by_shard.setdefault(entry.shard if entry else session.router.shards[0], []).append(row)
+    results = [execute_bulk(session, shard, orm_context.statement, shard_rows)
+               for shard, shard_rows in rows_by_shard.items()]
+    return results[-1]
+
+
+def select_on_shards(orm_context, shards: List[str]):
+    """
+    Runs a query on several shards and merges their rows by the merge_key execution option,
+    the primary key by default, keeping the limit of the query.
+    Queries of columns run on worker threads, one per shard, while the calling thread runs the first
+    shard through the session. Queries of objects, and the queries of an async session, run one shard
+    after the other, since the session builds the objects, and streamed queries (yield_per) are merged
+    as they are read.
+    """
+    session = orm_context.session
+    statement = orm_context.statement
+    merge_key = orm_context.execution_options.get("merge_key", "id")
+    limit = getattr(statement, "_limit", None)
+
+    streamed = orm_context.is_select and orm_context.load_options._yield_per
+    if orm_context.execution_options.get("yield_per") or streamed:
+        results = [run_on_shard(orm_context, shard) for shard in shards]
+        rows = merge_rows(results, row_key(statement, list(results[0].keys()), merge_key))
+        return merged_result(results[0], islice(rows, limit))
+
+    loads_objects = any(isinstance(description["type"], type)
+                        for description in getattr(statement, "column_descriptions", ()))
+    futures = []
+    connections = [session.connection(bind_arguments={"shard_id": shard}) for shard in shards[1:]]
+    # The connections of the async engines only run in the greenlet of the session, one after the other
+    parallel = not loads_objects and not any(connection.dialect.is_async for connection in connections)
+    if parallel:
+        for connection in connections:
+            # The metrics of the request count the queries of the worker threads
+            futures.append(session.router.executor.submit(
+                copy_context().run, fetch_rows, connection, statement, orm_context.parameters))
+
+    first_result = run_on_shard(orm_context, shards[0])
+    keys = list(first_result.keys())
+    first = first_result.freeze()
+    if loads_objects:
+        other_rows = [run_on_shard(orm_context, shard).freeze().rewrite_rows() for shard in shards[1:]]
+    elif parallel:
+        other_rows = [future.result() for future in futures]
+    else:
+        other_rows = [fetch_rows(connection, statement, orm_context.parameters) for connection in connections]
+
+    rows = merge_rows([first.rewrite_rows()] + other_rows, row_key(statement, keys, merge_key))
+    return first.with_new_rows(list(islice(rows, limit)))()
+
+
+def fetch_rows(connection, statement, parameters) -> List[list]:
+    """
+    Runs a query of columns on the connection of a shard, on a worker thread.
+    """
+    return [list(row) for row in connection.execute(statement, parameters)]
+
+
+def row_key(statement, keys: List[str], merge_key: str):
+    """
+    Returns the function reading the merge key of a row, which is a column of the query or an attribute
+    of the AAS it loads, or None if the rows have no such key and are concatenated.
+    """
+    if merge_key in keys:
+        index = keys.index(merge_key)
+        return lambda row: row[index]
+    descriptions = getattr(statement, "column_descriptions", ())
+    if descriptions and descriptions[0]["type"] is AssetAdministrationShell:
+        return lambda row: getattr(row[0], merge_key)
+    return None
+
+
+def merge_rows(row_lists, key):
+    """
+    Merges the rows of the shards, each already sorted by the key.
+    """
+    if key is None:
+        return chain(*row_lists)
+    return heapq.merge(*row_lists, key=key)
+
+
+def merged_result(first, rows):
+    """
+    Returns a result over merged rows, with the columns and attributes of the result of the first
+    shard, as FrozenResult builds its results.
+    """
+    result = IteratorResult(first._metadata, rows)
+    result._attributes = first._attributes
+    return result
+
+
+@event.listens_for(AASShardedSession, "before_flush")
+def index_aas_writes(session, flush_context, instances) -> None:
+    """
+    Keeps the index in step with the Asset Administration Shells written through the session.
+    New shells get their primary key from the index, whose unique constraints reject an aas_id or
+    id_short used in any shard before the shards are written. Updates leaving both identifiers
+    unchanged do not touch the index.
+    """
+    for aas in session.new:
+        if isinstance(aas, AssetAdministrationShell):
+            entry = {"aas_id": aas.aas_id, "id_short": aas.id_short, "shard": session.router.shard_for(aas.aas_id)}
+            if aas.id is not None:
+                entry["id"] = aas.id
+            aas.id = session.scalars(insert(AASShardIndex).values(**entry).returning(AASShardIndex.id)).one()
+
+    for aas in session.dirty:
+        if isinstance(aas, AssetAdministrationShell) and identifiers_changed(aas):
+            session.execute(update(AASShardIndex).where(AASShardIndex.id == aas.id).values(
+                aas_id=aas.aas_id, id_short=aas.id_short))
+
+    for aas in session.deleted:
+        if isinstance(aas, AssetAdministrationShell):
+            session.execute(delete(AASShardIndex).where(AASShardIndex.id == inspect(aas).identity[0]))
+
+
+def identifiers_changed(aas: AssetAdministrationShell) -> bool:
+    """
+    Tells whether the pending changes of a shell modify its aas_id or id_short, which the index holds.
+    """
+    attributes = inspect(aas).attrs
+    return attributes.aas_id.history.has_changes() or attributes.id_short.history.has_changes()
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, String, Integer, Index
+from sqlalchemy.orm import relationship
+from model.base import Base
+
+
+class Submodel(Base):
+    """
+    Represents a Submodel of an Asset Administration Shell, holding a tree of Submodel Elements.
+    \f
+    :param aas_pk: The primary key of the AAS the Submodel belongs to.
+    :param submodel_id: The globally unique identification of the Submodel.
+    :param id_short: A short name of the Submodel, unique within its AAS.
+    :param semantic_id: Identifier of the semantic definition of the Submodel (optional).
+    :param description: Description or comments on the Submodel (optional).
+    """
+    __tablename__ = 'submodel'
+    # The Submodels of a page of AAS are read with a single range scan of ix_submodel_aas_pk per AAS
+    __table_args__ = (
+        Index('ix_submodel_aas_pk', 'aas_pk', 'id_short', unique=True),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = Column("pk_submodel", Integer, primary_key=True)
+    # No foreign key: in a sharded repository the Submodels are kept in the main database, apart from their AAS
+    aas_pk = Column(Integer, nullable=False)
+    submodel_id = Column(String(2000), unique=True, nullable=False)
+    id_short = Column(String(128), nullable=False)
+    semantic_id = Column(String(2000))
+    description = Column(String(1023))
+
+    # Lazy by default, eager loaded by the routes with SubmodelService.load_options. Read-only, since the
+    # elements are written with bulk inserts
+    elements = relationship("SubmodelElement", order_by="SubmodelElement.path", lazy="select", viewonly=True)
@@ -0,0 +1,66 @@
+import enum
+
+from sqlalchemy import Column, String, Enum, Integer, ForeignKey, Index
+from model.base import Base
+
+
+class SubmodelElementType(enum.Enum):
+    """
+    Enumeration of the kinds of Submodel Elements. Only collections and lists have child elements.
+    """
+    PROPERTY = "Property"
+    MULTI_LANGUAGE_PROPERTY = "MultiLanguageProperty"
+    RANGE = "Range"
+    FILE = "File"
+    REFERENCE_ELEMENT = "ReferenceElement"
+    SUBMODEL_ELEMENT_COLLECTION = "SubmodelElementCollection"
+    SUBMODEL_ELEMENT_LIST = "SubmodelElementList"
+
+
+class SubmodelElement(Base):
+    """
+    Represents an element of the tree of a Submodel. The tree is stored as a materialized path:
+    each element keeps the positions of its ancestors and its own, so that the rows of a Submodel,
+    or of a subtree, sorted by path are the tree in depth-first order and are read with a single
+    range scan of ix_submodel_element_path.
+    \f
+    :param submodel_pk: The primary key of the Submodel the element belongs to.
+    :param path: The position of the element and of its ancestors, e.g. '0002.0000.' for the first
+        child of the third element of the Submodel.
+    :param depth: The number of positions of the path, 1 for the elements at the root of the Submodel.
+    :param id_short: A short name of the element, unique among its siblings.
+    :param model_type: The kind of the element.
+    :param value_type: The data type of the value, e.g. 'xs:string' (optional).
+    :param value: The value of the element, as a string (optional).
+    """
+    __tablename__ = 'submodel_element'
+    __table_args__ = (
+        Index('ix_submodel_element_path', 'submodel_pk', 'path', unique=True),
+        {'sqlite_autoincrement': True},
+    )
+
+    # Width of a position in the path, which sorts the siblings in order and limits their number
+    POSITION_WIDTH = 4
+
+    id = Column("pk_submodel_element", Integer, primary_key=True)
+    submodel_pk = Column(Integer, ForeignKey("submodel.pk_submodel"), nullable=False)
+    path = Column(String(255), nullable=False)
+    depth = Column(Integer, nullable=False)
+    id_short = Column(String(128), nullable=False)
+    model_type = Column(Enum(SubmodelElementType, name='submodel_element_type_enum'), nullable=False)
+    value_type = Column(String(64))
+    value = Column(String(2000))
+
+    @staticmethod
+    def child_path(parent_path: str, position: int) -> str:
+        """
+        Returns the path of the child at the given position of an element, or of the Submodel for ''.
+        """
+        return f"{parent_path}{position:0{SubmodelElement.POSITION_WIDTH}d}."
+
+    @staticmethod
+    def parent_path(path: str) -> str:
+        """
+        Returns the path of the parent of an element, '' for the elements at the root of the Submodel.
+        """
+        return path[:-(SubmodelElement.POSITION_WIDTH + 1)]
@@ -1,10 +1,14 @@
+import enum
 from datetime import datetime
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
-from pydantic import BaseModel, Field, validator, field_validator
+from pydantic import BaseModel, ConfigDict, Field, validator, field_validator
 
 from model import AssetAdministrationShell
+from model.aas_change import AASChange
 from model.asset_administration_shell import AssetKind, DefineModelType
+from model.submodel import Submodel
+from model.submodel_element import SubmodelElement, SubmodelElementType
 
 
 class AASSchema(BaseModel):
@@ -49,6 +53,109 @@ class AASSearchSchema(BaseModel):
                         description="The Asset Administration Shell’s unique id (UTF8-BASE64-URL-encoded).")
 
 
+# Fields of the representation of an AAS, in the order of show_aas
+AAS_VIEW_FIELDS = ("id", "aas_id", "id_short", "asset_kind", "global_asset_id", "version", "revision", "description")
+
+
+class AASFieldsQuerySchema(BaseModel):
+    """
+    Defines the sparse fieldset of the read endpoints: only the listed fields are read from the database
+    and returned.
+    """
+    fields: Optional[str] = Field(None,
+                                  description="Comma-separated fields to return, e.g. 'aas_id,id_short', among "
+                                              f"{', '.join(AAS_VIEW_FIELDS)}. All fields by default")
+
+    @field_validator("fields")
+    @classmethod
+    def check_fields(cls, v: Optional[str]) -> Optional[str]:
+        """
+        Rejects unknown fields, and normalizes the fieldset to the order of show_aas.
+        Selecting every field is the same as not selecting any.
+        """
+        if v is None:
+            return None
+        names = {name.strip() for name in v.split(",") if name.strip()}
+        unknown = names.difference(AAS_VIEW_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        if not names:
+            raise ValueError("At least one field is required")
+        if len(names) == len(AAS_VIEW_FIELDS):
+            return None
+        return ",".join(name for name in AAS_VIEW_FIELDS if name in names)
+
+
+# Deepest level of the representation of an AAS: its Submodels, then the levels of their element trees
+AAS_MAX_DEPTH = 32
+
+
+class AASDepthQuerySchema(BaseModel):
+    """
+    Defines how deep the representation of an Asset Administration Shell goes into its Submodels.
+    Each level is read with a single query for the whole page.
+    """
+    depth: int = Field(0, ge=0, le=AAS_MAX_DEPTH,
+                       description="0 returns the AAS only, 1 adds its Submodels, and each further level adds "
+                                   "a level of their Submodel Elements")
+
+
+class AASViewQuerySchema(AASSearchSchema, AASFieldsQuerySchema, AASDepthQuerySchema):
+    """
+    Defines the parameters used to read an Asset Administration Shell: its encoded ID, the fields to return
+    and the depth of its Submodels.
+    """
+
+
+class StreamFormat(enum.Enum):
+    """
+    Defines the formats in which the list of Asset Administration Shells can be streamed.
+    \f
+    :param NDJSON: One JSON document per line (application/x-ndjson).
+    :param JSON: A single JSON document sent in chunks, with the same shape as the non-streamed list.
+    """
+    NDJSON = "ndjson"
+    JSON = "json"
+
+
+class AASListQuerySchema(AASFieldsQuerySchema, AASDepthQuerySchema):
+    """
+    Defines the optional parameters used to paginate or stream the list of Asset Administration Shells.
+    Without any of them, the whole list is returned at once.
+    """
+    limit: Optional[int] = Field(None, ge=1, le=1000,
+                                 description="Maximum number of Asset Administration Shells in the page")
+    cursor: Optional[int] = Field(None, ge=0,
+                                  description="Returns only Asset Administration Shells after this cursor "
+                                              "(the 'next_cursor' of the previous page)")
+    stream: Optional[StreamFormat] = Field(None,
+                                           description="Streams the list as 'ndjson' or chunked 'json' "
+                                                       "instead of building it in memory")
+
+
+class AASFilterSchema(AASDepthQuerySchema):
+    """
+    Defines the filters used to search Asset Administration Shells. All given filters must match.
+    """
+    global_asset_id: Optional[str] = Field(None, description="Global identifier of the asset")
+    asset_kind: Optional[AssetKind] = Field(None, description="Kind of the asset, 'Type' or 'Instance'")
+    created_after: Optional[datetime] = Field(None, description="Returns only AAS created at or after this date")
+    created_before: Optional[datetime] = Field(None, description="Returns only AAS created before this date")
+    id_short_prefix: Optional[str] = Field(None, min_length=1, description="Beginning of the id_short")
+    limit: int = Field(100, ge=1, le=1000, description="Maximum number of Asset Administration Shells in the page")
+    cursor: Optional[int] = Field(None, ge=0,
+                                  description="Returns only Asset Administration Shells after this cursor "
+                                              "(the 'next_cursor' of the previous page)")
+
+
+class AASTextSearchSchema(BaseModel):
+    """
+    Defines the parameters of a full-text search over the id_short and description of the AAS.
+    """
+    q: str = Field(..., min_length=1, description="Words to search for; every word must match, as a word or prefix")
+    limit: int = Field(20, ge=1, le=100, description="Maximum number of results")
+
+
 class AASViewSchema(BaseModel):
     id: int = 1
     aas_id: str = "something_10293DWSds"
@@ -68,6 +175,95 @@ class AASListSchema(BaseModel):
     list_aas: List[AASViewSchema]
 
 
+class AASListPageSchema(BaseModel):
+    """
+    Defines how a page of Asset Administration Shells will be returned.
+    """
+    list_aas: List[AASViewSchema]
+    next_cursor: Optional[int] = None
+
+
+class AASSnippetsSchema(BaseModel):
+    """
+    Defines the highlighted excerpts of the fields matched by a full-text search.
+    """
+    id_short: str
+    description: Optional[str]
+
+
+class AASTextSearchResultSchema(AASViewSchema):
+    """
+    Defines how an Asset Administration Shell found by a full-text search will be returned.
+    """
+    rank: float
+    snippets: AASSnippetsSchema
+
+
+class AASTextSearchListSchema(BaseModel):
+    """
+    Defines how the results of a full-text search will be returned, best matches first.
+    """
+    list_aas: List[AASTextSearchResultSchema]
+
+
+# Kinds of Submodel Elements which have child elements
+SUBMODEL_ELEMENT_CONTAINERS = (SubmodelElementType.SUBMODEL_ELEMENT_COLLECTION,
+                               SubmodelElementType.SUBMODEL_ELEMENT_LIST)
+
+
+class SubmodelElementSchema(BaseModel):
+    """
+    Defines the structure of a Submodel Element and of its child elements.
+    """
+    # model_type is the name of the field in the AAS metamodel, not a pydantic attribute
+    model_config = ConfigDict(protected_namespaces=())
+
+    id_short: str = Field(..., min_length=1, max_length=128, description="Short name, unique among the siblings")
+    model_type: SubmodelElementType = Field(SubmodelElementType.PROPERTY, description="Kind of the element")
+    value_type: Optional[str] = Field(None, max_length=64, description="Data type of the value, e.g. 'xs:string'")
+    value: Optional[str] = Field(None, max_length=2000, description="Value of the element, as a string")
+    elements: List["SubmodelElementSchema"] = Field(
+        [], max_length=10 ** SubmodelElement.POSITION_WIDTH,
+        description="Child elements, only for SubmodelElementCollection and SubmodelElementList")
+
+    @field_validator("elements")
+    @classmethod
+    def check_elements(cls, v: list, info) -> list:
+        """
+        Rejects child elements of the kinds of elements which cannot have any.
+        """
+        if v and info.data.get("model_type") not in SUBMODEL_ELEMENT_CONTAINERS:
+            raise ValueError("Only SubmodelElementCollection and SubmodelElementList elements have child elements")
+        return v
+
+
+class SubmodelSchema(BaseModel):
+    """
+    Defines the structure of a Submodel added to an Asset Administration Shell, with its tree of elements.
+    """
+    submodel_id: str = Field(..., min_length=1, max_length=2000, description="Globally unique id of the Submodel")
+    id_short: str = Field(..., min_length=1, max_length=128, description="Short name, unique within the AAS")
+    semantic_id: Optional[str] = Field(None, max_length=2000, description="Id of the semantic definition")
+    description: Optional[str] = Field(None, max_length=1023, description="Description or comments on the Submodel")
+    elements: List[SubmodelElementSchema] = Field([], max_length=10 ** SubmodelElement.POSITION_WIDTH,
+                                                  description="Elements at the root of the Submodel")
+
+
+class SubmodelSearchSchema(AASSearchSchema):
+    """
+    Defines the parameters used to find a Submodel: the encoded IDs of its AAS and of the Submodel.
+    """
+    submodel_id: str = Field(..., description="The Submodel's unique id (UTF8-BASE64-URL-encoded).")
+
+
+class SubmodelDelSchema(BaseModel):
+    """
+    Defines the structure of the data returned after a Submodel is deleted.
+    """
+    message: str
+    submodel_id: str
+
+
 class AASDelSchema(BaseModel):
     """
     Defines the structure of the data returned after a delete request.
@@ -76,6 +272,208 @@ class AASDelSchema(BaseModel):
     aas_id: str
 
 
+class AASBulkQuerySchema(BaseModel):
+    """
+    Defines the parameters of a bulk request.
+    """
+    upsert: bool = Field(False,
+                         description="Updates the Asset Administration Shells that already exist instead of "
+                                     "reporting them as conflicts")
+
+
+class AASBulkItemResultSchema(BaseModel):
+    """
+    Defines the result of a single item of a bulk request.
+    """
+    index: int
+    aas_id: Optional[str]
+    status: str = "created"
+    message: Optional[str] = None
+
+
+class AASBulkResultSchema(BaseModel):
+    """
+    Defines how the result of a bulk request will be returned.
+    """
+    created: int
+    updated: int
+    conflict: int
+    invalid: int
+    results: List[AASBulkItemResultSchema]
+
+
+class ExportFormat(enum.Enum):
+    """
+    Defines the formats in which the repository can be exported.
+    \f
+    :param NDJSON: One Asset Administration Shell per line (application/x-ndjson).
+    :param GZIP: The NDJSON export compressed with gzip (application/gzip).
+    :param ZIP: An archive with the NDJSON export and a manifest (application/zip).
+    """
+    NDJSON = "ndjson"
+    GZIP = "gzip"
+    ZIP = "zip"
+
+
+class AASExportQuerySchema(BaseModel):
+    """
+    Defines the parameters of an export of the repository.
+    """
+    format: ExportFormat = Field(ExportFormat.NDJSON, description="Format of the export: 'ndjson', 'gzip' or 'zip'")
+
+
+class ImportPolicy(enum.Enum):
+    """
+    Defines what an import does with an Asset Administration Shell that conflicts with an existing one.
+    \f
+    :param SKIP: The Asset Administration Shell is skipped and the import continues.
+    :param OVERWRITE: The existing Asset Administration Shell is replaced, as PUT /aas does.
+    :param FAIL: The import stops before the chunk holding the first conflicting or invalid item.
+    """
+    SKIP = "skip"
+    OVERWRITE = "overwrite"
+    FAIL = "fail"
+
+
+class AASImportQuerySchema(BaseModel):
+    """
+    Defines the parameters of an import into the repository.
+    """
+    policy: ImportPolicy = Field(ImportPolicy.SKIP,
+                                 description="What to do with conflicting Asset Administration Shells: "
+                                             "'skip', 'overwrite' or 'fail'")
+
+
+class AASImportSchema(AASSchema):
+    """
+    Defines an Asset Administration Shell of an export. Inherits from AASSchema, adding the creation date.
+    """
+    creation_date: Optional[datetime] = Field(None, description="Creation date of the exported element")
+
+
+class AASImportResultSchema(BaseModel):
+    """
+    Defines how the result of an import will be returned. Only the first errors are listed,
+    so that the response does not grow with the size of the import.
+    """
+    created: int
+    updated: int
+    skipped: int
+    invalid: int
+    completed: bool
+    errors: List[AASBulkItemResultSchema]
+
+
+class AASChangeQuerySchema(BaseModel):
+    """
+    Defines the parameters used to read the change log.
+    """
+    since: int = Field(0, ge=0, description="Returns the changes after this seq (the 'last_seq' of the previous call)")
+    limit: int = Field(100, ge=1, le=1000, description="Maximum number of changes returned")
+
+
+class AASChangeStreamQuerySchema(BaseModel):
+    """
+    Defines the parameters used to stream the change log as Server-Sent Events.
+    """
+    since: Optional[int] = Field(None, ge=0,
+                                 description="Streams the changes after this seq. Without it, the Last-Event-ID "
+                                             "header is used, and without both only new changes are streamed")
+
+
+class AASChangeSchema(BaseModel):
+    """
+    Defines how a change of an Asset Administration Shell will be returned.
+    """
+    seq: int
+    operation: str
+    aas_id: str
+    previous_aas_id: Optional[str] = None
+    row_version: Optional[int] = None
+    changed_at: str
+
+
+class AASChangeListSchema(BaseModel):
+    """
+    Defines how a page of the change log will be returned.
+    """
+    changes: List[AASChangeSchema]
+    last_seq: int
+    has_more: bool
+
+
+class AASChangesCompactedSchema(BaseModel):
+    """
+    Defines the error returned when the requested changes were removed from the log. Clients then reload
+    the whole list and continue from 'last_seq'.
+    """
+    message: str
+    last_seq: int
+
+
+class AASCacheStatsSchema(BaseModel):
+    """
+    Defines how the counters of the Asset Administration Shell cache will be returned.
+    """
+    enabled: bool
+    hits: int
+    misses: int
+    size: Optional[int] = None
+    max_size: Optional[int] = None
+    ttl: Optional[float] = None
+    evictions: Optional[int] = None
+
+
+# Dimensions of the aggregates of GET /aas/stats, computed from the columnar snapshot
+AAS_STATS_DIMENSIONS = ("asset_kind", "version", "revision", "creation_year", "creation_month")
+
+
+class AASStatsQuerySchema(BaseModel):
+    """
+    Defines the parameters used to read the statistics of the Asset Administration Shells.
+    """
+    group_by: Optional[str] = Field(None,
+                                    description="Comma-separated dimensions to count the AAS by, e.g. "
+                                                f"'asset_kind,version', among {', '.join(AAS_STATS_DIMENSIONS)}")
+
+    @field_validator("group_by")
+    @classmethod
+    def check_group_by(cls, v: Optional[str]) -> Optional[str]:
+        """
+        Rejects unknown dimensions, and normalizes them to the order of AAS_STATS_DIMENSIONS.
+        """
+        if v is None:
+            return None
+        names = {name.strip() for name in v.split(",") if name.strip()}
+        unknown = names.difference(AAS_STATS_DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown dimensions: {', '.join(sorted(unknown))}")
+        if not names:
+            raise ValueError("At least one dimension is required")
+        return ",".join(name for name in AAS_STATS_DIMENSIONS if name in names)
+
+
+class AASStatsBucketSchema(BaseModel):
+    """
+    Defines how the number of Asset Administration Shells with a value of a dimension will be returned.
+    """
+    value: Optional[str] = None
+    count: int
+
+
+class AASStatsSchema(BaseModel):
+    """
+    Defines how the statistics of the Asset Administration Shells will be returned. They are computed from
+    a snapshot which includes the changes up to 'last_seq', refreshed every few seconds.
+    """
+    total: int
+    last_seq: int
+    built_at: str
+    age: float
+    histograms: Dict[str, List[AASStatsBucketSchema]]
+    groups: Optional[List[dict]] = None
+
+
 class IdEncodeDecodeSchema(BaseModel):
     """
     Defines the response schema for encoded and decoded IDs.
@@ -86,6 +484,28 @@ class IdEncodeDecodeSchema(BaseModel):
 
 class ModelTypeSchema(BaseModel):
     type_model: DefineModelType = DefineModelType.aas
+    count: int = Field(1, ge=1, le=1000,
+                       description="Number of IDs to generate, returned as a list when greater than 1")
+
+
+class IdBatchItemResultSchema(BaseModel):
+    """
+    Defines the result of a single ID of a batch conversion.
+    """
+    index: int
+    status: str = "converted"
+    encode_aas_id: Optional[str] = None
+    decode_aas_id: Optional[str] = None
+    message: Optional[str] = None
+
+
+class IdBatchResultSchema(BaseModel):
+    """
+    Defines how the result of a batch conversion of IDs will be returned.
+    """
+    converted: int
+    invalid: int
+    results: List[IdBatchItemResultSchema]
 
 
 def show_encode_decode_ids(ids: IdEncodeDecodeSchema):
@@ -98,6 +518,73 @@ def show_encode_decode_ids(ids: IdEncodeDecodeSchema):
     }
 
 
+def show_aas_change(change: AASChange):
+    """
+    Returns a representation of a change following the schema defined in AASChangeSchema.
+    """
+    return {
+        "seq": change.seq,
+        "operation": change.operation.value,
+        "aas_id": change.aas_id,
+        "previous_aas_id": change.previous_aas_id,
+        "row_version": change.row_version,
+        "changed_at": change.changed_at.isoformat(),
+    }
+
+
+def selected_fields(fields: Optional[str]) -> Optional[tuple]:
+    """
+    Returns the names of a fieldset validated by AASFieldsQuerySchema, or None for all fields.
+    """
+    return tuple(fields.split(",")) if fields else None
+
+
+def show_submodel(submodel: Submodel, depth: int):
+    """
+    Returns a representation of a Submodel with the levels of its element tree up to the given depth,
+    following the schema defined in SubmodelSchema. The elements are left out for a depth of 0.
+    """
+    submodel_view = {
+        "submodel_id": submodel.submodel_id,
+        "id_short": submodel.id_short,
+        "semantic_id": submodel.semantic_id,
+        "description": submodel.description,
+    }
+    if depth > 0:
+        submodel_view["elements"] = show_submodel_elements(submodel.elements, depth)
+    return submodel_view
+
+
+def show_submodel_elements(elements: List[SubmodelElement], depth: int) -> list:
+    """
+    Returns the tree of the Submodel Elements up to the given depth, from the elements sorted by path.
+    The children of the containers at the last level are left out.
+    """
+    roots = []
+    children = {"": roots}
+    for element in elements:
+        siblings = children.get(SubmodelElement.parent_path(element.path))
+        if element.depth > depth or siblings is None:
+            continue
+        element_view = {
+            "id_short": element.id_short,
+            "model_type": element.model_type.value,
+            "value_type": element.value_type,
+            "value": element.value,
+        }
+        if element.model_type in SUBMODEL_ELEMENT_CONTAINERS and element.depth < depth:
+            element_view["elements"] = children[element.path] = []
+        siblings.append(element_view)
+    return roots
+
+
+def selected_dimensions(group_by: Optional[str]) -> tuple:
+    """
+    Returns the names of the dimensions validated by AASStatsQuerySchema, or an empty tuple for none.
+    """
+    return tuple(group_by.split(",")) if group_by else ()
+
+
 def show_aas(aas: AssetAdministrationShell):
     """
     Returns a representation of the AAS following the schema defined in AASSchema.
@@ -132,3 +619,59 @@ def show_aas_list(aas_list: List[AssetAdministrationShell]):
                 "description": aas.description,
             })
     return {"Asset Administration Shells": result}
+
+
+def show_aas_search_results(rows: List) -> dict:
+    """
+    Returns a representation of the results of a full-text search following the schema defined in
+    AASTextSearchListSchema. The asset kind of the rows is the stored enum name.
+    """
+    result = []
+    for row in rows:
+        result.append(
+            {
+                "id": row.id,
+                "aas_id": row.aas_id,
+                "id_short": row.id_short,
+                "asset_kind": AssetKind[row.asset_kind].value,
+                "global_asset_id": row.global_asset_id,
+                "version": row.version,
+                "revision": row.revision,
+                "description": row.description,
+                "rank": row.rank,
+                "snippets": {
+                    "id_short": row.id_short_snippet,
+                    "description": row.description_snippet,
+                },
+            })
+    return {"Asset Administration Shells": result}
+
+
+def check_required_fields(form: Union[AASSchema, AASUpdateSchema]):
+    """
+    Checks if the required fields 'aas_id', 'id_short', and 'global_asset_id' are not empty or whitespace only.
+    Returns True if all required fields are valid, otherwise False.
+    """
+    required_fields = ['aas_id', 'id_short', 'global_asset_id']
+
+    for field in required_fields:
+        value = getattr(form, field)
+        if not value:
+            return False
+
+    return True
+
+
+def strip_whitespace(form: Union[AASSchema, AASUpdateSchema]):
+    """
+    Strip leading and trailing whitespace from all relevant fields in the form.
+    """
+    form.aas_id = form.aas_id.strip()
+    form.id_short = form.id_short.strip()
+    form.global_asset_id = form.global_asset_id.strip()
+    if form.version:
+        form.version = form.version.strip()
+    if form.revision:
+        form.revision = form.revision.strip()
+    if form.description:
+        form.description = form.description.strip()
@@ -0,0 +1,169 @@
+"""
+Fixtures of the test suite: the Flask application on a temporary SQLite database, and its test client.
+
+Run from the root of the repository with:
+    python -m pytest -q
+"""
+import gzip
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The model reads its settings on import, so the database of the tests is chosen first. The optional
+# features are set explicitly, so that the environment of the caller does not change the results
+WORK_DIR = tempfile.mkdtemp(prefix="aas-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/test.sqlite3"
+os.environ["AAS_SNAPSHOT_PATH"] = ""
+os.environ["LOG_PATH"] = os.path.join(WORK_DIR, "log")
+for name in ("AAS_SHARDS", "AAS_SHARD_SITES", "AAS_GROUP_COMMIT", "AAS_RATE_LIMIT", "AAS_RATE_LIMIT_API_KEYS",
+             "AAS_TRUSTED_PROXIES", "AAS_SHED_MAX_IN_FLIGHT", "AAS_SHED_MAX_DB_LATENCY_MS", "AAS_CACHE_ENABLED"):
+    os.environ.pop(name, None)
+
+# AAS_TEST_SHARDS runs the tests on a sharded repository of that many shards, see test_sharding.py
+TEST_SHARDS = int(os.environ.get("AAS_TEST_SHARDS", 0))
+if TEST_SHARDS:
+    os.environ["AAS_SHARDS"] = ",".join(f"shard{i}=sqlite:///{WORK_DIR}/shard{i}.sqlite3" for i in range(TEST_SHARDS))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import create_app
+
+    flask_app = create_app({"CONFIGURE_LOGGING": False})
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class APIResponse:
+    """
+    Response of either application, read the same way by the tests.
+    """
+
+    def __init__(self, status_code: int, headers, content: bytes) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FlaskAPI:
+    """
+    Sends requests to the Flask application.
+    """
+
+    def __init__(self, client) -> None:
+        self.client = client
+
+    def request(self, method: str, url: str, form: dict = None, json_body=None, content: bytes = None,
+                content_type: str = None, headers: dict = None) -> APIResponse:
+        response = self.client.open(url, method=method, data=form if form is not None else content, json=json_body,
+                                    content_type=content_type, headers=headers)
+        content = response.get_data()
+        # Decoded like httpx does for the ASGI application
+        if response.headers.get("Content-Encoding") == "gzip":
+            content = gzip.decompress(content)
+        return APIResponse(response.status_code, response.headers, content)
+
+
+class ASGIAPI:
+    """
+    Sends requests to the ASGI application.
+    """
+
+    def __init__(self, client) -> None:
+        self.client = client
+
+    def request(self, method: str, url: str, form: dict = None, json_body=None, content: bytes = None,
+                content_type: str = None, headers: dict = None) -> APIResponse:
+        headers = dict(headers or {})
+        if content_type:
+            headers["Content-Type"] = content_type
+        response = self.client.request(method, url, data=form, json=json_body, content=content, headers=headers)
+        return APIResponse(response.status_code, response.headers, response.content)
+
+
+@pytest.fixture(scope="session")
+def asgi_client():
+    from starlette.testclient import TestClient
+    import asgi
+
+    # The lifespan, which configures the logging of a server, is not run
+    return TestClient(asgi.app)
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def api(request, client):
+    """
+    Runs the test against each application.
+    """
+    if request.param == "flask":
+        return FlaskAPI(client)
+    return ASGIAPI(request.getfixturevalue("asgi_client"))
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    """
+    Sets up the database, and empties every table of the database and of the shards after each test,
+    but the state of the repository and the positions of the change logs of the shards, and the cache
+    of the process.
+    """
+    from sqlalchemy import inspect
+
+    from model import AASChangeRelay, Base, RepositoryState, create_session, get_engine, setup_database, \
+        shard_engines
+    from utils.aas_cache import aas_cache
+
+    setup_database()
+    yield
+    # The changes of the shards are copied first, so that emptying their logs does not look like a compaction
+    with create_session() as session:
+        AASChangeRelay.relay(session)
+    for engine in [get_engine(), *shard_engines.values()]:
+        with engine.begin() as connection:
+            names = set(inspect(connection).get_table_names())
+            for table in reversed(Base.metadata.sorted_tables):
+                if table.name in names and table not in (RepositoryState.__table__, AASChangeRelay.__table__):
+                    connection.execute(table.delete())
+    aas_cache.clear()
+
+
+@pytest.fixture
+def create_aas(client):
+    """
+    Returns a function creating an Asset Administration Shell numbered n through POST /aas.
+    """
+    def create(n: int, **fields) -> dict:
+        form = {
+            "aas_id": f"https://example.com/ids/aas/{n}",
+            "id_short": f"Asset_{n}",
+            "global_asset_id": f"https://example.com/ids/asset/{n}",
+            **fields,
+        }
+        response = client.post("/aas", data=form)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    return create
+
+
+def encoded(aas_id: str) -> str:
+    """
+    Returns the aas_id encoded as the routes expect it in their query string.
+    """
+    from utils.id_decoder_service import IDDecoderService
+
+    return IDDecoderService.encode_id_or_raise(aas_id)
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from conftest import encoded
+from utils.aas_cache import AASCache, LocalAASCacheBackend, aas_cache
+
+
+def test_local_backend_evicts_least_recently_used():
+    backend = LocalAASCacheBackend(max_size=2, ttl=60)
+    backend.set("a", {"n": 1})
+    backend.set("b", {"n": 2})
+    assert backend.get("a") == {"n": 1}
+
+    backend.set("c", {"n": 3})
+
+    assert backend.get("b") is None
+    assert backend.get("a") == {"n": 1}
+    assert backend.get("c") == {"n": 3}
+    assert backend.stats()["evictions"] == 1
+
+
+def test_local_backend_expires_entries(monkeypatch):
+    backend = LocalAASCacheBackend(max_size=10, ttl=5)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    backend.set("a", {"n": 1})
+    assert backend.get("a") == {"n": 1}
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+
+    assert backend.get("a") is None
+    assert backend.stats() == {"size": 0, "max_size": 10, "ttl": 5, "evictions": 1}
+
+
+def test_set_is_skipped_after_a_concurrent_invalidation():
+    cache = AASCache(LocalAASCacheBackend(), enabled=True)
+    generation = cache.generation("a")
+
+    # A write commits and invalidates between the read of the database and the set
+    cache.invalidate("a")
+    cache.set("a", {"n": 1}, generation)
+    assert cache.get("a") is None
+
+    cache.set("a", {"n": 2}, cache.generation("a"))
+    assert cache.get("a") == {"n": 2}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = AASCache(LocalAASCacheBackend())
+    cache.set("a", {"n": 1}, cache.generation("a"))
+
+    assert cache.get("a") is None
+    assert cache.stats()["enabled"] is False
+
+
+@pytest.fixture
+def enabled_cache(monkeypatch):
+    monkeypatch.setattr(aas_cache, "enabled", True)
+    return aas_cache
+
+
+def test_get_aas_is_served_from_the_cache(client, create_aas, enabled_cache):
+    aas = create_aas(1)
+    url = f"/aas?aas_id={encoded(aas['aas_id'])}"
+    hits = enabled_cache.hits
+
+    first = client.get(url)
+    second = client.get(url)
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert enabled_cache.hits == hits + 1
+    assert client.get("/aas/cache").get_json()["hits"] == enabled_cache.hits
+
+
+def test_rename_invalidates_the_previous_aas_id(client, create_aas, enabled_cache):
+    aas = create_aas(1)
+    old_url = f"/aas?aas_id={encoded(aas['aas_id'])}"
+    assert client.get(old_url).status_code == 200
+
+    new_aas_id = "https://example.com/ids/aas/renamed"
+    response = client.put("/aas", data={
+        "aas_id": aas["aas_id"],
+        "update_aas_id": new_aas_id,
+        "id_short": aas["id_short"],
+        "global_asset_id": aas["global_asset_id"],
+    })
+    assert response.status_code == 200, response.get_json()
+
+    assert client.get(old_url).status_code == 404
+    renamed = client.get(f"/aas?aas_id={encoded(new_aas_id)}")
+    assert renamed.status_code == 200
+    assert renamed.get_json()["aas_id"] == new_aas_id
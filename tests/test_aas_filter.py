@@ -0,0 +1,85 @@
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from model import Session, get_engine
+from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+from utils.aas_filter_service import AASFilterService
+
+FILTERS = {
+    "global_asset_id": "global_asset_id=https://example.com/ids/asset/00000042",
+    "asset_kind": "asset_kind=Type",
+    "creation date range": "created_after=2023-01-01T01:00:00&created_before=2023-01-01T02:00:00",
+    "asset_kind and creation date": "asset_kind=Type&created_after=2023-01-01T01:00:00",
+    "id_short prefix": "id_short_prefix=Asset_000001",
+}
+
+
+@pytest.fixture
+def seeded():
+    session = Session()
+    start = datetime(2023, 1, 1)
+    session.execute(insert(AssetAdministrationShell), [
+        {
+            "aas_id": f"https://example.com/ids/aas/{i:08d}",
+            "id_short": f"Asset_{i:08d}",
+            "asset_kind": AssetKind.TYPE if i % 10 == 0 else AssetKind.INSTANCE,
+            "global_asset_id": f"https://example.com/ids/asset/{i:08d}",
+            "creation_date": start + timedelta(minutes=i),
+            "row_version": 1,
+        }
+        for i in range(2000)
+    ])
+    session.commit()
+    Session.remove()
+
+
+@pytest.mark.parametrize("name", FILTERS)
+def test_filters_use_an_index(client, seeded, name):
+    engine = get_engine()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM asset_administration_shell" in statement and "EXPLAIN" not in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(f"/aas/filter?{FILTERS[name]}")
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert response.status_code == 200, response.get_json()
+
+    statement, parameters = statements[-1]
+    with engine.connect() as connection:
+        plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    assert not any(detail.startswith("SCAN asset_administration_shell") for detail in plan), plan
+
+
+def test_id_short_prefix_filter(client, create_aas):
+    for n in (1, 10, 2):
+        create_aas(n)
+
+    response = client.get("/aas/filter?id_short_prefix=Asset_1")
+
+    assert response.status_code == 200, response.get_json()
+    id_shorts = sorted(aas["id_short"] for aas in response.get_json()["Asset Administration Shells"])
+    assert id_shorts == ["Asset_1", "Asset_10"]
+
+
+@pytest.mark.parametrize("prefix, end", [
+    ("Asset_", "Asset`"),
+    ("a" + chr(0xD7FF), "a" + chr(0xE000)),
+    ("a" + chr(sys.maxunicode), "b"),
+    (chr(sys.maxunicode) * 2, None),
+])
+def test_prefix_end(prefix, end):
+    assert AASFilterService.prefix_end(prefix) == end
+
+
+def test_prefix_of_maximal_code_points_is_not_an_error(client):
+    response = client.get(f"/aas/filter?id_short_prefix={chr(sys.maxunicode)}")
+
+    assert response.status_code == 200, response.get_json()
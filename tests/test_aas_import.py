@@ -0,0 +1,69 @@
+import pytest
+
+from model import Session, session_factory
+from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+from schemas.asset_administration_shell import ImportPolicy
+from utils.aas_bulk_service import AASBulkService
+from utils.aas_transfer_service import AASTransferService
+
+
+def item(n: int, **fields) -> dict:
+    return {"aas_id": f"https://example.com/ids/aas/{n}", "id_short": f"Asset_{n}",
+            "global_asset_id": f"https://example.com/ids/asset/{n}", **fields}
+
+
+@pytest.fixture
+def concurrent_create(monkeypatch):
+    """
+    Creates the first AAS of the chunk in another session between the conflict check and the first write,
+    as a concurrent request would.
+    """
+    write_chunk = AASBulkService.write_chunk
+    calls = []
+
+    def write_after_concurrent_create(session, results, to_insert, to_update):
+        if not calls and to_insert:
+            row = to_insert[0][1]
+            with session_factory() as other_session:
+                other_session.add(AssetAdministrationShell(
+                    aas_id=row["aas_id"], id_short=row["id_short"], asset_kind=AssetKind.INSTANCE,
+                    global_asset_id=row["global_asset_id"], description="concurrent"))
+                other_session.commit()
+        calls.append(len(to_insert))
+        return write_chunk(session, results, to_insert, to_update)
+
+    monkeypatch.setattr(AASBulkService, "write_chunk", write_after_concurrent_create)
+    return calls
+
+
+def import_items(policy: ImportPolicy) -> dict:
+    items = [(index, item(n, description="imported")) for index, n in enumerate((1, 2))]
+    result = AASTransferService.import_items(Session(), items, policy, chunk_size=10)
+    Session.remove()
+    return result
+
+
+def test_concurrent_conflict_fails_the_import(concurrent_create):
+    result = import_items(ImportPolicy.FAIL)
+
+    assert result["completed"] is False
+    assert result["created"] == result["skipped"] == 0
+    assert concurrent_create == [2]
+
+
+def test_concurrent_conflict_is_skipped_after_checking_again(concurrent_create):
+    result = import_items(ImportPolicy.SKIP)
+
+    assert result["completed"] is True
+    assert (result["created"], result["skipped"]) == (1, 1)
+    assert concurrent_create == [2, 1]
+
+
+def test_concurrent_conflict_is_overwritten_after_checking_again(concurrent_create):
+    result = import_items(ImportPolicy.OVERWRITE)
+
+    assert result["completed"] is True
+    assert (result["created"], result["updated"]) == (1, 1)
+    with session_factory() as session:
+        descriptions = session.query(AssetAdministrationShell.description).all()
+    assert [description for description, in descriptions] == ["imported", "imported"]
@@ -0,0 +1,60 @@
+import pytest
+from flask import jsonify
+from sqlalchemy import select
+
+from model import create_session
+from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+from schemas.asset_administration_shell import show_aas, show_aas_list
+from utils import aas_serializer
+from utils.aas_serializer import AASSerializer
+from utils.route_response import RouteResponse
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    """
+    Runs the test with orjson, when it is installed, and with the standard library.
+    """
+    if request.param == "orjson" and aas_serializer.orjson is None:
+        pytest.skip("orjson is not installed")
+    if request.param == "json":
+        monkeypatch.setattr(aas_serializer, "orjson", None)
+    return request.param
+
+
+def test_fast_serializer_matches_jsonify(app, encoder):
+    with create_session() as session:
+        session.add_all([
+            AssetAdministrationShell(aas_id="https://example.com/ids/aas/größe", id_short="Pumpe_Größe",
+                                     asset_kind=AssetKind.TYPE, global_asset_id="https://example.com/ids/asset/1",
+                                     description="Förderpumpe – 5 m³/h, \"quoted\" \u007f\U0001F527"),
+            AssetAdministrationShell(aas_id="https://example.com/ids/aas/2", id_short="Asset_2",
+                                     asset_kind=AssetKind.INSTANCE, global_asset_id="https://example.com/ids/asset/2",
+                                     version="1", revision=None, description=None),
+        ])
+        session.commit()
+
+        aas_list = session.scalars(select(AssetAdministrationShell).order_by(AssetAdministrationShell.id)).all()
+        rows = session.execute(select(*AASSerializer.COLUMNS).order_by(AssetAdministrationShell.id)).all()
+        with app.app_context():
+            expected_aas = [jsonify(show_aas(aas)).get_data() for aas in aas_list]
+            expected_list = jsonify(show_aas_list(aas_list)).get_data()
+
+    assert [RouteResponse(view).encode() for view in AASSerializer.show_rows(rows)] == expected_aas
+    assert RouteResponse({"Asset Administration Shells": AASSerializer.show_rows(rows)}).encode() == expected_list
+    assert b"\\u00f6" in expected_list
+
+
+@pytest.mark.parametrize("url", ["/aas_list", "/aas_list?limit=2", "/aas_list?stream=json"])
+def test_fast_serializer_matches_the_orm_path(client, create_aas, monkeypatch, url):
+    create_aas(1, description="Förderpumpe – 5 m³/h, \"quoted\" \u007f\U0001F527")
+    create_aas(2, version="1")
+    create_aas(3)
+
+    monkeypatch.setattr(AASSerializer, "enabled", True)
+    fast = client.get(url).get_data()
+    monkeypatch.setattr(AASSerializer, "enabled", False)
+    orm = client.get(url).get_data()
+
+    assert fast == orm
+    assert b"\\u00f6" in fast
@@ -0,0 +1,98 @@
+import pytest
+
+from conftest import encoded
+from utils.aas_snapshot import AASSnapshot, AASSnapshotService, aas_snapshot
+
+
+@pytest.fixture
+def snapshot_file(tmp_path, monkeypatch):
+    """
+    Keeps the snapshot in a file of the test, updated by the test rather than by the background thread.
+    """
+    path = str(tmp_path / "aas_snapshot.bin")
+    monkeypatch.setattr(aas_snapshot, "path", path)
+    monkeypatch.setattr(aas_snapshot, "snapshot", None)
+    monkeypatch.setattr(aas_snapshot, "_file_mtime", None)
+    monkeypatch.setattr(aas_snapshot, "start", lambda: None)
+    return path
+
+
+def refreshed_stats(client, snapshot_file: str, query: str = "") -> dict:
+    """
+    Applies the change log to the snapshot, and returns the statistics of /aas/stats.
+    """
+    aas_snapshot.refresh()
+    response = client.get(f"/aas/stats{query}")
+    assert response.status_code == 200, response.get_json()
+    stats = response.get_json()
+    assert stats["last_seq"] == AASSnapshot.load(snapshot_file, aas_snapshot.snapshot.source).last_seq
+    return stats
+
+
+def histogram(stats: dict, dimension: str) -> dict:
+    return {entry["value"]: entry["count"] for entry in stats["histograms"][dimension]}
+
+
+def test_stats_follow_the_writes(client, create_aas, snapshot_file):
+    for n in range(1, 9):
+        create_aas(n, version="1")
+    stats = refreshed_stats(client, snapshot_file, "?group_by=asset_kind,version")
+    assert stats["total"] == 8
+    assert histogram(stats, "version") == {"1": 8}
+    assert stats["groups"] == [{"asset_kind": "Instance", "version": "1", "count": 8}]
+
+    # A deleted shell becomes a tombstone of the file
+    assert client.delete(f"/aas?aas_id={encoded('https://example.com/ids/aas/8')}").status_code == 200
+    stats = refreshed_stats(client, snapshot_file)
+    assert stats["total"] == 7
+    assert len(AASSnapshot.load(snapshot_file, aas_snapshot.snapshot.source).columns["pk"]) == 8
+
+    # A renamed shell keeps its row, with its new values
+    response = client.put("/aas", data={"aas_id": "https://example.com/ids/aas/1", "id_short": "Renamed",
+                                        "global_asset_id": "https://example.com/ids/asset/1", "version": "2"})
+    assert response.status_code == 200, response.get_json()
+    stats = refreshed_stats(client, snapshot_file)
+    assert stats["total"] == 7
+    assert histogram(stats, "version") == {"1": 6, "2": 1}
+    assert len(AASSnapshot.load(snapshot_file, aas_snapshot.snapshot.source).columns["pk"]) == 8
+
+    # Past a quarter of tombstones, the file is compacted
+    for n in (6, 7):
+        assert client.delete(f"/aas?aas_id={encoded(f'https://example.com/ids/aas/{n}')}").status_code == 200
+    stats = refreshed_stats(client, snapshot_file)
+    assert stats["total"] == 5
+    assert histogram(stats, "version") == {"1": 4, "2": 1}
+    stored = AASSnapshot.load(snapshot_file, aas_snapshot.snapshot.source)
+    assert list(stored.columns["pk"]) == sorted(stored.columns["pk"])
+    assert len(stored.columns["pk"]) == 5
+    assert all(stored.columns["live"])
+
+    # A new shell is added after the others
+    create_aas(9, version="2")
+    stats = refreshed_stats(client, snapshot_file)
+    assert (stats["total"], histogram(stats, "version")) == (6, {"1": 4, "2": 2})
+
+
+def test_stats_are_read_from_the_snapshot(client, create_aas, snapshot_file):
+    for n in range(1, 5):
+        create_aas(n, version=str(n % 2 + 1), asset_kind="Type" if n == 4 else "Instance")
+    aas_snapshot.refresh()
+
+    stats = client.get("/aas/stats?group_by=asset_kind").get_json()
+    assert stats["total"] == 4
+    assert histogram(stats, "version") == {"1": 2, "2": 2}
+    assert sorted((group["asset_kind"], group["count"]) for group in stats["groups"]) == \
+        [("Instance", 3), ("Type", 1)]
+
+    # The changes are applied to the snapshot, not read again from the table
+    assert client.delete(f"/aas?aas_id={encoded('https://example.com/ids/aas/4')}").status_code == 200
+    aas_snapshot.refresh()
+    stats = client.get("/aas/stats").get_json()
+    assert stats["total"] == 3
+    assert histogram(stats, "asset_kind") == {"Instance": 3}
+
+
+def test_stats_are_unavailable_until_the_snapshot_is_built(client, snapshot_file, monkeypatch):
+    monkeypatch.setattr(AASSnapshotService, "BUILD_TIMEOUT", 0)
+
+    assert client.get("/aas/stats").status_code == 503
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+BENCHMARK = os.path.join(ROOT, "benchmarks", "api_load.py")
+
+
+def run_benchmark(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, BENCHMARK, "--sizes", "20", "--modes", "client", "--requests", "20",
+                           "--concurrency", "2", *args], capture_output=True, text=True)
+
+
+def test_benchmark_reports_every_route_and_flags_regressions(tmp_path):
+    output = tmp_path / "results.json"
+    run = run_benchmark("--output", str(output))
+    assert run.returncode == 0, run.stderr
+
+    results = json.loads(output.read_text())["results"]
+    assert [result["route"] for result in results] == \
+        ["post_aas", "get_aas", "get_aas_list", "put_aas", "delete_aas", "generate_id"]
+    assert all(result["errors"] == 0 for result in results)
+
+    # A baseline ten times faster than the run is a regression
+    for result in results:
+        result["requests_per_second"] *= 10
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": results}))
+    run = run_benchmark("--routes", "get_aas", "--output", str(tmp_path / "run.json"),
+                        "--baseline", str(baseline), "--max-regression", "0.5")
+    assert run.returncode == 1
+    assert "REGRESSION" in run.stdout
@@ -0,0 +1,45 @@
+import threading
+
+from sqlalchemy import func, select
+
+from conftest import encoded
+from model import session_factory
+from model.aas_change import AASChange, ChangeOperation
+
+
+def test_writes_are_numbered_in_order(client, create_aas):
+    aas = create_aas(1)
+    since = client.get("/aas/changes?since=0").get_json()["last_seq"] - 1
+    response = client.put("/aas", data={"aas_id": aas["aas_id"], "id_short": "Renamed",
+                                        "global_asset_id": aas["global_asset_id"]})
+    assert response.status_code == 200, response.get_json()
+    assert client.delete(f"/aas?aas_id={encoded(aas['aas_id'])}").status_code == 200
+
+    changes = client.get(f"/aas/changes?since={since}").get_json()["changes"]
+
+    assert [change["operation"] for change in changes] == ["created", "updated", "deleted"]
+    assert [change["seq"] for change in changes] == list(range(since + 1, since + 4))
+
+
+def test_change_waiting_for_a_commit_holds_back_the_next_seq():
+    with session_factory() as first:
+        AASChange.record(first, ChangeOperation.CREATED, "https://example.com/ids/aas/1", 1)
+        first_seq = first.scalar(select(func.max(AASChange.seq)))
+
+        # The second write waits for the change stamp until the first one commits
+        second_seqs = []
+
+        def write_second():
+            with session_factory() as second:
+                AASChange.record(second, ChangeOperation.CREATED, "https://example.com/ids/aas/2", 1)
+                second.commit()
+                second_seqs.append(second.scalar(select(func.max(AASChange.seq))))
+
+        thread = threading.Thread(target=write_second)
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        first.commit()
+    thread.join()
+
+    assert second_seqs == [first_seq + 1]
@@ -0,0 +1,22 @@
+def test_compact_changes_reports_the_removed_changes(app):
+    result = app.test_cli_runner().invoke(args=["compact-changes"])
+
+    assert result.exit_code == 0, result.output
+    assert result.output == "0 changes removed from the change log\n"
+
+
+def test_rebuild_shard_index_requires_shards(app):
+    result = app.test_cli_runner().invoke(args=["rebuild-shard-index"])
+
+    assert result.exit_code == 0, result.output
+    assert "The repository is not sharded" in result.output
+
+
+def test_write_openapi_spec(app, tmp_path):
+    output = tmp_path / "openapi.json"
+
+    result = app.test_cli_runner().invoke(args=["write-openapi-spec", "--output", str(output)])
+
+    assert result.exit_code == 0, result.output
+    assert result.output == f"OpenAPI specification written to {output}\n"
+    assert output.exists()
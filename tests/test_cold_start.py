@@ -0,0 +1,59 @@
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Same budget as the documented benchmarks/import_time.py --budget-ms 1500
+BUDGET_MS = 1500
+RUNS = 3
+
+spec = importlib.util.spec_from_file_location("import_time", os.path.join(ROOT, "benchmarks", "import_time.py"))
+import_time = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(import_time)
+
+# Imports the application in a new process, and prints what the import set up
+IMPORT_PROBE = """
+import json, os
+import app, logger, model
+print(json.dumps({"engine": model.engine is not None, "logging": logger.logging_configured,
+                  "files": sorted(os.listdir("."))}))
+"""
+
+
+def test_import_has_no_side_effects(tmp_path):
+    env = {**os.environ, "PYTHONPATH": ROOT, "DATABASE_URL": f"sqlite:///{tmp_path}/probe.sqlite3"}
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=tmp_path, env=env, capture_output=True,
+                            text=True, check=True).stdout.strip().splitlines()
+
+    assert json.loads(output[-1]) == {"engine": False, "logging": False, "files": []}
+
+
+def test_precomputed_openapi_spec_is_served(app, tmp_path):
+    from app import create_app
+
+    spec_path = str(tmp_path / "openapi.json")
+    result = app.test_cli_runner().invoke(args=["write-openapi-spec", "--output", spec_path])
+    assert result.exit_code == 0, result.output
+
+    precomputed = create_app({"CONFIGURE_LOGGING": False, "OPENAPI_SPEC_PATH": spec_path})
+    with open(spec_path) as file:
+        assert precomputed.spec_json == json.load(file)["spec"]
+
+    assert precomputed.test_client().get("/openapi/openapi.json").get_json() == \
+        app.test_client().get("/openapi/openapi.json").get_json()
+
+
+def test_cold_start_is_within_budget(tmp_path):
+    spec_path = str(tmp_path / "openapi.json")
+    import_time.write_spec(spec_path)
+
+    runs = [import_time.probe(spec_path) for _ in range(RUNS)]
+
+    assert all(run["status"] == 200 for run in runs)
+    assert all(not run["side_effects"] for run in runs), "Importing the application created files"
+    start_ms = statistics.median(run["import_ms"] + run["create_app_ms"] for run in runs)
+    assert start_ms <= BUDGET_MS, f"Import and create_app took {start_ms:.0f} ms"
@@ -0,0 +1,20 @@
+from sqlalchemy import text
+
+from model import Session, get_engine
+
+
+def test_sqlite_connections_are_configured():
+    engine = get_engine()
+    with engine.connect() as connection:
+        assert connection.scalar(text("PRAGMA journal_mode")) == "wal"
+        assert connection.scalar(text("PRAGMA busy_timeout")) == 5000
+        # NORMAL
+        assert connection.scalar(text("PRAGMA synchronous")) == 1
+
+
+def test_session_is_removed_after_each_request(client, create_aas):
+    create_aas(1)
+    assert client.get("/aas_list").status_code == 200
+
+    assert not Session.registry.has()
+    assert get_engine().pool.checkedout() == 0
@@ -0,0 +1,65 @@
+import fcntl
+import json
+import logging
+import queue
+import random
+
+import pytest
+
+import logger as logger_module
+from logger import DebugSampler, DeferredQueueHandler, JSONFormatter
+
+
+def log_record(level: int, message: str = "message") -> logging.LogRecord:
+    return logging.LogRecord("tests", level, __file__, 1, message, None, None)
+
+
+def test_only_debug_records_are_sampled(monkeypatch):
+    sampler = DebugSampler(0.25)
+
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    assert not sampler.filter(log_record(logging.DEBUG))
+    assert sampler.filter(log_record(logging.INFO))
+
+    monkeypatch.setattr(random, "random", lambda: 0.1)
+    assert sampler.filter(log_record(logging.DEBUG))
+
+
+def test_json_records_are_written_on_one_line():
+    line = JSONFormatter().format(log_record(logging.WARNING, "Größe\nsecond line"))
+
+    assert "\n" not in line
+    entry = json.loads(line)
+    assert (entry["level"], entry["logger"], entry["message"]) == ("WARNING", "tests", "Größe\nsecond line")
+
+
+def test_queued_records_keep_their_exception():
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    test_logger = logging.getLogger("tests.queue")
+    test_logger.addHandler(handler)
+    test_logger.propagate = False
+    try:
+        try:
+            raise ValueError("invalid value")
+        except ValueError:
+            test_logger.exception("Error reading %s", "item")
+    finally:
+        test_logger.removeHandler(handler)
+
+    entry = json.loads(JSONFormatter().format(handler.queue.get_nowait()))
+
+    assert entry["message"] == "Error reading item"
+    assert "ValueError: invalid value" in entry["exception"]
+
+
+def test_log_slot_is_held_until_released(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger_module, "log_path", str(tmp_path))
+    monkeypatch.setattr(logger_module, "log_slot_file", None)
+
+    slot = logger_module.claim_log_slot()
+
+    assert slot == "0"
+    with open(tmp_path / "gunicorn.0.lock", "a") as other_process:
+        with pytest.raises(OSError):
+            fcntl.flock(other_process, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    logger_module.log_slot_file.close()
@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, text
+
+from model import add_sqlite_autoincrement
+
+# The AAS table as created by the first release, without row_version nor AUTOINCREMENT
+FIRST_RELEASE_TABLE = """
+    CREATE TABLE asset_administration_shell (
+        pk_aas INTEGER NOT NULL, aas_id VARCHAR(2000), id_short VARCHAR(128),
+        asset_kind VARCHAR(8) NOT NULL, global_asset_id VARCHAR(2000) NOT NULL, version VARCHAR(4),
+        revision VARCHAR(4), description VARCHAR(1023), creation_date DATETIME,
+        row_version INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (pk_aas), UNIQUE (aas_id), UNIQUE (id_short)
+    )
+"""
+
+
+def insert(connection, n: int) -> int:
+    connection.execute(text("INSERT INTO asset_administration_shell (aas_id, id_short, asset_kind, global_asset_id) "
+                            "VALUES (:aas_id, :id_short, 'INSTANCE', 'https://example.com/ids/asset')"),
+                       {"aas_id": f"https://example.com/ids/aas/{n}", "id_short": f"Asset_{n}"})
+    return connection.scalar(text("SELECT max(pk_aas) FROM asset_administration_shell"))
+
+
+def test_primary_keys_of_deleted_shells_are_not_reused_after_the_migration(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/first_release.sqlite3")
+    with engine.begin() as connection:
+        connection.execute(text(FIRST_RELEASE_TABLE))
+        connection.execute(text("CREATE TABLE submodel (pk_submodel INTEGER PRIMARY KEY, "
+                                "fk_aas INTEGER REFERENCES asset_administration_shell (pk_aas))"))
+        for n in range(1, 4):
+            insert(connection, n)
+
+    add_sqlite_autoincrement(engine)
+    # Already migrated
+    add_sqlite_autoincrement(engine)
+
+    with engine.begin() as connection:
+        assert connection.scalars(text("SELECT id_short FROM asset_administration_shell ORDER BY pk_aas")).all() == \
+            ["Asset_1", "Asset_2", "Asset_3"]
+        connection.execute(text("DELETE FROM asset_administration_shell WHERE pk_aas = 3"))
+        assert insert(connection, 4) == 4
+        # The other tables still refer to the AAS table
+        assert "REFERENCES asset_administration_shell " in connection.scalar(
+            text("SELECT sql FROM sqlite_master WHERE name = 'submodel'"))
+    engine.dispose()
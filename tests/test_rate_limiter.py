@@ -0,0 +1,95 @@
+import ipaddress
+
+import pytest
+
+from conftest import encoded
+from utils.load_shedder import load_shedder
+from utils.rate_limiter import LocalRateLimitBackend, RateLimiter, rate_limiter
+
+
+def limiter(**kwargs) -> RateLimiter:
+    return RateLimiter(LocalRateLimitBackend(max_clients=10), rate=1, **kwargs)
+
+
+def test_unknown_api_keys_are_limited_by_address():
+    rate_limiter = limiter(api_keys=["known"])
+
+    assert rate_limiter.client_key("known", "192.0.2.1") == f"key:{RateLimiter.hash_key('known')}"
+    assert rate_limiter.client_key("made-up", "192.0.2.1") == "ip:192.0.2.1"
+    assert rate_limiter.client_key(None, "192.0.2.1") == "ip:192.0.2.1"
+
+    rate_limiter.set_api_key_validator(lambda api_key: api_key.startswith("valid-"))
+    assert rate_limiter.client_key("valid-1", "192.0.2.1") == f"key:{RateLimiter.hash_key('valid-1')}"
+    assert rate_limiter.client_key("made-up", "192.0.2.1") == "ip:192.0.2.1"
+
+
+def test_forwarded_for_is_only_read_from_trusted_proxies():
+    rate_limiter = limiter(trusted_proxies=[ipaddress.ip_network("10.0.0.0/8")])
+
+    # The client may send its own X-Forwarded-For, the proxies append the addresses of their peers
+    assert rate_limiter.client_key(None, "10.0.0.2", "203.0.113.9, 198.51.100.7, 10.0.0.1") == "ip:198.51.100.7"
+    assert rate_limiter.client_key(None, "192.0.2.1", "198.51.100.7") == "ip:192.0.2.1"
+    assert limiter().client_key(None, "10.0.0.2", "198.51.100.7") == "ip:10.0.0.2"
+
+
+def test_streamed_responses_are_counted_apart(client, create_aas):
+    create_aas(1)
+    in_flight, streams = load_shedder.in_flight, load_shedder.streams
+
+    response = client.get("/aas_list?stream=ndjson")
+    assert (load_shedder.in_flight, load_shedder.streams) == (in_flight, streams + 1)
+    response.get_data()
+    response.close()
+
+    assert (load_shedder.in_flight, load_shedder.streams) == (in_flight, streams)
+
+
+def test_asgi_streams_are_counted_once(asgi_client, create_aas, monkeypatch):
+    create_aas(1)
+    in_flight, streams = load_shedder.in_flight, load_shedder.streams
+    started = []
+    start_stream = load_shedder.start_stream
+    monkeypatch.setattr(load_shedder, "start_stream", lambda: started.append(True) or start_stream())
+
+    assert asgi_client.get("/aas_list?stream=ndjson").status_code == 200
+    assert asgi_client.get(f"/aas?aas_id={encoded('https://example.com/ids/aas/1')}").status_code == 200
+
+    assert len(started) == 1
+    assert (load_shedder.in_flight, load_shedder.streams) == (in_flight, streams)
+
+
+@pytest.fixture
+def rate_limit(monkeypatch):
+    """
+    Gives each client a bucket of 10 tokens, refilled with one token per second.
+    """
+    monkeypatch.setattr(rate_limiter, "backend", LocalRateLimitBackend())
+    monkeypatch.setattr(rate_limiter, "rate", 1.0)
+    monkeypatch.setattr(rate_limiter, "burst", 10.0)
+
+
+def test_clients_over_their_limit_get_429(client, rate_limit):
+    assert client.get("/aas_list").status_code == 200
+
+    limited = client.get("/aas_list")
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+
+    # The metrics are free, and every client has its own bucket
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/aas_list", environ_base={"REMOTE_ADDR": "192.0.2.2"}).status_code == 200
+
+
+def test_only_cheap_reads_run_while_overloaded(client, create_aas, monkeypatch):
+    create_aas(1)
+    monkeypatch.setattr(load_shedder, "max_in_flight", 1)
+    monkeypatch.setattr(load_shedder, "in_flight", 1)
+
+    shed = client.post("/aas", data={"aas_id": "https://example.com/ids/aas/2", "id_short": "Asset_2",
+                                     "global_asset_id": "https://example.com/ids/asset/2"})
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == str(load_shedder.retry_after)
+    assert client.get("/aas_list").status_code == 503
+
+    assert client.get(f"/aas?aas_id={encoded('https://example.com/ids/aas/1')}").status_code == 200
+    assert client.get("/metrics").status_code == 200
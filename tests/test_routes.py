@@ -0,0 +1,376 @@
+import gzip
+import io
+import json
+import zipfile
+
+import pytest
+
+from conftest import ASGIAPI, FlaskAPI, TEST_SHARDS, encoded
+from model import is_fulltext_enabled
+
+AAS_FORM = {
+    "aas_id": "https://example.com/ids/aas/1",
+    "id_short": "Asset_1",
+    "global_asset_id": "https://example.com/ids/asset/1",
+}
+
+SUBMODEL = {
+    "submodel_id": "urn:submodel:1",
+    "id_short": "TechnicalData",
+    "elements": [
+        {"id_short": "Weight", "value_type": "xs:double", "value": "12.5"},
+        {"id_short": "Dimensions", "model_type": "SubmodelElementCollection",
+         "elements": [{"id_short": "Width", "value": "3"}]},
+    ],
+}
+
+
+def aas_url(aas_id: str = AAS_FORM["aas_id"], query: str = "") -> str:
+    return f"/aas?aas_id={encoded(aas_id)}{query}"
+
+
+def create(api, n: int = 1, **fields):
+    form = {"aas_id": f"https://example.com/ids/aas/{n}", "id_short": f"Asset_{n}",
+            "global_asset_id": f"https://example.com/ids/asset/{n}", **fields}
+    response = api.request("POST", "/aas", form=form)
+    assert response.status_code == 200, response.content
+    return response
+
+
+def test_create_and_read(api):
+    created = create(api)
+    aas = created.json()
+    assert aas["aas_id"] == AAS_FORM["aas_id"]
+    assert aas["asset_kind"] == "Instance"
+
+    response = api.request("GET", aas_url())
+    assert response.status_code == 200
+    assert response.json() == aas
+    assert response.headers["ETag"] == created.headers["ETag"]
+
+    not_modified = api.request("GET", aas_url(), headers={"If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == response.headers["ETag"]
+
+    fields = api.request("GET", aas_url(query="&fields=aas_id,id_short"))
+    assert fields.json() == {"aas_id": aas["aas_id"], "id_short": aas["id_short"]}
+    assert fields.headers["ETag"] != response.headers["ETag"]
+    # The fieldset is normalized
+    same_fields = api.request("GET", aas_url(query="&fields=id_short,aas_id"),
+                             headers={"If-None-Match": fields.headers["ETag"]})
+    assert same_fields.status_code == 304
+    assert api.request("GET", aas_url(query="&fields=unknown")).status_code == 422
+
+
+def test_create_errors(api):
+    create(api)
+    create(api, 2)
+
+    duplicate = api.request("POST", "/aas", form={**AAS_FORM, "id_short": "Other"})
+    assert duplicate.status_code == 409
+    assert duplicate.json()["message"] == f"Asset Administration Shell already exists with ID: {AAS_FORM['aas_id']}"
+
+    duplicate = api.request("POST", "/aas", form={**AAS_FORM, "aas_id": "https://example.com/ids/aas/3"})
+    assert duplicate.status_code == 409
+    assert duplicate.json()["message"] == "Asset Administration Shell already exists with Id Short: Asset_1"
+
+    empty = api.request("POST", "/aas", form={**AAS_FORM, "aas_id": " "})
+    assert empty.status_code == 400
+
+    # A rejected write leaves the session usable
+    create(api, 3)
+
+
+def test_read_errors(api):
+    assert api.request("GET", aas_url()).status_code == 404
+    assert api.request("GET", "/aas?aas_id=!").status_code == 400
+    assert api.request("DELETE", "/aas?aas_id=!").status_code == 400
+
+
+def test_update(api):
+    etag = create(api).headers["ETag"]
+    create(api, 2)
+
+    stale = api.request("PUT", "/aas", form={**AAS_FORM, "description": "stale"}, headers={"If-Match": '"aas-0-0"'})
+    assert stale.status_code == 412
+
+    conflict = api.request("PUT", "/aas", form={**AAS_FORM, "id_short": "Asset_2"})
+    assert conflict.status_code == 409
+    assert conflict.json()["message"] == "Another Asset Administration Shell already exists with Id Short: Asset_2"
+    conflict = api.request("PUT", "/aas", form={**AAS_FORM, "update_aas_id": "https://example.com/ids/aas/2"})
+    assert conflict.status_code == 409
+    assert conflict.json()["message"] == \
+        "Another Asset Administration Shell already exists with AAS ID: https://example.com/ids/aas/2"
+
+    updated = api.request("PUT", "/aas", form={**AAS_FORM, "description": "updated"}, headers={"If-Match": etag})
+    assert updated.status_code == 200, updated.content
+    assert updated.json()["description"] == "updated"
+    assert updated.headers["ETag"] != etag
+
+    missing = api.request("PUT", "/aas", form={**AAS_FORM, "aas_id": "https://example.com/ids/aas/3"})
+    assert missing.status_code == 404
+
+
+def test_delete(api):
+    etag = create(api).headers["ETag"]
+
+    assert api.request("DELETE", aas_url(), headers={"If-Match": '"aas-0-0"'}).status_code == 412
+    deleted = api.request("DELETE", aas_url(), headers={"If-Match": etag})
+    assert deleted.status_code == 200
+    assert deleted.json() == {"message": "Asset Administration Shell deleted", "aas_id": AAS_FORM["aas_id"]}
+    assert api.request("DELETE", aas_url()).status_code == 404
+
+
+def test_list(api):
+    for n in range(1, 6):
+        create(api, n)
+
+    full = api.request("GET", "/aas_list")
+    assert [aas["id_short"] for aas in full.json()["Asset Administration Shells"]] == \
+        [f"Asset_{n}" for n in range(1, 6)]
+    assert api.request("GET", "/aas_list", headers={"If-None-Match": full.headers["ETag"]}).status_code == 304
+
+    page = api.request("GET", "/aas_list?limit=2").json()
+    assert len(page["Asset Administration Shells"]) == 2
+    next_page = api.request("GET", f"/aas_list?limit=2&cursor={page['next_cursor']}").json()
+    assert [aas["id_short"] for aas in next_page["Asset Administration Shells"]] == ["Asset_3", "Asset_4"]
+    last_page = api.request("GET", f"/aas_list?limit=2&cursor={next_page['next_cursor']}").json()
+    assert [aas["id_short"] for aas in last_page["Asset Administration Shells"]] == ["Asset_5"]
+    assert last_page["next_cursor"] is None
+
+    fields = api.request("GET", "/aas_list?limit=1&fields=id_short").json()
+    assert fields["Asset Administration Shells"] == [{"id_short": "Asset_1"}]
+    streamed_fields = api.request("GET", "/aas_list?stream=ndjson&fields=id_short").content.splitlines()
+    assert [json.loads(line) for line in streamed_fields] == [{"id_short": f"Asset_{n}"} for n in range(1, 6)]
+
+    ndjson = api.request("GET", "/aas_list?stream=ndjson")
+    assert ndjson.headers["Content-Type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in ndjson.content.splitlines()] == \
+        full.json()["Asset Administration Shells"]
+
+    streamed = api.request("GET", "/aas_list?stream=json")
+    assert streamed.json() == full.json()
+
+    # Any write changes the ETag of the list
+    create(api, 6)
+    assert api.request("GET", "/aas_list", headers={"If-None-Match": full.headers["ETag"]}).status_code == 200
+
+
+def test_bulk(api):
+    items = [{"aas_id": f"https://example.com/ids/aas/{n}", "id_short": f"Asset_{n}",
+              "global_asset_id": f"https://example.com/ids/asset/{n}"} for n in range(3)]
+
+    result = api.request("POST", "/aas/bulk", json_body=items + [items[0], {**items[0], "aas_id": " "}]).json()
+    assert (result["created"], result["conflict"], result["invalid"]) == (3, 1, 1)
+    assert [item["status"] for item in result["results"]] == ["created"] * 3 + ["conflict", "invalid"]
+
+    ndjson = b"\n".join(json.dumps({**item, "description": "upserted"}).encode() for item in items)
+    upsert = api.request("POST", "/aas/bulk?upsert=true", content=ndjson, content_type="application/x-ndjson")
+    assert upsert.json()["updated"] == 3
+    assert api.request("GET", aas_url(items[1]["aas_id"])).json()["description"] == "upserted"
+
+    invalid = api.request("POST", "/aas/bulk", json_body={"aas_id": "x"})
+    assert invalid.status_code == 400
+
+
+def test_filter(api):
+    create(api, 1)
+    create(api, 2, asset_kind="Type")
+    create(api, 3, asset_kind="Type")
+
+    filtered = api.request("GET", "/aas/filter?asset_kind=Type&limit=1").json()
+    assert [aas["id_short"] for aas in filtered["Asset Administration Shells"]] == ["Asset_2"]
+    next_page = api.request("GET", f"/aas/filter?asset_kind=Type&limit=1&cursor={filtered['next_cursor']}").json()
+    assert [aas["id_short"] for aas in next_page["Asset Administration Shells"]] == ["Asset_3"]
+
+    by_asset = api.request("GET", "/aas/filter?global_asset_id=https://example.com/ids/asset/1").json()
+    assert [aas["id_short"] for aas in by_asset["Asset Administration Shells"]] == ["Asset_1"]
+
+
+def test_search(api):
+    if not is_fulltext_enabled():
+        pytest.skip("SQLite was built without FTS5")
+    for n in range(1, 4):
+        create(api, n)
+
+    results = api.request("GET", "/aas/search?q=Asset_3").json()["Asset Administration Shells"]
+    assert results[0]["id_short"] == "Asset_3"
+    assert results[0]["snippets"]["id_short"] == "<mark>Asset_3</mark>"
+    assert api.request("GET", "/aas/search?q=%20").status_code == 400
+
+
+def test_metrics(api):
+    create(api)
+
+    response = api.request("GET", aas_url())
+    assert response.headers["Server-Timing"].startswith('db;dur=')
+    # A sharded repository looks the AAS up in the shard index first
+    assert f'desc="{2 if TEST_SHARDS else 1} queries"' in response.headers["Server-Timing"]
+    assert "total;dur=" in response.headers["Server-Timing"]
+
+    metrics = api.request("GET", "/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert b'aas_db_queries_per_request_count{method="GET",route="/aas"}' in metrics.content
+    assert b"# TYPE aas_http_request_duration_seconds histogram" in metrics.content
+
+
+def test_ids(api):
+    encoded_ids = api.request("POST", "/ids/encode", json_body=["https://example.com/ids/1", ""]).json()
+    assert (encoded_ids["converted"], encoded_ids["invalid"]) == (1, 1)
+    assert encoded_ids["results"][0]["encode_aas_id"] == encoded("https://example.com/ids/1")
+
+    text = api.request("POST", "/ids/decode", content=encoded_ids["results"][0]["encode_aas_id"].encode() + b"\n!",
+                       content_type="text/plain").json()
+    assert text["results"][0]["decode_aas_id"] == "https://example.com/ids/1"
+    assert text["invalid"] == 1
+
+    assert api.request("POST", "/ids/encode", json_body={"id": 1}).status_code == 400
+
+    generated = api.request("GET", "/generate_id?type_model=aas&count=3").json()
+    assert len({ids["encode_aas_id"] for ids in generated["ids"]}) == 3
+
+
+def test_export_and_import(api):
+    for n in range(1, 4):
+        create(api, n)
+
+    export = api.request("GET", "/aas/export?format=gzip")
+    assert export.status_code == 200
+    assert "attachment" in export.headers["Content-Disposition"]
+    lines = gzip.decompress(export.content).splitlines()
+    assert [json.loads(line)["id_short"] for line in lines] == ["Asset_1", "Asset_2", "Asset_3"]
+
+    with zipfile.ZipFile(io.BytesIO(api.request("GET", "/aas/export?format=zip").content)) as archive:
+        assert json.loads(archive.read("manifest.json"))["count"] == 3
+
+    skipped = api.request("POST", "/aas/import?policy=skip", content=export.content, content_type="application/gzip")
+    assert skipped.status_code == 200, skipped.content
+    assert (skipped.json()["skipped"], skipped.json()["completed"]) == (3, True)
+
+    failed = api.request("POST", "/aas/import?policy=fail", content=b"\n".join(lines),
+                         content_type="application/x-ndjson")
+    assert failed.status_code == 409
+    assert failed.json()["completed"] is False
+
+    changed = b"\n".join(json.dumps({**json.loads(line), "description": "imported"}).encode() for line in lines)
+    overwritten = api.request("POST", "/aas/import?policy=overwrite", content=changed,
+                              content_type="application/x-ndjson")
+    assert overwritten.json()["updated"] == 3
+    assert api.request("GET", aas_url()).json()["description"] == "imported"
+
+    invalid = api.request("POST", "/aas/import", content=b"[]", content_type="application/json")
+    assert invalid.status_code == 400
+
+
+def test_changes(api):
+    create(api)
+    api.request("PUT", "/aas", form={**AAS_FORM, "update_aas_id": "https://example.com/ids/aas/renamed"})
+    api.request("DELETE", aas_url("https://example.com/ids/aas/renamed"))
+
+    # The change log was emptied between tests, but the change stamp was kept
+    compacted = api.request("GET", "/aas/changes?since=0")
+    since = compacted.json()["last_seq"] - 3 if compacted.status_code == 410 else 0
+
+    page = api.request("GET", f"/aas/changes?since={since}&limit=2").json()
+    assert [change["operation"] for change in page["changes"]] == ["created", "updated"]
+    assert page["changes"][1]["previous_aas_id"] == AAS_FORM["aas_id"]
+    assert page["has_more"] is True
+    last_page = api.request("GET", f"/aas/changes?since={page['last_seq']}").json()
+    assert [change["operation"] for change in last_page["changes"]] == ["deleted"]
+    assert last_page["has_more"] is False
+    assert api.request("GET", f"/aas/changes?since={last_page['last_seq']}").json()["changes"] == []
+
+
+def test_compression(api):
+    for n in range(1, 30):
+        create(api, n)
+
+    identity = api.request("GET", "/aas_list", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in identity.headers
+
+    response = api.request("GET", "/aas_list", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["Vary"].lower()
+    assert response.headers["ETag"] == identity.headers["ETag"][:-1] + '-gzip"'
+    # The body was gunzipped when read
+    assert response.json() == identity.json()
+
+
+def test_compressed_not_modified(api):
+    for n in range(1, 30):
+        create(api, n)
+
+    response = api.request("GET", "/aas_list", headers={"Accept-Encoding": "gzip"})
+    not_modified = api.request("GET", "/aas_list", headers={"Accept-Encoding": "gzip",
+                                                            "If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == response.headers["ETag"]
+
+    identity = api.request("GET", "/aas_list", headers={"Accept-Encoding": "identity",
+                                                        "If-None-Match": response.headers["ETag"]})
+    assert identity.status_code == 304
+    assert not identity.headers["ETag"].endswith('-gzip"')
+
+
+def test_submodels(api):
+    created = create(api)
+    url = f"/aas/submodels?aas_id={encoded(AAS_FORM['aas_id'])}"
+
+    added = api.request("POST", url, json_body=SUBMODEL)
+    assert added.status_code == 200, added.content
+    assert added.json()["elements"][1]["elements"][0]["id_short"] == "Width"
+    assert api.request("POST", url, json_body=SUBMODEL).status_code == 409
+    missing_aas = f"/aas/submodels?aas_id={encoded('https://example.com/ids/aas/2')}"
+    assert api.request("POST", missing_aas, json_body=SUBMODEL).status_code == 404
+
+    aas = api.request("GET", aas_url(query="&depth=2"))
+    assert aas.json()["submodels"][0]["elements"][0]["id_short"] == "Weight"
+    assert aas.headers["ETag"].endswith('-d2"')
+    # The first level holds the Submodels without their elements
+    assert "elements" not in api.request("GET", aas_url(query="&depth=1")).json()["submodels"][0]
+    listed = api.request("GET", "/aas_list?depth=3").json()["Asset Administration Shells"]
+    assert listed[0]["submodels"][0]["elements"][1]["elements"][0]["value"] == "3"
+
+    submodel_url = f"{url}&submodel_id={encoded(SUBMODEL['submodel_id'])}"
+    stale = api.request("DELETE", submodel_url, headers={"If-Match": created.headers["ETag"]})
+    assert stale.status_code == 412
+    assert api.request("DELETE", submodel_url, headers={"If-Match": aas.headers["ETag"]}).status_code == 200
+    assert api.request("DELETE", submodel_url).status_code == 404
+
+    remaining = api.request("GET", aas_url(query="&depth=2"))
+    assert remaining.json()["submodels"] == []
+    assert remaining.headers["ETag"] != aas.headers["ETag"]
+
+
+def test_idempotent_writes(api):
+    key = "5f0c6d1e-8a4b-4c36-9a1e-3f2d7b9e6a10"
+    first = api.request("POST", "/aas", form=AAS_FORM, headers={"Idempotency-Key": key})
+    retry = api.request("POST", "/aas", form=AAS_FORM, headers={"Idempotency-Key": key})
+    other = api.request("POST", "/aas", form={**AAS_FORM, "id_short": "Other"}, headers={"Idempotency-Key": key})
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.content == first.content
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert other.status_code == 422
+
+    # The replayed update is not applied a second time
+    form = {**AAS_FORM, "description": "updated"}
+    headers = {"Idempotency-Key": "update-1", "If-Match": first.headers["ETag"]}
+    updated = api.request("PUT", "/aas", form=form, headers=headers)
+    assert updated.status_code == 200, updated.content
+    replayed = api.request("PUT", "/aas", form=form, headers=headers)
+    assert (replayed.status_code, replayed.headers["ETag"]) == (200, updated.headers["ETag"])
+
+
+def test_applications_serve_the_same_bytes(client, asgi_client):
+    for n in range(1, 5):
+        create(FlaskAPI(client), n)
+
+    for url in (aas_url(), "/aas_list", "/aas_list?limit=2", "/aas_list?stream=ndjson", "/aas_list?stream=json"):
+        flask_response = FlaskAPI(client).request("GET", url, headers={"Accept-Encoding": "identity"})
+        asgi_response = ASGIAPI(asgi_client).request("GET", url, headers={"Accept-Encoding": "identity"})
+        assert asgi_response.status_code == flask_response.status_code == 200
+        assert asgi_response.content == flask_response.content, url
+        assert asgi_response.headers["ETag"] == flask_response.headers["ETag"], url
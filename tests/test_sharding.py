@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import event, select
+
+from conftest import ROOT, TEST_SHARDS, encoded
+
+# Test modules run again on a sharded repository, through both applications
+SHARDED_TESTS = ["tests/test_routes.py", "tests/test_change_feed.py", "tests/test_aas_import.py",
+                 "tests/test_aas_snapshot.py", "tests/test_sharding.py"]
+
+sharded_only = pytest.mark.skipif(not TEST_SHARDS, reason="Runs on a sharded repository, see AAS_TEST_SHARDS")
+
+
+@pytest.mark.skipif(bool(TEST_SHARDS), reason="Already running on a sharded repository")
+def test_sharded_repository():
+    # The shards are configured when the model is imported, hence in another process
+    result = subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", *SHARDED_TESTS],
+                            cwd=ROOT, env={**os.environ, "AAS_TEST_SHARDS": "2"}, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stdout[-4000:]
+
+
+@sharded_only
+def test_shells_are_spread_over_the_shards(client, create_aas):
+    from model import session_factory
+    from model.aas_shard_index import AASShardIndex
+
+    for n in range(1, 9):
+        create_aas(n)
+
+    with session_factory() as session:
+        assert len(set(session.scalars(select(AASShardIndex.shard)))) == TEST_SHARDS
+
+    listed = client.get("/aas_list").get_json()["Asset Administration Shells"]
+    assert [aas["id"] for aas in listed] == sorted(aas["id"] for aas in listed)
+    assert len(listed) == 8
+    assert client.get(f"/aas?aas_id={encoded('https://example.com/ids/aas/5')}").get_json()["id_short"] == "Asset_5"
+
+    # The identifiers stay unique across the shards
+    duplicate = client.post("/aas", data={"aas_id": "https://example.com/ids/aas/9", "id_short": "Asset_1",
+                                          "global_asset_id": "https://example.com/ids/asset/9"})
+    assert duplicate.status_code == 409
+
+
+def main_database_writes(client, method: str, url: str, **kwargs) -> list:
+    """
+    Returns the statements writing to the main database while the request runs.
+    """
+    from model import get_engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split()[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            statements.append(statement)
+
+    event.listen(get_engine(), "before_cursor_execute", record)
+    try:
+        response = client.open(url, method=method, **kwargs)
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record)
+    assert response.status_code == 200, response.get_json()
+    return statements
+
+
+@sharded_only
+def test_updates_keeping_the_identifiers_do_not_write_the_main_database(client, create_aas):
+    aas = create_aas(1)
+    form = {"aas_id": aas["aas_id"], "id_short": aas["id_short"], "global_asset_id": aas["global_asset_id"]}
+
+    assert main_database_writes(client, "PUT", "/aas", data={**form, "description": "updated"}) == []
+
+    renamed = main_database_writes(client, "PUT", "/aas", data={**form, "id_short": "Renamed"})
+    assert len(renamed) == 1 and "aas_shard_index" in renamed[0]
+
+    upserted = main_database_writes(client, "POST", "/aas/bulk?upsert=true",
+                                    json=[{**form, "id_short": "Renamed", "description": "upserted"}])
+    assert upserted == []
+
+
+@sharded_only
+def test_changes_of_the_shards_are_merged_in_one_sequence(client, create_aas):
+    from model import session_factory
+    from model.aas_shard_index import AASShardIndex
+
+    for n in range(1, 9):
+        create_aas(n)
+    client.delete(f"/aas?aas_id={encoded('https://example.com/ids/aas/1')}")
+    # The change log was emptied between tests, but the change stamp was kept
+    since = client.get("/aas/changes?since=0").get_json()["last_seq"] - 9
+
+    with session_factory() as session:
+        assert len(set(session.scalars(select(AASShardIndex.shard)))) == TEST_SHARDS
+
+    page = client.get(f"/aas/changes?since={since}").get_json()
+    assert [change["seq"] for change in page["changes"]] == list(range(since + 1, since + 10))
+    assert [change["aas_id"] for change in page["changes"]][-1] == "https://example.com/ids/aas/1"
+    assert [change["operation"] for change in page["changes"]].count("created") == 8
+
+    etag = client.get("/aas_list").headers["ETag"]
+    create_aas(9)
+    assert client.get("/aas_list", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from conftest import TEST_SHARDS
+from utils.write_batcher import write_batcher
+
+
+@pytest.fixture
+def group_commit(monkeypatch):
+    """
+    Enables group commit, with a window long enough for the writes of the test to share a batch.
+    """
+    monkeypatch.setattr(write_batcher, "enabled", True)
+    monkeypatch.setattr(write_batcher, "window", 0.5)
+
+
+@pytest.fixture
+def batch_statements():
+    """
+    Returns the statements run by SQLite for the writer of the batches, BEGIN and COMMIT included.
+    """
+    from model import get_engine
+
+    statements = []
+
+    def trace(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(
+            lambda statement: statements.append(statement)
+            if threading.current_thread().name == "aas-group-commit" else None)
+
+    engine = get_engine()
+    # The connections already open are replaced by new ones, which are traced
+    engine.dispose()
+    event.listen(engine, "connect", trace)
+    yield statements
+    event.remove(engine, "connect", trace)
+    engine.dispose()
+
+
+@pytest.mark.skipif(bool(TEST_SHARDS), reason="Sharded repositories commit every write on its own")
+def test_concurrent_writes_are_committed_together(app, group_commit, batch_statements):
+    forms = [{"aas_id": f"https://example.com/ids/aas/{n}", "id_short": f"Asset_{n}",
+              "global_asset_id": f"https://example.com/ids/asset/{n}"} for n in range(1, 8)]
+    # The last write conflicts with the first one
+    forms.append({**forms[0], "id_short": "Duplicate"})
+    statuses = [None] * len(forms)
+
+    def post(index: int) -> None:
+        statuses[index] = app.test_client().post("/aas", data=forms[index]).status_code
+
+    threads = [threading.Thread(target=post, args=(index,)) for index in range(len(forms))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200] * 7 + [409]
+    assert statuses.index(409) in (0, len(forms) - 1)
+    # A single transaction, the savepoints of the writes are released into it
+    transactions = [statement for statement in batch_statements
+                    if statement.split()[0].upper() in ("BEGIN", "COMMIT") or statement.upper() == "ROLLBACK"]
+    assert transactions == ["BEGIN IMMEDIATE", "COMMIT"]
+    assert len(app.test_client().get("/aas_list").get_json()["Asset Administration Shells"]) == 7
@@ -0,0 +1,274 @@
+import json
+from datetime import datetime
+from typing import BinaryIO, Iterable, List, Tuple, Type, Union
+
+from pydantic import ValidationError
+
+from sqlalchemy import insert, update, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from logger import logger
+from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+from model.aas_change import AASChange, ChangeOperation
+from model.aas_shard_index import AASShardIndex
+from schemas.asset_administration_shell import AASSchema, check_required_fields, strip_whitespace
+
+
+class AASBulkService:
+    """
+    Saves batches of Asset Administration Shells using set-based conflict checks
+    and a single transaction per chunk.
+    """
+
+    @staticmethod
+    def read_ndjson(lines: Iterable[bytes]):
+        """
+        Reads the items of an NDJSON stream, skipping blank lines.
+        Yields pairs of (position, item), where the item is an exception if the line is not valid JSON.
+        """
+        index = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, e
+            index += 1
+
+    @staticmethod
+    def read_items(stream: BinaryIO, mimetype: str, error_msg: str):
+        """
+        Reads the items of a request body, either from a JSON array or from an NDJSON stream.
+        Yields pairs of (position, item), where the item is an exception if it could not be parsed.
+        \f
+        :param stream: The body of the request.
+        :param mimetype: The content type of the body, without its parameters.
+        :param error_msg: Message of the ValueError raised when the body is not a JSON array.
+        """
+        if mimetype == "application/x-ndjson":
+            yield from AASBulkService.read_ndjson(stream)
+            return
+
+        try:
+            items = json.load(stream)
+        except ValueError:
+            items = None
+        if not isinstance(items, list):
+            raise ValueError(error_msg)
+        yield from enumerate(items)
+
+    @staticmethod
+    def validate_item(item: Union[dict, Exception], schema: Type[AASSchema] = AASSchema):
+        """
+        Validates a single item of a bulk request the same way POST /aas validates its form.
+        Returns the validated form and None, or None and the error message.
+        """
+        if isinstance(item, Exception):
+            return None, f"Invalid JSON: {str(item)}"
+
+        try:
+            form = schema(**item)
+        except (ValidationError, TypeError) as e:
+            return None, f"Invalid Asset Administration Shell: {str(e)}"
+
+        strip_whitespace(form)
+        if not check_required_fields(form):
+            return None, "Fields 'aas_id', 'id_short', and 'global_asset_id' are required and cannot be empty"
+
+        return form, None
+
+    @staticmethod
+    def save(session, items: Iterable[Tuple[int, Union[dict, Exception]]], upsert: bool = False,
+             chunk_size: int = 500) -> dict:
+        """
+        Validates and saves the items of a bulk request, one transaction per chunk.
+        \f
+        :param session: The database session.
+        :param items: Pairs of (position in the request, parsed item).
+        :param upsert: If True, existing AAS are replaced following the semantics of PUT /aas.
+        :param chunk_size: Number of items saved per transaction.
+        :return: The number of items per status and the result of each item, ordered by position.
+        """
+        results = []
+        chunk = []
+
+        for index, item in items:
+            form, error_msg = AASBulkService.validate_item(item)
+            if error_msg:
+                aas_id = item.get("aas_id") if isinstance(item, dict) else None
+                results.append({"index": index, "aas_id": aas_id, "status": "invalid", "message": error_msg})
+                continue
+
+            chunk.append((index, form))
+            if len(chunk) >= chunk_size:
+                results.extend(AASBulkService.save_chunk(session, chunk, upsert))
+                chunk = []
+
+        if chunk:
+            results.extend(AASBulkService.save_chunk(session, chunk, upsert))
+
+        results.sort(key=lambda result: result["index"])
+        summary = {status: 0 for status in ("created", "updated", "conflict", "invalid")}
+        for result in results:
+            summary[result["status"]] += 1
+
+        return {**summary, "results": results}
+
+    @staticmethod
+    def save_chunk(session, items: List[Tuple[int, AASSchema]], upsert: bool = False) -> List[dict]:
+        """
+        Inserts (or, in upsert mode, updates) a chunk of already validated Asset Administration Shells.
+        \f
+        :param session: The database session.
+        :param items: Pairs of (position in the request, validated form).
+        :param upsert: If True, existing AAS are replaced following the semantics of PUT /aas.
+        :return: One result per item, in the same order as the items.
+        """
+        results, to_insert, to_update = AASBulkService.plan_chunk(session, items, upsert)
+        return AASBulkService.write_chunk(session, results, to_insert, to_update)
+
+    @staticmethod
+    def plan_chunk(session, items: List[Tuple[int, AASSchema]], upsert: bool = False):
+        """
+        Checks a chunk of already validated Asset Administration Shells for conflicts, without writing it.
+        \f
+        :param session: The database session.
+        :param items: Pairs of (position in the request, validated form).
+        :param upsert: If True, existing AAS are replaced following the semantics of PUT /aas.
+        :return: One result per item, where the conflicts already have their status, and the
+                 (result, row) pairs to insert and to update.
+        """
+        aas_ids = {form.aas_id for _, form in items}
+        id_shorts = {form.id_short for _, form in items}
+
+        # Resolves every uniqueness check of the chunk with a single query
+        existing = session.query(
+            AssetAdministrationShell.id,
+            AssetAdministrationShell.aas_id,
+            AssetAdministrationShell.id_short,
+            AssetAdministrationShell.row_version
+        ).filter(
+            or_(AssetAdministrationShell.aas_id.in_(aas_ids),
+                AssetAdministrationShell.id_short.in_(id_shorts))
+        ).all()
+        pk_by_aas_id = {row.aas_id: row.id for row in existing}
+        version_by_aas_id = {row.aas_id: row.row_version for row in existing}
+        aas_id_by_id_short = {row.id_short: row.aas_id for row in existing}
+
+        results = []
+        to_insert = []
+        to_update = []
+        claimed_aas_ids = set()
+        claimed_id_shorts = set()
+
+        for index, form in items:
+            result = {"index": index, "aas_id": form.aas_id}
+            results.append(result)
+
+            if form.aas_id in claimed_aas_ids:
+                result.update(status="conflict",
+                              message=f"Asset Administration Shell repeated in the batch with ID: {form.aas_id}")
+                continue
+
+            if form.id_short in claimed_id_shorts:
+                result.update(status="conflict",
+                              message=f"Asset Administration Shell repeated in the batch with Id Short: "
+                                      f"{form.id_short}")
+                continue
+
+            row = {
+                "aas_id": form.aas_id,
+                "id_short": form.id_short,
+                "asset_kind": AssetKind(form.asset_kind),
+                "global_asset_id": form.global_asset_id,
+                "version": form.version,
+                "revision": form.revision,
+                "description": form.description,
+            }
+            id_short_owner = aas_id_by_id_short.get(form.id_short)
+
+            if form.aas_id in pk_by_aas_id:
+                if not upsert:
+                    result.update(status="conflict",
+                                  message=f"Asset Administration Shell already exists with ID: {form.aas_id}")
+                    continue
+                if id_short_owner is not None and id_short_owner != form.aas_id:
+                    result.update(status="conflict",
+                                  message=f"Another Asset Administration Shell already exists with Id Short: "
+                                          f"{form.id_short}")
+                    continue
+                row["id"] = pk_by_aas_id[form.aas_id]
+                row["row_version"] = version_by_aas_id[form.aas_id]
+                to_update.append((result, row))
+            else:
+                if id_short_owner is not None:
+                    result.update(status="conflict",
+                                  message=f"Asset Administration Shell already exists with Id Short: "
+                                          f"{form.id_short}")
+                    continue
+                # Imports keep the creation date of the exported AAS
+                row["creation_date"] = getattr(form, "creation_date", None) or datetime.now()
+                row["row_version"] = 1
+                to_insert.append((result, row))
+
+            claimed_aas_ids.add(form.aas_id)
+            claimed_id_shorts.add(form.id_short)
+
+        return results, to_insert, to_update
+
+    @staticmethod
+    def write_chunk(session, results: List[dict], to_insert: List[Tuple[dict, dict]],
+                    to_update: List[Tuple[dict, dict]]) -> List[dict]:
+        """
+        Writes the rows planned by plan_chunk in a single transaction and completes their results.
+        """
+        try:
+            if to_insert:
+                session.execute(insert(AssetAdministrationShell), [row for _, row in to_insert])
+            if to_update:
+                session.execute(update(AssetAdministrationShell), [row for _, row in to_update])
+            if to_insert or to_update:
+                AASBulkService.record_changes(session, [
+                    {"operation": ChangeOperation.CREATED, "aas_id": row["aas_id"], "previous_aas_id": None,
+                     "row_version": row["row_version"]}
+                    for _, row in to_insert
+                ] + [
+                    {"operation": ChangeOperation.UPDATED, "aas_id": row["aas_id"], "previous_aas_id": None,
+                     "row_version": row["row_version"] + 1}
+                    for _, row in to_update
+                ])
+            session.commit()
+        except (IntegrityError, StaleDataError) as e:
+            # Another request claimed one of the identifiers or updated one of the AAS after the conflict check
+            session.rollback()
+            logger.warning(f"Error saving batch of Asset Administration Shells: {str(e)}")
+            for result, _ in to_insert + to_update:
+                result.update(status="conflict",
+                              message=f"Asset Administration Shell was modified concurrently: {str(e)}")
+            return results
+
+        for result, _ in to_insert:
+            result["status"] = "created"
+        for result, _ in to_update:
+            result["status"] = "updated"
+
+        return results
+
+    @staticmethod
+    def record_changes(session, changes: List[dict]) -> None:
+        """
+        Records the changes of a chunk in the change log, or in a sharded repository in the log of the shard
+        of each AAS, read from the index after the writes.
+        """
+        if getattr(session, "router", None) is None:
+            AASChange.record_many(session, changes)
+            return
+
+        shards = AASShardIndex.shards_by_aas_id(session, [change["aas_id"] for change in changes])
+        changes_by_shard = {}
+        for change in changes:
+            changes_by_shard.setdefault(shards[change["aas_id"]], []).append(change)
+        for shard, shard_changes in changes_by_shard.items():
+            AASChange.record_many(session, shard_changes, shard)
@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+
+
+class AASCacheBackend:
+    """
+    Defines the storage used by AASCache.
+    The default is an in-process LRU, but a backend shared between workers (e.g. Redis or Memcached)
+    can be plugged in by implementing these methods.
+    """
+
+    def get(self, key: str) -> Union[dict, None]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """
+        Returns counters specific to the backend, such as the number of evictions.
+        """
+        return {}
+
+
+class LocalAASCacheBackend(AASCacheBackend):
+    """
+    Bounded in-process cache that evicts the least recently used entry when full
+    and expires entries after a time to live.
+    \f
+    :param max_size: Maximum number of entries kept in memory.
+    :param ttl: Time to live of an entry, in seconds.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Union[dict, None]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "ttl": self.ttl,
+                    "evictions": self.evictions}
+
+
+class AASCache:
+    """
+    Read-through cache of serialized Asset Administration Shells, keyed by the decoded aas_id.
+    A read that missed the cache only stores what it read if no write invalidated the AAS meanwhile,
+    so that a read racing with a write cannot put the previous version back. The invalidations only
+    reach the current process: with several workers, the cache needs a backend shared between them.
+    \f
+    :param backend: The storage of the cached entries.
+    :param enabled: If False, every lookup is a miss and nothing is stored.
+    """
+
+    # Number of generation counters, each shared by the aas_id hashing to it
+    GENERATION_SLOTS = 1024
+
+    def __init__(self, backend: AASCacheBackend, enabled: bool = False) -> None:
+        self.backend = backend
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._generations = [0] * self.GENERATION_SLOTS
+        self._lock = threading.Lock()
+
+    def set_backend(self, backend: AASCacheBackend) -> None:
+        """
+        Replaces the storage of the cache, e.g. with a backend shared between gunicorn workers.
+        """
+        self.backend = backend
+
+    def get(self, aas_id: str) -> Union[dict, None]:
+        """
+        Returns the cached representation of the AAS, or None on a miss.
+        """
+        value = self.backend.get(aas_id) if self.enabled else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def generation(self, aas_id: str) -> int:
+        """
+        Returns the generation of the AAS, incremented by every invalidation. Read before the AAS is read
+        from the database, and passed to set.
+        """
+        return self._generations[hash(aas_id) % self.GENERATION_SLOTS]
+
+    def set(self, aas_id: str, value: dict, generation: int) -> None:
+        """
+        Stores the representation of an AAS read from the database, unless the AAS was invalidated
+        since its generation was read, in which case the representation may be outdated.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._generations[hash(aas_id) % self.GENERATION_SLOTS] == generation:
+                self.backend.set(aas_id, value)
+
+    def invalidate(self, *aas_ids: Union[str, None]) -> None:
+        """
+        Removes the given AAS from the cache. Must be called after every write.
+        """
+        with self._lock:
+            for aas_id in aas_ids:
+                if aas_id is not None:
+                    self._generations[hash(aas_id) % self.GENERATION_SLOTS] += 1
+                    self.backend.delete(aas_id)
+
+    def clear(self) -> None:
+        """
+        Removes every AAS from the cache, after writes too large to invalidate one by one.
+        """
+        with self._lock:
+            self._generations = [generation + 1 for generation in self._generations]
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {"enabled": self.enabled, "hits": hits, "misses": misses, **self.backend.stats()}
+
+
+aas_cache = AASCache(
+    LocalAASCacheBackend(max_size=int(os.environ.get("AAS_CACHE_MAX_SIZE", 10000)),
+                         ttl=float(os.environ.get("AAS_CACHE_TTL", 60))),
+    # Off unless enabled, since the invalidations of the other workers do not reach this one
+    enabled=os.environ.get("AAS_CACHE_ENABLED", "0") == "1"
+)
@@ -0,0 +1,80 @@
+from typing import List, Tuple, Union
+
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+
+from model.asset_administration_shell import AssetAdministrationShell
+
+
+class AASConflictService:
+    """
+    Detects uniqueness conflicts of aas_id and id_short in a single round trip, either from one
+    lookup query or from the constraint violation raised by the database.
+    """
+
+    @staticmethod
+    def conflicting_column(error: IntegrityError) -> Union[str, None]:
+        """
+        Returns the unique column violated by a write, read from the error of the database.
+        SQLite reports "UNIQUE constraint failed: asset_administration_shell.<column>" and PostgreSQL
+        the name of the constraint, "asset_administration_shell_<column>_key".
+        """
+        message = str(error.orig)
+        for column in ("aas_id", "id_short"):
+            if column in message:
+                return column
+        return None
+
+    @staticmethod
+    def create_conflict_message(error: IntegrityError, aas_id: str, id_short: str) -> str:
+        """
+        Returns the message of a POST /aas rejected by a unique constraint.
+        """
+        column = AASConflictService.conflicting_column(error)
+        if column == "aas_id":
+            return f"Asset Administration Shell already exists with ID: {aas_id}"
+        if column == "id_short":
+            return f"Asset Administration Shell already exists with Id Short: {id_short}"
+        return f"Asset Administration Shell already exists: {str(error)}"
+
+    @staticmethod
+    def update_conflict_message(error: IntegrityError, new_aas_id: str, id_short: str) -> str:
+        """
+        Returns the message of a PUT /aas rejected by a unique constraint.
+        """
+        column = AASConflictService.conflicting_column(error)
+        if column == "aas_id":
+            return f"Another Asset Administration Shell already exists with AAS ID: {new_aas_id}"
+        if column == "id_short":
+            return f"Another Asset Administration Shell already exists with Id Short: {id_short}"
+        return f"Another Asset Administration Shell already exists: {str(error)}"
+
+    @staticmethod
+    def update_lookup(aas_id: str, new_aas_id: Union[str, None], id_short: str):
+        """
+        Returns the query that loads, in one round trip, the AAS to update and every AAS that could
+        conflict with the update: the owner of the new aas_id and the owner of the id_short.
+        """
+        aas_ids = [aas_id, new_aas_id] if new_aas_id else [aas_id]
+        return select(AssetAdministrationShell).where(or_(
+            AssetAdministrationShell.aas_id.in_(aas_ids),
+            AssetAdministrationShell.id_short == id_short
+        ))
+
+    @staticmethod
+    def resolve_update(rows: List[AssetAdministrationShell], aas_id: str, new_aas_id: Union[str, None],
+                       id_short: str) -> Tuple[Union[AssetAdministrationShell, None], Union[str, None]]:
+        """
+        Splits the rows loaded by update_lookup into the AAS to update and the first conflict found,
+        checking id_short before the new aas_id as PUT /aas always did.
+        \f
+        :return: The AAS to update (None if it does not exist) and the conflict message (None if there is none).
+        """
+        aas = next((row for row in rows if row.aas_id == aas_id), None)
+        others = [row for row in rows if row.aas_id != aas_id]
+
+        if any(row.id_short == id_short for row in others):
+            return aas, f"Another Asset Administration Shell already exists with Id Short: {id_short}"
+        if new_aas_id and any(row.aas_id == new_aas_id for row in others):
+            return aas, f"Another Asset Administration Shell already exists with AAS ID: {new_aas_id}"
+        return aas, None
@@ -0,0 +1,55 @@
+import sys
+from typing import List, Union
+
+from model.asset_administration_shell import AssetAdministrationShell
+from schemas.asset_administration_shell import AASFilterSchema
+
+
+class AASFilterService:
+
+    @staticmethod
+    def clauses(query: AASFilterSchema) -> List:
+        """
+        Translates the filters of a search into SQL conditions, each of them served by an index
+        of the asset_administration_shell table.
+        \f
+        :param query: The filters of the search.
+        :return: The conditions to apply to the query, all of which must match.
+        """
+        clauses = []
+        if query.global_asset_id is not None:
+            clauses.append(AssetAdministrationShell.global_asset_id == query.global_asset_id)
+        if query.asset_kind is not None:
+            clauses.append(AssetAdministrationShell.asset_kind == query.asset_kind)
+        if query.created_after is not None:
+            clauses.append(AssetAdministrationShell.creation_date >= query.created_after)
+        if query.created_before is not None:
+            clauses.append(AssetAdministrationShell.creation_date < query.created_before)
+        if query.id_short_prefix is not None:
+            # A range on the id_short index, since LIKE is case insensitive in SQLite and cannot use it
+            prefix = query.id_short_prefix
+            prefix_end = AASFilterService.prefix_end(prefix)
+            clauses.append(AssetAdministrationShell.id_short >= prefix)
+            if prefix_end is not None:
+                clauses.append(AssetAdministrationShell.id_short < prefix_end)
+        if query.cursor is not None:
+            clauses.append(AssetAdministrationShell.id > query.cursor)
+        return clauses
+
+    @staticmethod
+    def prefix_end(prefix: str) -> Union[str, None]:
+        """
+        Returns the smallest string greater than every string starting with the prefix, to bound a range
+        on an index. Trailing maximal code points cannot be incremented and are dropped, and the surrogates,
+        which cannot be encoded, are skipped.
+        \f
+        :param prefix: The beginning of the strings to match.
+        :return: The exclusive upper bound, or None if the strings starting with the prefix are unbounded.
+        """
+        prefix = prefix.rstrip(chr(sys.maxunicode))
+        if not prefix:
+            return None
+        next_code_point = ord(prefix[-1]) + 1
+        if 0xD800 <= next_code_point <= 0xDFFF:
+            next_code_point = 0xE000
+        return prefix[:-1] + chr(next_code_point)
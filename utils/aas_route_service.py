@@ -0,0 +1,752 @@
+from typing import BinaryIO, Union
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.datastructures import ETags
+
+from logger import logger
+from model import is_fulltext_enabled
+from model.aas_change import AASChange
+from model.aas_change_relay import AASChangeRelay
+from model.aas_fulltext import AASFullText
+from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+from model.repository_state import RepositoryState
+from model.submodel import Submodel
+from schemas.asset_administration_shell import AASSchema, show_aas, show_aas_list, AASSearchSchema, \
+    AASUpdateSchema, IdEncodeDecodeSchema, show_encode_decode_ids, ModelTypeSchema, AASListQuerySchema, \
+    StreamFormat, AASFilterSchema, AASTextSearchSchema, show_aas_search_results, check_required_fields, \
+    strip_whitespace, AASExportQuerySchema, AASImportQuerySchema, AASChangeQuerySchema, \
+    AASChangeStreamQuerySchema, AASViewQuerySchema, selected_fields, AASStatsQuerySchema, selected_dimensions, \
+    SubmodelSchema, SubmodelSearchSchema, show_submodel, AAS_MAX_DEPTH
+from utils.aas_bulk_service import AASBulkService
+from utils.aas_cache import aas_cache
+from utils.aas_conflict_service import AASConflictService
+from utils.aas_filter_service import AASFilterService
+from utils.aas_serializer import AASSerializer
+from utils.aas_transfer_service import AASTransferService
+from utils.aas_write_service import AASWriteService
+from utils.change_feed_service import ChangeFeedService
+from utils.etag_service import ETagService
+from utils.id_decoder_service import IDDecoderService
+from utils.load_shedder import load_shedder
+from utils.rate_limiter import rate_limiter
+from utils.route_response import RouteResponse
+from utils.submodel_service import SubmodelService
+
+
+class AASRouteService:
+    """
+    Logic of the routes of the repository, shared by the Flask application (app.py) and the ASGI one (asgi.py).
+    The routes take a synchronous session with the request already validated against its schema, and return
+    a RouteResponse, which each application turns into a response of its framework. The ASGI application
+    runs them with AsyncSession.run_sync.
+    """
+
+    # Number of rows fetched from the database at a time when streaming the list or the export
+    STREAM_BATCH_SIZE = 500
+
+    # Number of Asset Administration Shells saved per transaction by the bulk and import endpoints
+    BULK_CHUNK_SIZE = 500
+
+    REQUIRED_FIELDS_MSG = "Fields 'aas_id', 'id_short', and 'global_asset_id' are required and cannot be empty"
+
+    @staticmethod
+    def admit(method: str, path: str, api_key: Union[str, None], address: Union[str, None],
+              forwarded_for: Union[str, None] = None):
+        """
+        Rejects a request with a 503 while the repository is overloaded, unless it is a cheap read,
+        or with a 429 when its client used up its rate limit. Otherwise counts it as running, until
+        the application calls load_shedder.leave(), or load_shedder.start_stream() when the route
+        returns a streamed response.
+        \f
+        :param api_key: The API key sent by the client, see RateLimiter.client_key.
+        :param address: The address of the peer of the connection.
+        :param forwarded_for: The X-Forwarded-For header, read when the peer is a trusted proxy.
+        :return: The response of a rejected request, None if the request may run.
+        """
+        cost = rate_limiter.cost(method, path)
+        if load_shedder.should_shed(method, cost):
+            logger.warning(f"Shedding {method} {path}: {load_shedder.in_flight} requests running, "
+                           f"{load_shedder.streams} streams open, "
+                           f"{load_shedder.db_latency() * 1000:.1f} ms query latency")
+            response = RouteResponse.error("The repository is overloaded, retry later", 503)
+            response.headers["Retry-After"] = str(load_shedder.retry_after)
+            return response
+
+        client = rate_limiter.client_key(api_key, address, forwarded_for)
+        retry_after = rate_limiter.check(client, cost)
+        if retry_after:
+            logger.warning(f"Rate limit exceeded by {client} on {method} {path}")
+            response = RouteResponse.error("Rate limit exceeded, retry later", 429)
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+
+        load_shedder.enter()
+        return None
+
+    @staticmethod
+    def invalid_encoded_id(encoded_id: str, error: ValueError) -> RouteResponse:
+        """
+        Returns the 400 response for an aas_id (or submodel_id) parameter that is not a valid encoded ID.
+        """
+        error_msg = str(error)
+        logger.warning(f"Error decoding Asset Administration Shell ID '{encoded_id}', {error_msg}")
+        return RouteResponse.error(error_msg, 400)
+
+    @staticmethod
+    def precondition_failed(aas_id: str) -> RouteResponse:
+        """
+        Returns the 412 response for a write whose If-Match header does not match the current ETag.
+        """
+        error_msg = "Asset Administration Shell was modified since it was read"
+        logger.warning(f"Error writing Asset Administration Shell #{aas_id}, {error_msg}")
+        return RouteResponse.error(error_msg, 412)
+
+    @staticmethod
+    def aas_not_found(aas_id: str) -> RouteResponse:
+        """
+        Returns the 404 response for a read of an Asset Administration Shell that does not exist.
+        """
+        error_msg = "Asset Administration Shell not found"
+        logger.warning(f"Error finding Asset Administration Shell: {aas_id}, {error_msg}")
+        return RouteResponse.error(error_msg, 404)
+
+    @staticmethod
+    def create(session, form: AASSchema) -> RouteResponse:
+        """
+        Creates a new Asset Administration Shell.
+        """
+        # Strip whitespace from fields
+        strip_whitespace(form)
+
+        # Validate required fields
+        if not check_required_fields(form):
+            error_msg = AASRouteService.REQUIRED_FIELDS_MSG
+            logger.warning(f"Error creating Asset Administration Shell: {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+
+        aas = AssetAdministrationShell(
+            aas_id=form.aas_id,
+            id_short=form.id_short,
+            asset_kind=AssetKind(form.asset_kind),
+            global_asset_id=form.global_asset_id,
+            version=form.version,
+            revision=form.revision,
+            description=form.description
+        )
+
+        logger.debug("Creating Asset Administration Shell with ID: %s", aas.aas_id)
+
+        try:
+            # The unique constraints on aas_id and id_short detect duplicates in the same round trip as the insert
+            aas = AASWriteService.run(session, lambda write_session: AASWriteService.create(write_session, aas))
+            aas_cache.invalidate(aas.aas_id)
+            logger.debug("Asset Administration Shell with ID %s created successfully", aas.aas_id)
+            return RouteResponse(show_aas(aas), etag=ETagService.aas_etag(aas.id, aas.row_version))
+
+        except IntegrityError as e:
+            # Report which of the identifiers already exists
+            error_msg = AASConflictService.create_conflict_message(e, form.aas_id, form.id_short)
+            logger.warning(f"Error creating Asset Administration Shell: {form.aas_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 409)
+
+        except Exception as e:
+            # Handle unexpected errors
+            error_msg = f"Could not save new Asset Administration Shell: {str(e)}"
+            logger.warning(f"Error creating Asset Administration Shell '{aas.aas_id}', {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+
+    @staticmethod
+    def bulk(session, stream: BinaryIO, mimetype: str, upsert: bool) -> RouteResponse:
+        """
+        Creates many Asset Administration Shells at once from a JSON array or an NDJSON stream.
+        \f
+        :param stream: The body of the request.
+        :param mimetype: The content type of the body, without its parameters.
+        :param upsert: If True, existing AAS are updated instead of reported as conflicts.
+        """
+        logger.debug("Saving batch of Asset Administration Shells (upsert=%s)", upsert)
+        items = AASBulkService.read_items(
+            stream, mimetype, "Request body must be a JSON array or an NDJSON stream of Asset Administration Shells")
+
+        try:
+            bulk_result = AASBulkService.save(session, items, upsert, AASRouteService.BULK_CHUNK_SIZE)
+        except ValueError as e:
+            error_msg = str(e)
+            logger.warning(f"Error saving batch of Asset Administration Shells: {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+
+        aas_cache.invalidate(*[result["aas_id"] for result in bulk_result["results"]
+                               if result["status"] in ("created", "updated")])
+        logger.debug("Batch of Asset Administration Shells saved: %s created, %s updated",
+                     bulk_result['created'], bulk_result['updated'])
+        return RouteResponse(bulk_result)
+
+    @staticmethod
+    def export(query: AASExportQuerySchema) -> RouteResponse:
+        """
+        Exports every Asset Administration Shell as NDJSON, compressed with gzip or inside a zip archive.
+        The export is streamed in batches, so memory usage does not depend on the size of the repository.
+        """
+        logger.debug("Exporting Asset Administration Shells as %s", query.format.value)
+        headers = {"Content-Disposition": f'attachment; filename="{AASTransferService.filename(query.format)}"'}
+        return RouteResponse(media_type=AASTransferService.MIMETYPES[query.format], headers=headers,
+                             stream=lambda session: AASTransferService.export(
+                                 session, query.format, AASRouteService.STREAM_BATCH_SIZE))
+
+    @staticmethod
+    def import_items(session, query: AASImportQuerySchema, stream: BinaryIO, mimetype: str,
+                     content_encoding: Union[str, None]) -> RouteResponse:
+        """
+        Imports an export of the repository, sent as NDJSON, gzip or zip, in chunks of one transaction each.
+        \f
+        :param stream: The body of the request.
+        :param mimetype: The content type of the body, without its parameters.
+        :param content_encoding: The Content-Encoding header of the request, if any.
+        """
+        logger.debug("Importing Asset Administration Shells (policy=%s)", query.policy.value)
+
+        try:
+            items = AASTransferService.read_import(stream, mimetype, content_encoding)
+            import_result = AASTransferService.import_items(session, items, query.policy,
+                                                            AASRouteService.BULK_CHUNK_SIZE)
+        except ValueError as e:
+            error_msg = str(e)
+            logger.warning(f"Error importing Asset Administration Shells: {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+        finally:
+            # Imports are too large to invalidate the imported AAS one by one
+            aas_cache.clear()
+
+        return RouteResponse(import_result, 200 if import_result["completed"] else 409)
+
+    @staticmethod
+    def list_statement(fields: tuple = None, depth: int = 0):
+        """
+        Returns the query used to list Asset Administration Shells.
+        With the fast serializer or a sparse fieldset, rows are read as column tuples instead of ORM objects.
+        With a depth, they are read as ORM objects with their Submodels, each level in one query for the whole list.
+        """
+        if depth:
+            return select(AssetAdministrationShell).options(*SubmodelService.load_options(depth))
+        if fields:
+            return select(*AASSerializer.projected_columns(fields))
+        if AASSerializer.enabled:
+            return select(*AASSerializer.COLUMNS)
+        return select(AssetAdministrationShell)
+
+    @staticmethod
+    def read_rows(session, statement, fields: tuple = None, depth: int = 0) -> list:
+        """
+        Runs a query built on list_statement, returning its ORM objects or its column tuples.
+        """
+        result = session.execute(statement)
+        if depth or not (fields or AASSerializer.enabled):
+            return result.scalars().all()
+        return result.all()
+
+    @staticmethod
+    def show_aas_rows(aas_list, fields: tuple = None, depth: int = 0) -> list:
+        """
+        Returns the representation of each AAS of a list read by read_rows.
+        """
+        if depth:
+            return [SubmodelService.show_aas(aas, depth, fields) for aas in aas_list]
+        if fields:
+            return AASSerializer.show_projected_rows(aas_list, fields)
+        if AASSerializer.enabled:
+            return AASSerializer.show_rows(aas_list)
+        return show_aas_list(aas_list)["Asset Administration Shells"]
+
+    @staticmethod
+    def get_list(session, query: AASListQuerySchema, query_string: bytes, if_none_match: ETags) -> RouteResponse:
+        """
+        Returns all Asset Administration Shells, one page at a time with 'limit' and 'cursor',
+        or streamed as NDJSON or chunked JSON with 'stream'.
+        """
+        fields = selected_fields(query.fields)
+
+        # The list is not loaded at all if the client already has its current version
+        etag = ETagService.aas_list_etag(RepositoryState.get_list_stamp(session), query_string)
+        if if_none_match.contains_weak(etag):
+            return RouteResponse.not_modified(etag)
+
+        if query.stream:
+            logger.debug("Streaming Asset Administration Shells as %s", query.stream.value)
+            media_type = "application/x-ndjson" if query.stream == StreamFormat.NDJSON else "application/json"
+            return RouteResponse(etag=etag, media_type=media_type,
+                                 stream=lambda stream_session: AASRouteService.stream_list(
+                                     stream_session, query, fields))
+
+        logger.debug("Collecting Asset Administration Shells")
+        statement = AASRouteService.list_statement(fields, query.depth)
+
+        if query.limit is None and query.cursor is None:
+            aas_list = AASRouteService.read_rows(session, statement, fields, query.depth)
+            logger.debug("%s Asset Administration Shells found", len(aas_list))
+            return RouteResponse({"Asset Administration Shells": AASRouteService.show_aas_rows(
+                aas_list, fields, query.depth)}, etag=etag)
+
+        # Keyset pagination: the page starts right after the last primary key of the previous one
+        statement = statement.order_by(AssetAdministrationShell.id)
+        if query.cursor is not None:
+            statement = statement.where(AssetAdministrationShell.id > query.cursor)
+        if query.limit is not None:
+            statement = statement.limit(query.limit)
+
+        aas_list = AASRouteService.read_rows(session, statement, fields, query.depth)
+        next_cursor = None
+        if query.limit is not None and len(aas_list) == query.limit:
+            next_cursor = aas_list[-1].id
+
+        logger.debug("%s Asset Administration Shells found in page after cursor %s", len(aas_list), query.cursor)
+        return RouteResponse({"Asset Administration Shells": AASRouteService.show_aas_rows(
+            aas_list, fields, query.depth), "next_cursor": next_cursor}, etag=etag)
+
+    @staticmethod
+    def stream_list(session, query: AASListQuerySchema, fields: tuple = None):
+        """
+        Yields the list of the Asset Administration Shells as NDJSON or chunked JSON, fetching them in batches
+        with keyset pagination, so that memory usage does not depend on the size of the table.
+        """
+        statement = AASRouteService.list_statement(fields, query.depth).order_by(AssetAdministrationShell.id)
+        last_id = query.cursor or 0
+        remaining = query.limit
+        ndjson = query.stream == StreamFormat.NDJSON
+
+        if not ndjson:
+            yield b'{"Asset Administration Shells":['
+        separator = b""
+        while remaining is None or remaining > 0:
+            batch_size = AASRouteService.STREAM_BATCH_SIZE if remaining is None else \
+                min(remaining, AASRouteService.STREAM_BATCH_SIZE)
+            batch = AASRouteService.read_rows(session, statement.where(
+                AssetAdministrationShell.id > last_id).limit(batch_size), fields, query.depth)
+            if not batch:
+                break
+            last_id = batch[-1].id
+            if remaining is not None:
+                remaining -= len(batch)
+
+            views = [AASSerializer.dumps(aas_view) for aas_view in
+                     AASRouteService.show_aas_rows(batch, fields, query.depth)]
+            if ndjson:
+                yield b"".join(view + b"\n" for view in views)
+            else:
+                yield separator + b",".join(views)
+                separator = b","
+            # The objects of the batch are not needed anymore
+            session.expunge_all()
+            if len(batch) < batch_size:
+                break
+
+        if not ndjson:
+            yield b"]}\n"
+
+    @staticmethod
+    def filter(session, query: AASFilterSchema) -> RouteResponse:
+        """
+        Returns the Asset Administration Shells matching all the given filters, one page at a time.
+        """
+        logger.debug("Filtering Asset Administration Shells by %s", query.model_dump(exclude_none=True))
+
+        statement = AASRouteService.list_statement(depth=query.depth).where(
+            *AASFilterService.clauses(query)).order_by(AssetAdministrationShell.id).limit(query.limit)
+        aas_list = AASRouteService.read_rows(session, statement, depth=query.depth)
+        next_cursor = aas_list[-1].id if len(aas_list) == query.limit else None
+
+        logger.debug("%s Asset Administration Shells found", len(aas_list))
+        return RouteResponse({"Asset Administration Shells": AASRouteService.show_aas_rows(aas_list,
+                                                                                           depth=query.depth),
+                              "next_cursor": next_cursor})
+
+    @staticmethod
+    def search(session, query: AASTextSearchSchema) -> RouteResponse:
+        """
+        Searches the id_short and description of the Asset Administration Shells,
+        returning the best matches first with the matched words highlighted.
+        """
+        if not is_fulltext_enabled():
+            error_msg = "Full-text search requires an SQLite database with FTS5"
+            logger.warning(f"Error searching Asset Administration Shells: {error_msg}")
+            return RouteResponse.error(error_msg, 501)
+
+        if not query.q.strip():
+            error_msg = "Search text cannot be empty"
+            logger.warning(f"Error searching Asset Administration Shells: {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+
+        logger.debug("Searching Asset Administration Shells for '%s'", query.q)
+        results = AASFullText.search(session, query.q, query.limit)
+        logger.debug("%s Asset Administration Shells found for '%s'", len(results), query.q)
+        # The ranks are floats, which orjson formats differently from jsonify
+        return RouteResponse(show_aas_search_results(results), dumps=AASSerializer.dumps_standard)
+
+    @staticmethod
+    def changes_compacted(since: int, last_seq: int) -> RouteResponse:
+        """
+        Returns the 410 response for changes that were removed from the change log.
+        """
+        error_msg = ChangeFeedService.compacted_message(since)
+        logger.warning(f"Error reading changes after seq {since}, {error_msg}")
+        return RouteResponse.error(error_msg, 410, last_seq=last_seq or 0)
+
+    @staticmethod
+    def changes(session, query: AASChangeQuerySchema) -> RouteResponse:
+        """
+        Returns the changes of the Asset Administration Shells after the seq 'since', oldest first.
+        """
+        logger.debug("Collecting changes after seq %s", query.since)
+
+        AASChangeRelay.relay(session)
+        first_seq, last_seq = session.execute(AASChange.bounds_statement()).one()
+        if AASChange.is_compacted(first_seq, query.since):
+            return AASRouteService.changes_compacted(query.since, last_seq)
+
+        changes = session.scalars(AASChange.since_statement(query.since, query.limit)).all()
+        return RouteResponse(ChangeFeedService.page(changes, query.since, query.limit))
+
+    @staticmethod
+    def stream_changes(session, query: AASChangeStreamQuerySchema, last_event_id: str) -> RouteResponse:
+        """
+        Streams the changes of the Asset Administration Shells as Server-Sent Events, after 'since',
+        the Last-Event-ID header of a reconnecting client, or the last change.
+        """
+        since = query.since
+        if since is None and last_event_id.isdigit():
+            since = int(last_event_id)
+
+        AASChangeRelay.relay(session)
+        first_seq, last_seq = session.execute(AASChange.bounds_statement()).one()
+        if since is None:
+            since = last_seq or 0
+        elif AASChange.is_compacted(first_seq, since):
+            return AASRouteService.changes_compacted(since, last_seq)
+        logger.debug("Streaming changes after seq %s", since)
+
+        # X-Accel-Buffering keeps reverse proxies such as nginx from buffering the events
+        return RouteResponse(media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             stream=lambda stream_session: ChangeFeedService.stream(stream_session, since))
+
+    @staticmethod
+    def get(session, query: AASViewQuerySchema, if_none_match: ETags) -> RouteResponse:
+        """
+        Returns a specific Asset Administration Shell by its Unique Identifier, with only the selected
+        'fields' and with its Submodels down to 'depth'.
+        """
+        try:
+            decoded_aas_id = IDDecoderService.decode_id_or_raise(query.aas_id)
+        except ValueError as e:
+            return AASRouteService.invalid_encoded_id(query.aas_id, e)
+        logger.debug("Collecting data for Asset Administration Shell #%s", decoded_aas_id)
+        fields = selected_fields(query.fields)
+
+        # The cache only holds the AAS without its Submodels
+        cached_aas = aas_cache.get(decoded_aas_id) if not query.depth else None
+        if cached_aas is not None:
+            logger.debug("Asset Administration Shell data #%s found in cache", decoded_aas_id)
+            etag = ETagService.fields_etag(cached_aas["etag"], query.fields)
+            if if_none_match.contains_weak(etag):
+                return RouteResponse.not_modified(etag)
+            return RouteResponse(AASSerializer.project(cached_aas["aas"], fields) if fields else cached_aas["aas"],
+                                 etag=etag)
+
+        # Read before the AAS, so that a write committed meanwhile keeps it from being cached
+        generation = aas_cache.generation(decoded_aas_id)
+
+        # Only the version of the row is read if the client may already have the current one
+        if if_none_match:
+            aas_version = session.execute(
+                select(AssetAdministrationShell.id, AssetAdministrationShell.row_version).where(
+                    AssetAdministrationShell.aas_id == decoded_aas_id)).first()
+            if aas_version:
+                etag = ETagService.depth_etag(ETagService.fields_etag(
+                    ETagService.aas_etag(aas_version.id, aas_version.row_version), query.fields), query.depth)
+                if if_none_match.contains_weak(etag):
+                    return RouteResponse.not_modified(etag)
+
+        if query.depth:
+            aas = session.scalars(AASRouteService.list_statement(depth=query.depth).where(
+                AssetAdministrationShell.aas_id == decoded_aas_id)).first()
+            if not aas:
+                return AASRouteService.aas_not_found(decoded_aas_id)
+            logger.debug("Asset Administration Shell data #%s found with %s Submodels", decoded_aas_id,
+                         len(aas.submodels))
+            etag = ETagService.depth_etag(ETagService.fields_etag(
+                ETagService.aas_etag(aas.id, aas.row_version), query.fields), query.depth)
+            return RouteResponse(SubmodelService.show_aas(aas, query.depth, fields), etag=etag)
+
+        if fields:
+            # Only the selected columns are read, and the cache, which holds full representations, is not filled
+            row = session.execute(
+                select(*AASSerializer.projected_columns(fields), AssetAdministrationShell.row_version).where(
+                    AssetAdministrationShell.aas_id == decoded_aas_id)).first()
+            if not row:
+                return AASRouteService.aas_not_found(decoded_aas_id)
+            logger.debug("Fields %s of Asset Administration Shell #%s found", query.fields, decoded_aas_id)
+            etag = ETagService.fields_etag(ETagService.aas_etag(row.id, row.row_version), query.fields)
+            return RouteResponse(AASSerializer.show_projected_rows([row], fields)[0], etag=etag)
+
+        aas = session.scalars(select(AssetAdministrationShell).where(
+            AssetAdministrationShell.aas_id == decoded_aas_id)).first()
+        if not aas:
+            return AASRouteService.aas_not_found(decoded_aas_id)
+
+        logger.debug("Asset Administration Shell data #%s found", decoded_aas_id)
+        etag = ETagService.aas_etag(aas.id, aas.row_version)
+        aas_view = show_aas(aas)
+        aas_cache.set(decoded_aas_id, {"etag": etag, "aas": aas_view}, generation)
+        return RouteResponse(aas_view, etag=etag)
+
+    @staticmethod
+    def delete(session, query: AASSearchSchema, if_match: ETags) -> RouteResponse:
+        """
+        Deletes an Asset Administration Shell, only if it still matches If-Match when the header is sent.
+        """
+        try:
+            decoded_aas_id = IDDecoderService.decode_id_or_raise(query.aas_id)
+        except ValueError as e:
+            return AASRouteService.invalid_encoded_id(query.aas_id, e)
+        logger.debug("Deleting data from Asset Administration Shell #%s", decoded_aas_id)
+
+        # The primary key of the AAS identifies its Submodels, which are deleted with it
+        aas_version = session.execute(
+            select(AssetAdministrationShell.id, AssetAdministrationShell.row_version).where(
+                AssetAdministrationShell.aas_id == decoded_aas_id)).first()
+
+        count = 0
+        if aas_version:
+            # With If-Match, the AAS is only deleted if it was not modified since the client read it
+            row_version = None
+            if if_match:
+                if not if_match.contains(ETagService.aas_etag(aas_version.id, aas_version.row_version)):
+                    return AASRouteService.precondition_failed(decoded_aas_id)
+                row_version = aas_version.row_version
+
+            try:
+                count = AASWriteService.run(session, lambda write_session: AASWriteService.delete(
+                    write_session, decoded_aas_id, aas_version.id, row_version))
+            except StaleDataError:
+                # The row version changed between the lookup and the delete
+                return AASRouteService.precondition_failed(decoded_aas_id)
+        aas_cache.invalidate(decoded_aas_id)
+
+        if count:
+            logger.debug("Deleting Asset Administration Shell #%s", decoded_aas_id)
+            return RouteResponse({"message": "Asset Administration Shell deleted", "aas_id": decoded_aas_id})
+        else:
+            error_msg = "Asset Administration Shell not found in database"
+            logger.warning(f"Error deleting AAS #{decoded_aas_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 404)
+
+    @staticmethod
+    def update(session, form: AASUpdateSchema, if_match: ETags) -> RouteResponse:
+        """
+        Updates an existing Asset Administration Shell, only if it still matches If-Match when the header is sent.
+        """
+        # Strip whitespace from fields
+        strip_whitespace(form)
+        if form.update_aas_id:
+            form.update_aas_id = form.update_aas_id.strip()
+
+        aas_id = form.aas_id
+        new_aas_id = form.update_aas_id
+
+        logger.debug("Updating data for Asset Administration Shell #%s", aas_id)
+
+        # Load the AAS and every AAS that could conflict with the update in a single query
+        rows = session.scalars(AASConflictService.update_lookup(aas_id, new_aas_id, form.id_short)).all()
+        aas, conflict_msg = AASConflictService.resolve_update(rows, aas_id, new_aas_id, form.id_short)
+
+        # Verify if AAS with the aas_id exists in database
+        if not aas:
+            error_msg = "Asset Administration Shell not found in database"
+            logger.warning(f"Error updating Asset Administration Shell #{aas_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 404)
+
+        # With If-Match, the AAS is only updated if it was not modified since the client read it
+        if if_match and not if_match.contains(ETagService.aas_etag(aas.id, aas.row_version)):
+            return AASRouteService.precondition_failed(aas_id)
+
+        # Verify if another AAS already has the id_short or the new_aas_id
+        if conflict_msg:
+            logger.warning(f"Error updating Asset Administration Shell #{aas_id}, {conflict_msg}")
+            return RouteResponse.error(conflict_msg, 409)
+
+        # Validate required fields
+        if not check_required_fields(form):
+            error_msg = AASRouteService.REQUIRED_FIELDS_MSG
+            logger.warning(f"Error updating Asset Administration Shell #{aas_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+
+        aas_pk, row_version = aas.id, aas.row_version
+        values = AASWriteService.update_values(form)
+        try:
+            aas = AASWriteService.run(session, lambda write_session: AASWriteService.update(
+                write_session, aas_pk, row_version, values))
+        except StaleDataError:
+            # The row version changed between the lookup and the commit
+            return AASRouteService.precondition_failed(aas_id)
+        except IntegrityError as e:
+            # Another AAS claimed the id_short or the new_aas_id between the lookup and the commit
+            error_msg = AASConflictService.update_conflict_message(e, new_aas_id, form.id_short)
+            logger.warning(f"Error updating Asset Administration Shell #{aas_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 409)
+
+        aas_cache.invalidate(aas_id, new_aas_id)
+        logger.debug("Updated Asset Administration Shell #%s", aas_id)
+        return RouteResponse(show_aas(aas), etag=ETagService.aas_etag(aas.id, aas.row_version))
+
+    @staticmethod
+    def add_submodel(session, query: AASSearchSchema, body: SubmodelSchema) -> RouteResponse:
+        """
+        Adds a Submodel, with its tree of elements, to an Asset Administration Shell.
+        The Submodels are part of the representation of the AAS, so its version is incremented.
+        """
+        try:
+            decoded_aas_id = IDDecoderService.decode_id_or_raise(query.aas_id)
+        except ValueError as e:
+            return AASRouteService.invalid_encoded_id(query.aas_id, e)
+        logger.debug("Adding Submodel %s to Asset Administration Shell #%s", body.submodel_id, decoded_aas_id)
+
+        try:
+            element_rows = SubmodelService.element_rows(body.elements)
+        except ValueError as e:
+            error_msg = str(e)
+            logger.warning(f"Error adding Submodel {body.submodel_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+
+        aas_pk = session.scalar(select(AssetAdministrationShell.id).where(
+            AssetAdministrationShell.aas_id == decoded_aas_id))
+        if aas_pk is None:
+            error_msg = "Asset Administration Shell not found"
+            logger.warning(f"Error adding Submodel to Asset Administration Shell: {decoded_aas_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 404)
+
+        submodel = Submodel(aas_pk=aas_pk, submodel_id=body.submodel_id, id_short=body.id_short,
+                            semantic_id=body.semantic_id, description=body.description)
+        try:
+            # The Submodel is represented in the session of the write, which loads its elements
+            submodel_view = AASWriteService.run(session, lambda write_session: show_submodel(
+                AASWriteService.add_submodel(write_session, decoded_aas_id, aas_pk, submodel, element_rows),
+                AAS_MAX_DEPTH))
+        except IntegrityError as e:
+            error_msg = SubmodelService.conflict_message(e, body)
+            logger.warning(f"Error adding Submodel {body.submodel_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 409)
+
+        aas_cache.invalidate(decoded_aas_id)
+        logger.debug("Submodel %s added with %s elements", body.submodel_id, len(element_rows))
+        return RouteResponse(submodel_view)
+
+    @staticmethod
+    def delete_submodel(session, query: SubmodelSearchSchema, if_match: ETags) -> RouteResponse:
+        """
+        Deletes a Submodel of an Asset Administration Shell, with its elements, only if the AAS still
+        matches If-Match when the header is sent, with the ETag of any of its representations.
+        """
+        try:
+            decoded_aas_id = IDDecoderService.decode_id_or_raise(query.aas_id)
+        except ValueError as e:
+            return AASRouteService.invalid_encoded_id(query.aas_id, e)
+        try:
+            decoded_submodel_id = IDDecoderService.decode_id_or_raise(query.submodel_id)
+        except ValueError as e:
+            return AASRouteService.invalid_encoded_id(query.submodel_id, e)
+        logger.debug("Deleting Submodel %s of Asset Administration Shell #%s", decoded_submodel_id, decoded_aas_id)
+
+        aas_version = session.execute(
+            select(AssetAdministrationShell.id, AssetAdministrationShell.row_version).where(
+                AssetAdministrationShell.aas_id == decoded_aas_id)).first()
+
+        count = 0
+        if aas_version:
+            # With If-Match, the Submodel is only deleted if the AAS was not modified since the client read it
+            row_version = None
+            if if_match:
+                etag = ETagService.aas_etag(aas_version.id, aas_version.row_version)
+                if not any(if_match.contains(ETagService.depth_etag(etag, depth))
+                           for depth in range(AAS_MAX_DEPTH + 1)):
+                    return AASRouteService.precondition_failed(decoded_aas_id)
+                row_version = aas_version.row_version
+
+            try:
+                count = AASWriteService.run(session, lambda write_session: AASWriteService.delete_submodel(
+                    write_session, decoded_aas_id, aas_version.id, decoded_submodel_id, row_version))
+            except StaleDataError:
+                # The row version changed between the lookup and the delete
+                return AASRouteService.precondition_failed(decoded_aas_id)
+
+        if not count:
+            error_msg = "Submodel not found in the Asset Administration Shell"
+            logger.warning(f"Error deleting Submodel {decoded_submodel_id} of AAS #{decoded_aas_id}, {error_msg}")
+            return RouteResponse.error(error_msg, 404)
+
+        aas_cache.invalidate(decoded_aas_id)
+        return RouteResponse({"message": "Submodel deleted", "submodel_id": decoded_submodel_id})
+
+    @staticmethod
+    def stats(snapshot, query: AASStatsQuerySchema) -> RouteResponse:
+        """
+        Returns the statistics of the Asset Administration Shells, computed from the columnar snapshot.
+        \f
+        :param snapshot: The snapshot of aas_snapshot, None while it is not built yet.
+        """
+        if snapshot is None:
+            error_msg = "The snapshot of the Asset Administration Shells is not built yet, retry later"
+            logger.warning(f"Error reading the statistics, {error_msg}")
+            return RouteResponse.error(error_msg, 503)
+        # The histograms hold floats, which orjson formats differently from jsonify
+        return RouteResponse(snapshot.stats(selected_dimensions(query.group_by)), dumps=AASSerializer.dumps_standard)
+
+    @staticmethod
+    def convert_ids(stream: BinaryIO, mimetype: str, encode: bool) -> RouteResponse:
+        """
+        Encodes or decodes the IDs of a request body: a JSON array, an NDJSON stream or a text stream
+        with one ID per line.
+        """
+        if mimetype == "text/plain":
+            items = IDDecoderService.read_lines(stream)
+        else:
+            items = AASBulkService.read_items(
+                stream, mimetype, "Request body must be a JSON array, an NDJSON stream or a text stream of IDs")
+
+        try:
+            batch_result = IDDecoderService.convert_ids(items, encode)
+        except ValueError as e:
+            error_msg = str(e)
+            logger.warning(f"Error converting batch of IDs: {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+
+        logger.debug("Batch of IDs converted: %s converted, %s invalid", batch_result["converted"],
+                     batch_result["invalid"])
+        return RouteResponse(batch_result)
+
+    @staticmethod
+    def generate_ids(query: ModelTypeSchema) -> RouteResponse:
+        """
+        Generate examples for aas_id or asset_id and show them with Base64Encode parameter.
+        With 'count' greater than 1, a list of distinct IDs is returned.
+        """
+        type_model = query.type_model.value
+
+        try:
+            ids = [
+                show_encode_decode_ids(IdEncodeDecodeSchema(
+                    decode_aas_id=decode_id,
+                    encode_aas_id=IDDecoderService.encode_id_or_raise(decode_id)
+                ))
+                for decode_id in IDDecoderService.generate_ids(type_model, query.count)
+            ]
+
+            if query.count == 1:
+                return RouteResponse(ids[0])
+            return RouteResponse({"ids": ids})
+
+        except Exception as e:
+            # Handle unexpected errors
+            error_msg = f"Error during ID generation or encoding: {str(e)}"
+            logger.warning(f"Error during ID generation or encoding of {type_model} IDs, {error_msg}")
+            return RouteResponse.error(error_msg, 500)
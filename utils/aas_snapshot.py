@@ -0,0 +1,431 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from itertools import compress
+from typing import Dict, List, Tuple, Union
+
+from sqlalchemy import select
+
+import model
+from logger import logger
+from model.aas_change import AASChange
+from model.aas_change_relay import AASChangeRelay
+from model.asset_administration_shell import AssetAdministrationShell
+from schemas.asset_administration_shell import AAS_STATS_DIMENSIONS
+
+# Columns of the snapshot and the type code of their arrays. The string columns hold the code
+# of their value in a dictionary, and aas_hash identifies the rows named by the change log
+COLUMNS = {
+    "pk": "q",
+    "aas_hash": "Q",
+    "live": "B",
+    "asset_kind": "I",
+    "version": "I",
+    "revision": "I",
+    "creation_month": "I",
+}
+
+# Dictionary-encoded columns, in the order of the keys of the counts by combination
+ENCODED_COLUMNS = ("asset_kind", "version", "revision", "creation_month")
+
+# Header of the snapshot file: a magic number and the length of the JSON description of the columns
+FILE_MAGIC = b"AASSNAP1"
+FILE_HEADER = struct.Struct("<8sQ")
+
+
+def aas_hash(aas_id: str) -> int:
+    """
+    Returns the 64-bit hash identifying an aas_id in the snapshot, never 0, which marks deleted rows.
+    """
+    return int.from_bytes(hashlib.blake2b(aas_id.encode(), digest_size=8).digest(), "little") or 1
+
+
+def padded(size: int) -> int:
+    """
+    Returns the size rounded up to a multiple of 8 bytes, so that every column of the file is aligned.
+    """
+    return (size + 7) & ~7
+
+
+class AASSnapshot:
+    """
+    Columnar copy of the asset_administration_shell table, in primary key order, answering the aggregate
+    endpoints without reading the database. Strings are dictionary-encoded: each column holds the code of
+    the value in its dictionary. The number of rows of each combination of codes is kept up to date, so
+    that counts and histograms are computed from these combinations rather than from the rows.
+    Deleted rows stay as tombstones until the next compaction, so that the other rows keep their position.
+    A snapshot is never modified: updates build a new one, which readers pick up atomically.
+    \f
+    :param columns: The arrays, or memory-mapped views, of the columns, by name.
+    :param dictionaries: The values of each encoded column, indexed by code.
+    :param combinations: The number of live rows of each combination of codes of the encoded columns.
+    :param last_seq: The seq of the last change of the change log included in the snapshot.
+    :param built_at: The time of the build, as a Unix timestamp.
+    :param source: The databases the snapshot was built from, so that a file of another database is ignored.
+    """
+
+    # Number of rows read from the database at a time by a full build
+    BATCH_SIZE = 5000
+
+    # Maximum number of aas_id per query when the changed rows are read
+    CHANGED_BATCH_SIZE = 500
+
+    # A full build is cheaper than an update changing more than this share of the rows
+    REBUILD_RATIO = 0.5
+
+    # Tombstones are removed when they make up more than this share of the rows
+    COMPACTION_RATIO = 0.25
+
+    def __init__(self, columns: Dict[str, object], dictionaries: Dict[str, list], combinations: Dict[tuple, int],
+                 last_seq: int, built_at: float, source: str) -> None:
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.combinations = combinations
+        self.last_seq = last_seq
+        self.built_at = built_at
+        self.source = source
+        self.total = sum(combinations.values())
+        self._groups = {}
+
+    @staticmethod
+    def rows_statement():
+        """
+        Returns the query of the columns of the snapshot.
+        """
+        return select(AssetAdministrationShell.id, AssetAdministrationShell.aas_id,
+                      AssetAdministrationShell.asset_kind, AssetAdministrationShell.version,
+                      AssetAdministrationShell.revision, AssetAdministrationShell.creation_date)
+
+    @staticmethod
+    def build(session, source: str) -> "AASSnapshot":
+        """
+        Builds a snapshot from every row of the table. The last seq of the change log is read first,
+        in the same transaction, so that the changes committed meanwhile are applied by the next update.
+        In a sharded repository, the changes of the shards are copied to the log before (see AASChangeRelay).
+        """
+        AASChangeRelay.relay(session)
+        last_seq = session.execute(AASChange.bounds_statement()).one()[1] or 0
+        columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        dictionaries = {name: [] for name in ENCODED_COLUMNS}
+        codes = {name: {} for name in ENCODED_COLUMNS}
+        combinations = Counter()
+
+        rows = session.execute(AASSnapshot.rows_statement().order_by(AssetAdministrationShell.id)
+                               .execution_options(yield_per=AASSnapshot.BATCH_SIZE))
+        for row in rows:
+            combination = AASSnapshot.encode(row, dictionaries, codes)
+            columns["pk"].append(row.id)
+            columns["aas_hash"].append(aas_hash(row.aas_id))
+            columns["live"].append(1)
+            for name, code in zip(ENCODED_COLUMNS, combination):
+                columns[name].append(code)
+            combinations[combination] += 1
+        return AASSnapshot(columns, dictionaries, dict(combinations), last_seq, time.time(), source)
+
+    @staticmethod
+    def encode(row, dictionaries: Dict[str, list], codes: Dict[str, dict]) -> tuple:
+        """
+        Returns the codes of the values of a row, adding the new values to the dictionaries.
+        """
+        values = (
+            row.asset_kind.value if row.asset_kind else None,
+            row.version,
+            row.revision,
+            row.creation_date.strftime("%Y-%m") if row.creation_date else None,
+        )
+        combination = []
+        for name, value in zip(ENCODED_COLUMNS, values):
+            code = codes[name].get(value)
+            if code is None:
+                code = codes[name][value] = len(dictionaries[name])
+                dictionaries[name].append(value)
+            combination.append(code)
+        return tuple(combination)
+
+    def updated(self, session) -> "AASSnapshot":
+        """
+        Returns the snapshot with the changes recorded in the change log since it was built: the rows of
+        the changed aas_id are read again, and the rows of the deleted ones become tombstones.
+        Returns the snapshot itself if nothing changed, and a full build if the changes it misses were
+        removed from the log or if they touch too many rows.
+        """
+        AASChangeRelay.relay(session)
+        first_seq, last_seq = session.execute(AASChange.bounds_statement()).one()
+        if last_seq is None and self.last_seq == 0 or last_seq == self.last_seq:
+            return self
+        if last_seq is None or last_seq < self.last_seq or AASChange.is_compacted(first_seq, self.last_seq):
+            # The change log was compacted past the snapshot, or belongs to another database
+            return AASSnapshot.build(session, self.source)
+
+        changed = set()
+        for aas_id, previous_aas_id in session.execute(
+                select(AASChange.aas_id, AASChange.previous_aas_id).where(
+                    AASChange.seq > self.last_seq, AASChange.seq <= last_seq)):
+            changed.add(aas_id)
+            if previous_aas_id is not None:
+                changed.add(previous_aas_id)
+        if len(changed) > self.REBUILD_RATIO * len(self.columns["pk"]):
+            return AASSnapshot.build(session, self.source)
+
+        columns = {name: array(typecode, bytes(self.columns[name])) for name, typecode in COLUMNS.items()}
+        dictionaries = {name: list(values) for name, values in self.dictionaries.items()}
+        codes = {name: {value: code for code, value in enumerate(values)} for name, values in dictionaries.items()}
+        combinations = Counter(self.combinations)
+
+        # Removes the current version of the changed rows, then adds the rows that still exist
+        hashes = {aas_hash(aas_id) for aas_id in changed}
+        for position in [position for position, value in enumerate(columns["aas_hash"]) if value in hashes]:
+            AASSnapshot.remove(columns, combinations, position)
+
+        pks = columns["pk"]
+        changed = list(changed)
+        for start in range(0, len(changed), self.CHANGED_BATCH_SIZE):
+            batch = changed[start:start + self.CHANGED_BATCH_SIZE]
+            for row in session.execute(self.rows_statement().where(AssetAdministrationShell.aas_id.in_(batch))):
+                position = bisect_left(pks, row.id)
+                if position < len(pks) and pks[position] == row.id:
+                    if columns["live"][position]:
+                        AASSnapshot.remove(columns, combinations, position)
+                else:
+                    for name in COLUMNS:
+                        columns[name].insert(position, 0)
+                    pks[position] = row.id
+
+                combination = AASSnapshot.encode(row, dictionaries, codes)
+                columns["aas_hash"][position] = aas_hash(row.aas_id)
+                columns["live"][position] = 1
+                for name, code in zip(ENCODED_COLUMNS, combination):
+                    columns[name][position] = code
+                combinations[combination] += 1
+
+        combinations = {combination: count for combination, count in combinations.items() if count > 0}
+        if len(pks) - sum(combinations.values()) > self.COMPACTION_RATIO * len(pks):
+            live = columns["live"]
+            columns = {name: array(typecode, compress(columns[name], live)) for name, typecode in COLUMNS.items()}
+        return AASSnapshot(columns, dictionaries, combinations, last_seq, time.time(), self.source)
+
+    @staticmethod
+    def remove(columns: Dict[str, array], combinations: Counter, position: int) -> None:
+        """
+        Turns a row into a tombstone, removing it from the counts.
+        """
+        combinations[tuple(columns[name][position] for name in ENCODED_COLUMNS)] -= 1
+        columns["live"][position] = 0
+        columns["aas_hash"][position] = 0
+
+    def value(self, dimension: str, combination: tuple) -> Union[str, None]:
+        """
+        Returns the value of a dimension for a combination of codes.
+        """
+        if dimension == "creation_year":
+            month = self.dictionaries["creation_month"][combination[ENCODED_COLUMNS.index("creation_month")]]
+            return month[:4] if month else None
+        return self.dictionaries[dimension][combination[ENCODED_COLUMNS.index(dimension)]]
+
+    def group_by(self, dimensions: Tuple[str, ...]) -> List[dict]:
+        """
+        Returns the number of Asset Administration Shells by value of the given dimensions, in the order
+        of the values, with None first. The result is computed once per snapshot.
+        """
+        groups = self._groups.get(dimensions)
+        if groups is None:
+            counts = Counter()
+            for combination, count in self.combinations.items():
+                counts[tuple(self.value(dimension, combination) for dimension in dimensions)] += count
+            groups = [{**dict(zip(dimensions, values)), "count": count}
+                      for values, count in sorted(counts.items(), key=lambda item: tuple(
+                          (value is not None, value or "") for value in item[0]))]
+            self._groups[dimensions] = groups
+        return groups
+
+    def stats(self, dimensions: Tuple[str, ...] = ()) -> dict:
+        """
+        Returns the total, the histogram of every dimension and, if dimensions are given, the counts by
+        combination of their values.
+        """
+        stats = {
+            "total": self.total,
+            "last_seq": self.last_seq,
+            "built_at": datetime.fromtimestamp(self.built_at).isoformat(),
+            "age": round(time.time() - self.built_at, 3),
+            "histograms": {
+                dimension: [{"value": group[dimension], "count": group["count"]}
+                            for group in self.group_by((dimension,))]
+                for dimension in AAS_STATS_DIMENSIONS
+            },
+        }
+        if dimensions:
+            stats["groups"] = self.group_by(dimensions)
+        return stats
+
+    def save(self, path: str) -> None:
+        """
+        Writes the snapshot to a file, replaced atomically, so that other processes can map it.
+        """
+        offset, layout = 0, {}
+        for name in COLUMNS:
+            size = len(self.columns[name]) * array(COLUMNS[name]).itemsize
+            layout[name] = [offset, size]
+            offset += padded(size)
+        header = json.dumps({
+            "source": self.source,
+            "last_seq": self.last_seq,
+            "built_at": self.built_at,
+            "dictionaries": self.dictionaries,
+            "combinations": [[*combination, count] for combination, count in self.combinations.items()],
+            "columns": layout,
+        }).encode()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(FILE_HEADER.pack(FILE_MAGIC, len(header)))
+            file.write(header.ljust(padded(FILE_HEADER.size + len(header)) - FILE_HEADER.size, b" "))
+            for name in COLUMNS:
+                data = bytes(self.columns[name])
+                file.write(data.ljust(padded(len(data)), b"\0"))
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def load(path: str, source: str) -> Union["AASSnapshot", None]:
+        """
+        Maps a snapshot file into memory: the columns are read-only views of the file, shared with
+        the other processes mapping it. Returns None if the file was built from another database.
+        """
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_size = FILE_HEADER.unpack_from(mapped)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        header = json.loads(mapped[FILE_HEADER.size:FILE_HEADER.size + header_size])
+        if header["source"] != source:
+            return None
+
+        data = memoryview(mapped)[padded(FILE_HEADER.size + header_size):]
+        columns = {name: data[offset:offset + size].cast(COLUMNS[name])
+                   for name, (offset, size) in header["columns"].items()}
+        combinations = {tuple(item[:-1]): item[-1] for item in header["combinations"]}
+        return AASSnapshot(columns, header["dictionaries"], combinations, header["last_seq"], header["built_at"],
+                           source)
+
+
+class AASSnapshotService:
+    """
+    Keeps the snapshot of the process up to date: a background thread, started by the first read, applies
+    the change log to it every few seconds. Each update is saved to a file, which the other workers map
+    instead of building their own copy.
+    \f
+    :param path: The snapshot file, or an empty string to keep the snapshot in memory only.
+    :param interval: Time between two updates, in seconds.
+    """
+
+    # Time, in seconds, a read waits for the first build before giving up
+    BUILD_TIMEOUT = float(os.environ.get("AAS_SNAPSHOT_BUILD_TIMEOUT", 30))
+
+    def __init__(self, path: str, interval: float) -> None:
+        self.path = path
+        self.interval = interval
+        self.snapshot = None
+        self._file_mtime = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def get(self, timeout: Union[float, None] = None) -> Union[AASSnapshot, None]:
+        """
+        Returns the current snapshot, waiting for the first build if needed.
+        Returns None if the first build did not finish in time.
+        """
+        if self._thread is None:
+            self.start()
+        if self.snapshot is None:
+            self._ready.wait(self.BUILD_TIMEOUT if timeout is None else timeout)
+        return self.snapshot
+
+    def start(self) -> None:
+        """
+        Starts the thread updating the snapshot.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="aas-snapshot", daemon=True)
+                self._thread.start()
+
+    def run(self) -> None:
+        """
+        Updates the snapshot every interval, until the process exits.
+        """
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Error updating the snapshot of the Asset Administration Shells: {str(e)}")
+            time.sleep(self.interval)
+
+    def refresh(self) -> AASSnapshot:
+        """
+        Brings the snapshot up to date: adopts the file saved by another worker if it is more recent,
+        applies the changes recorded since, and saves the result.
+        """
+        source = ",".join([model.db_url, *model.shard_urls.values()])
+        snapshot = self.snapshot
+        stored = self.read_file(source)
+        if stored is not None and (snapshot is None or stored.last_seq > snapshot.last_seq):
+            snapshot = stored
+
+        with model.create_session() as session:
+            if snapshot is None:
+                updated = AASSnapshot.build(session, source)
+            else:
+                updated = snapshot.updated(session)
+        if updated is not snapshot:
+            self.write_file(updated)
+        self.snapshot = updated
+        self._ready.set()
+        return updated
+
+    def read_file(self, source: str) -> Union[AASSnapshot, None]:
+        """
+        Maps the snapshot file if it changed since it was last read or written by this process.
+        """
+        if not self.path:
+            return None
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._file_mtime:
+                return None
+            self._file_mtime = mtime
+            return AASSnapshot.load(self.path, source)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Error reading the snapshot file {self.path}: {str(e)}")
+            return None
+
+    def write_file(self, snapshot: AASSnapshot) -> None:
+        """
+        Saves the snapshot for the other workers, keeping it in memory only if the file cannot be written.
+        """
+        if not self.path:
+            return
+        try:
+            snapshot.save(self.path)
+            self._file_mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Error writing the snapshot file {self.path}: {str(e)}")
+
+
+aas_snapshot = AASSnapshotService(
+    os.environ.get("AAS_SNAPSHOT_PATH", os.path.join(model.db_path, "aas_snapshot.bin")),
+    float(os.environ.get("AAS_SNAPSHOT_INTERVAL", 10))
+)
@@ -0,0 +1,269 @@
+import gzip
+import io
+import json
+import shutil
+import zipfile
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterable, Iterator, List, Tuple, Union
+
+from sqlalchemy import select
+
+from logger import logger
+from model.asset_administration_shell import AssetAdministrationShell
+from schemas.asset_administration_shell import AASImportSchema, ExportFormat, ImportPolicy
+from utils.aas_bulk_service import AASBulkService
+from utils.aas_serializer import AASSerializer
+from utils.compression_service import GzipEncoder
+
+
+class StreamBuffer(io.RawIOBase):
+    """
+    Write-only file that keeps what was written until it is drained, so that zipfile can write
+    an archive piece by piece into a streamed response.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipEncoder:
+    """
+    Writes a stream of chunks as the NDJSON entry of a zip archive, followed by a manifest.
+    The archive is written without seeking, so it can be sent while it is being built.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = StreamBuffer()
+        self._archive = zipfile.ZipFile(self._buffer, "w", compression=zipfile.ZIP_DEFLATED)
+        self._entry = self._archive.open(AASTransferService.ZIP_ENTRY, "w", force_zip64=True)
+        self._count = 0
+
+    def encode(self, chunk: bytes) -> bytes:
+        self._entry.write(chunk)
+        self._count += chunk.count(b"\n")
+        return self._buffer.drain()
+
+    def finish(self) -> bytes:
+        self._entry.close()
+        manifest = {"format": "aas-ndjson", "version": 1, "count": self._count,
+                    "exported_at": datetime.now().isoformat()}
+        self._archive.writestr(AASTransferService.ZIP_MANIFEST, json.dumps(manifest, indent=2))
+        self._archive.close()
+        return self._buffer.drain()
+
+
+class IdentityEncoder:
+    """
+    Leaves the chunks of an NDJSON export as they are.
+    """
+
+    def encode(self, chunk: bytes) -> bytes:
+        return chunk
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class AASTransferService:
+    """
+    Exports the whole repository as NDJSON, optionally compressed, and imports such exports back
+    through the chunked bulk inserts. Both directions work in batches, so memory usage does not
+    depend on the number of Asset Administration Shells.
+    """
+
+    # Columns of the export: the representation of show_aas and the creation date
+    COLUMNS = AASSerializer.COLUMNS + (AssetAdministrationShell.creation_date,)
+
+    ZIP_ENTRY = "aas.ndjson"
+    ZIP_MANIFEST = "manifest.json"
+
+    MIMETYPES = {
+        ExportFormat.NDJSON: "application/x-ndjson",
+        ExportFormat.GZIP: "application/gzip",
+        ExportFormat.ZIP: "application/zip",
+    }
+    EXTENSIONS = {
+        ExportFormat.NDJSON: "ndjson",
+        ExportFormat.GZIP: "ndjson.gz",
+        ExportFormat.ZIP: "zip",
+    }
+
+    # Number of errors listed in the result of an import, the others are only counted
+    MAX_REPORTED_ERRORS = 100
+
+    # Number of times a chunk is checked and written again after a concurrent write made it fail
+    MAX_CHUNK_ATTEMPTS = 3
+
+    # Size above which an uploaded archive is spooled to disk instead of kept in memory
+    SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+    @staticmethod
+    def encoder(export_format: ExportFormat):
+        """
+        Returns the encoder of the export format.
+        """
+        if export_format == ExportFormat.GZIP:
+            return GzipEncoder()
+        if export_format == ExportFormat.ZIP:
+            return ZipEncoder()
+        return IdentityEncoder()
+
+    @staticmethod
+    def filename(export_format: ExportFormat) -> str:
+        """
+        Returns the name of the export file, with the current date.
+        """
+        return f"aas-export-{datetime.now():%Y%m%d-%H%M%S}.{AASTransferService.EXTENSIONS[export_format]}"
+
+    @staticmethod
+    def batch_statement(last_id: int, batch_size: int):
+        """
+        Returns the query of the batch of the export after the given primary key.
+        Keyset pagination keeps every batch as fast as the first one.
+        """
+        return select(*AASTransferService.COLUMNS).where(
+            AssetAdministrationShell.id > last_id).order_by(AssetAdministrationShell.id).limit(batch_size)
+
+    @staticmethod
+    def dump_batch(rows: List) -> bytes:
+        """
+        Encodes a batch of exported rows as NDJSON lines.
+        """
+        views = AASSerializer.show_rows(row[:-1] for row in rows)
+        lines = []
+        for view, row in zip(views, rows):
+            creation_date = row[-1]
+            view["creation_date"] = creation_date.isoformat() if creation_date else None
+            lines.append(AASSerializer.dumps(view))
+        lines.append(b"")
+        return b"\n".join(lines)
+
+    @staticmethod
+    def export(session, export_format: ExportFormat, batch_size: int) -> Iterator[bytes]:
+        """
+        Yields the export of every Asset Administration Shell, ordered by primary key.
+        """
+        encoder = AASTransferService.encoder(export_format)
+        last_id = 0
+        while True:
+            rows = session.execute(AASTransferService.batch_statement(last_id, batch_size)).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            data = encoder.encode(AASTransferService.dump_batch(rows))
+            if data:
+                yield data
+        yield encoder.finish()
+
+    @staticmethod
+    def read_import(stream: BinaryIO, mimetype: str, content_encoding: str = None):
+        """
+        Reads the items of an import from an NDJSON stream, compressed with gzip or inside a zip archive.
+        Yields pairs of (position, item), where the item is an exception if it could not be parsed.
+        """
+        if mimetype in ("application/zip", "application/x-zip-compressed"):
+            # The directory of a zip archive is at its end, so the upload is spooled to a seekable file
+            with SpooledTemporaryFile(max_size=AASTransferService.SPOOL_MAX_SIZE) as spool:
+                shutil.copyfileobj(stream, spool)
+                spool.seek(0)
+                try:
+                    archive = zipfile.ZipFile(spool)
+                    entry = archive.open(AASTransferService.ZIP_ENTRY)
+                except (zipfile.BadZipFile, KeyError) as e:
+                    raise ValueError(f"Invalid export archive: {str(e)}") from e
+                with archive, entry:
+                    yield from AASBulkService.read_ndjson(entry)
+        elif mimetype in ("application/gzip", "application/x-gzip") or content_encoding == "gzip":
+            try:
+                yield from AASBulkService.read_ndjson(gzip.GzipFile(fileobj=stream, mode="rb"))
+            except (OSError, EOFError) as e:
+                raise ValueError(f"Invalid gzip export: {str(e)}") from e
+        elif mimetype == "application/x-ndjson":
+            yield from AASBulkService.read_ndjson(stream)
+        else:
+            raise ValueError("Request body must be an NDJSON export, compressed with gzip or in a zip archive")
+
+    @staticmethod
+    def import_items(session, items: Iterable[Tuple[int, Union[dict, Exception]]], policy: ImportPolicy,
+                     chunk_size: int) -> dict:
+        """
+        Saves the items of an import in chunks of one transaction each, following the conflict policy.
+        \f
+        :param session: The database session.
+        :param items: Pairs of (position in the export, parsed item).
+        :param policy: What to do with the items that conflict with existing Asset Administration Shells.
+        :param chunk_size: Number of items saved per transaction.
+        :return: The number of items per status, whether the whole import was saved, and the first errors.
+        """
+        summary = {"created": 0, "updated": 0, "skipped": 0, "invalid": 0}
+        errors = []
+        chunk = []
+
+        def report(result: dict) -> None:
+            if len(errors) < AASTransferService.MAX_REPORTED_ERRORS:
+                errors.append(result)
+
+        def save(chunk: List[Tuple[int, AASImportSchema]]) -> bool:
+            for attempt in range(AASTransferService.MAX_CHUNK_ATTEMPTS):
+                results, to_insert, to_update = AASBulkService.plan_chunk(
+                    session, chunk, upsert=policy == ImportPolicy.OVERWRITE)
+                conflicts = [result for result in results if result.get("status") == "conflict"]
+                if conflicts and policy == ImportPolicy.FAIL:
+                    session.rollback()
+                    report(conflicts[0])
+                    return False
+
+                # Another request wrote one of the AAS after the check, and the whole chunk was rolled back:
+                # the check is run again, so that the policy decides about the new conflicts
+                results = AASBulkService.write_chunk(session, results, to_insert, to_update)
+                failed = [result for result, _ in to_insert + to_update if result["status"] == "conflict"]
+                if not failed:
+                    break
+                if policy == ImportPolicy.FAIL or attempt == AASTransferService.MAX_CHUNK_ATTEMPTS - 1:
+                    report(failed[0])
+                    return False
+
+            for result in results:
+                if result["status"] == "conflict":
+                    summary["skipped"] += 1
+                    report(result)
+                else:
+                    summary[result["status"]] += 1
+            return True
+
+        for index, item in items:
+            form, error_msg = AASBulkService.validate_item(item, AASImportSchema)
+            if error_msg:
+                aas_id = item.get("aas_id") if isinstance(item, dict) else None
+                summary["invalid"] += 1
+                report({"index": index, "aas_id": aas_id, "status": "invalid", "message": error_msg})
+                if policy == ImportPolicy.FAIL:
+                    return {**summary, "completed": False, "errors": errors}
+                continue
+
+            chunk.append((index, form))
+            if len(chunk) >= chunk_size:
+                if not save(chunk):
+                    return {**summary, "completed": False, "errors": errors}
+                chunk = []
+
+        if chunk and not save(chunk):
+            return {**summary, "completed": False, "errors": errors}
+
+        logger.debug("Import saved: %s created, %s updated, %s skipped, %s invalid", summary["created"],
+                     summary["updated"], summary["skipped"], summary["invalid"])
+        return {**summary, "completed": True, "errors": errors}
@@ -0,0 +1,158 @@
+from typing import Callable, List, Union
+
+from sqlalchemy import delete, insert, inspect
+from sqlalchemy.orm.exc import StaleDataError
+
+from model.aas_change import AASChange, ChangeOperation
+from model.aas_shard_index import AASShardIndex
+from model.asset_administration_shell import AssetAdministrationShell, AssetKind
+from model.submodel import Submodel
+from model.submodel_element import SubmodelElement
+from schemas.asset_administration_shell import AASUpdateSchema
+from utils.submodel_service import SubmodelService
+from utils.write_batcher import write_batcher
+
+
+class AASWriteService:
+    """
+    Writes of single Asset Administration Shells, each with its entry in the change log, as functions of a
+    session that do not commit. The routes run them with AASWriteService.run, which commits them either on
+    their own or together with concurrent writes (see WriteBatcher).
+    """
+
+    @staticmethod
+    def run(session, write: Callable):
+        """
+        Runs a write and commits it: together with the writes of the concurrent requests when group commit
+        is enabled, otherwise on its own in the session.
+        \f
+        :param session: The session of the request, a synchronous one (see AsyncSession.run_sync).
+        :param write: A function of a session that does not commit, e.g. AASWriteService.create.
+        :return: The result of the write.
+        """
+        if write_batcher.enabled:
+            return write_batcher.run(write)
+        try:
+            result = write(session)
+            session.commit()
+            return result
+        except Exception:
+            session.rollback()
+            raise
+
+    @staticmethod
+    def create(session, aas: AssetAdministrationShell) -> AssetAdministrationShell:
+        """
+        Inserts a new AAS.
+        \f
+        :raises IntegrityError: If another AAS already has its aas_id or id_short.
+        """
+        session.add(aas)
+        session.flush()
+        AASChange.record(session, ChangeOperation.CREATED, aas.aas_id, aas.row_version,
+                         shard=inspect(aas).identity_token)
+        return aas
+
+    @staticmethod
+    def update_values(form: AASUpdateSchema) -> dict:
+        """
+        Returns the new values of the columns of an AAS updated with the form.
+        """
+        values = {
+            "id_short": form.id_short,
+            "asset_kind": AssetKind(form.asset_kind),
+            "global_asset_id": form.global_asset_id,
+            "version": form.version,
+            "revision": form.revision,
+            "description": form.description,
+        }
+        if form.update_aas_id:
+            values["aas_id"] = form.update_aas_id
+        return values
+
+    @staticmethod
+    def update(session, aas_pk: int, row_version: int, values: dict) -> AssetAdministrationShell:
+        """
+        Updates an AAS, if it still has the version read by the request.
+        \f
+        :raises StaleDataError: If the AAS was modified or deleted since it was read.
+        :raises IntegrityError: If another AAS claimed the new aas_id or id_short.
+        """
+        # The session of the request already holds the AAS, another session reads it by primary key
+        aas = session.get(AssetAdministrationShell, aas_pk)
+        if aas is None or aas.row_version != row_version:
+            raise StaleDataError(f"Asset Administration Shell #{aas_pk} was modified since it was read")
+
+        previous_aas_id = aas.aas_id
+        for name, value in values.items():
+            setattr(aas, name, value)
+
+        # Flushing the update gives the change log the new row version
+        session.flush()
+        AASChange.record(session, ChangeOperation.UPDATED, aas.aas_id, aas.row_version,
+                         previous_aas_id=previous_aas_id if aas.aas_id != previous_aas_id else None,
+                         shard=inspect(aas).identity_token)
+        return aas
+
+    @staticmethod
+    def delete(session, aas_id: str, aas_pk: int, row_version: Union[int, None] = None) -> int:
+        """
+        Deletes an AAS with its Submodels, only if it still has the given version, if any.
+        \f
+        :return: The number of deleted AAS.
+        :raises StaleDataError: If a version is given and the AAS was modified or deleted since it was read.
+        """
+        # Read before the delete removes the AAS from the index
+        shard = AASShardIndex.shard_of(session, aas_pk)
+        statement = delete(AssetAdministrationShell).where(AssetAdministrationShell.aas_id == aas_id)
+        if row_version is not None:
+            statement = statement.where(AssetAdministrationShell.row_version == row_version)
+        count = session.execute(statement).rowcount
+        if not count:
+            if row_version is not None:
+                raise StaleDataError(f"Asset Administration Shell #{aas_pk} was modified since it was read")
+            return count
+
+        # The primary key of the AAS identifies its Submodels, which are deleted with it
+        SubmodelService.delete_submodels(session, Submodel.aas_pk == aas_pk)
+        AASChange.record(session, ChangeOperation.DELETED, aas_id, shard=shard)
+        return count
+
+    @staticmethod
+    def add_submodel(session, aas_id: str, aas_pk: int, submodel: Submodel, element_rows: List[dict]) -> Submodel:
+        """
+        Adds a Submodel with its elements to an AAS, whose version is incremented, since the Submodels are
+        part of its representation.
+        \f
+        :param element_rows: The rows of the element tree, see SubmodelService.element_rows.
+        :raises IntegrityError: If the submodel_id already exists, or its id_short in the AAS.
+        """
+        # The unique constraints on submodel_id and on the id_short in the AAS detect duplicates
+        session.add(submodel)
+        session.flush()
+        if element_rows:
+            session.execute(insert(SubmodelElement), [{**row, "submodel_pk": submodel.id} for row in element_rows])
+        row_version = SubmodelService.touch_aas(session, aas_pk)
+        AASChange.record(session, ChangeOperation.UPDATED, aas_id, row_version,
+                         shard=AASShardIndex.shard_of(session, aas_pk))
+        return submodel
+
+    @staticmethod
+    def delete_submodel(session, aas_id: str, aas_pk: int, submodel_id: str,
+                        row_version: Union[int, None] = None) -> int:
+        """
+        Deletes a Submodel of an AAS with its elements, only if the AAS still has the given version, if any.
+        The version of the AAS is incremented.
+        \f
+        :return: The number of deleted Submodels.
+        :raises StaleDataError: If a version is given and the AAS was modified or deleted since it was read.
+        """
+        count = SubmodelService.delete_submodels(session, Submodel.aas_pk == aas_pk,
+                                                 Submodel.submodel_id == submodel_id)
+        if not count:
+            return count
+
+        new_row_version = SubmodelService.touch_aas(session, aas_pk, row_version)
+        AASChange.record(session, ChangeOperation.UPDATED, aas_id, new_row_version,
+                         shard=AASShardIndex.shard_of(session, aas_pk))
+        return count
@@ -0,0 +1,82 @@
+import os
+from typing import Iterator, List, Union
+
+from model.aas_change import AASChange
+from model.aas_change_relay import AASChangeRelay
+from schemas.asset_administration_shell import show_aas_change
+from utils.aas_serializer import AASSerializer
+
+
+class ChangeFeedService:
+    """
+    Builds the pages and the Server-Sent Events of the change log of the Asset Administration Shells.
+    """
+
+    # Time, in seconds, between two reads of the change log by a stream with no new changes
+    POLL_INTERVAL = float(os.environ.get("AAS_CHANGES_POLL_INTERVAL", 1.0))
+
+    # Time, in seconds, after which an idle stream sends a comment, so that proxies keep it open
+    HEARTBEAT_INTERVAL = float(os.environ.get("AAS_CHANGES_HEARTBEAT_INTERVAL", 15.0))
+
+    # Number of changes read at a time by a stream
+    BATCH_SIZE = 500
+
+    # Asks EventSource clients to reconnect after 3 seconds, sending the id of the last event they received
+    RETRY = b"retry: 3000\n\n"
+    HEARTBEAT = b": keepalive\n\n"
+
+    @staticmethod
+    def page(changes: List[AASChange], since: int, limit: int) -> dict:
+        """
+        Returns a page of the change log, with the seq to continue from.
+        """
+        return {
+            "changes": [show_aas_change(change) for change in changes],
+            "last_seq": changes[-1].seq if changes else since,
+            "has_more": len(changes) == limit,
+        }
+
+    @staticmethod
+    def event(change: AASChange) -> bytes:
+        """
+        Returns a change as a Server-Sent Event, whose id lets clients resume after a disconnection.
+        """
+        data = AASSerializer.dumps(show_aas_change(change))
+        return b"id: %d\nevent: change\ndata: %s\n\n" % (change.seq, data)
+
+    @staticmethod
+    def stream(session, since: int) -> Iterator[Union[bytes, float]]:
+        """
+        Yields the changes after the seq 'since' as Server-Sent Events, and then the new changes as they are
+        committed, forever. While no change is committed, yields the number of seconds to wait before the next
+        read, which the application sleeps without blocking its other requests, and a heartbeat now and then.
+        """
+        position = since
+        idle_time = 0.0
+        yield ChangeFeedService.RETRY
+        while True:
+            AASChangeRelay.relay(session)
+            changes = session.scalars(AASChange.since_statement(position, ChangeFeedService.BATCH_SIZE)).all()
+            # Ends the read transaction, so that the next read sees the changes committed meanwhile,
+            # and returns the connection to the pool while the stream waits
+            session.rollback()
+            for change in changes:
+                yield ChangeFeedService.event(change)
+                position = change.seq
+
+            if changes:
+                idle_time = 0.0
+                continue
+            if idle_time >= ChangeFeedService.HEARTBEAT_INTERVAL:
+                yield ChangeFeedService.HEARTBEAT
+                idle_time = 0.0
+            yield ChangeFeedService.POLL_INTERVAL
+            idle_time += ChangeFeedService.POLL_INTERVAL
+
+    @staticmethod
+    def compacted_message(since: int) -> str:
+        """
+        Returns the error message of a request for changes that were removed from the log.
+        """
+        return (f"Changes after seq {since} were removed from the change log, "
+                f"reload the list and continue from last_seq")
@@ -0,0 +1,162 @@
+import os
+import time
+import zlib
+from typing import Iterable, Iterator, Union
+
+from werkzeug.http import parse_accept_header
+
+from utils.request_metrics import request_metrics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, br is not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, zstd is not offered without it
+    zstandard = None
+
+
+class GzipEncoder:
+    """
+    Compresses a stream of chunks into a single gzip member, chunk by chunk.
+    """
+
+    def __init__(self, level: int = 6) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def encode(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    """
+    Compresses a stream of chunks with brotli, chunk by chunk.
+    """
+
+    def __init__(self, level: int) -> None:
+        self._compressor = brotli.Compressor(quality=level)
+
+    def encode(self, chunk: bytes) -> bytes:
+        return self._compressor.process(chunk)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    """
+    Compresses a stream of chunks into a single zstd frame, chunk by chunk.
+    """
+
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def encode(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class CompressionService:
+    """
+    Negotiates the content coding of the responses with Accept-Encoding and compresses them,
+    in one piece for buffered responses and incrementally for streamed ones.
+    """
+
+    # Set AAS_COMPRESSION=0 to send every response uncompressed, e.g. behind a compressing proxy
+    enabled = os.environ.get("AAS_COMPRESSION", "1") != "0"
+
+    # Buffered responses smaller than this, in bytes, are sent uncompressed. Streams are always compressed
+    MIN_SIZE = int(os.environ.get("AAS_COMPRESSION_MIN_SIZE", 1024))
+
+    # Compression level of each coding, trading CPU time for smaller responses
+    LEVELS = {
+        "zstd": int(os.environ.get("AAS_ZSTD_LEVEL", 3)),
+        "br": int(os.environ.get("AAS_BROTLI_LEVEL", 5)),
+        "gzip": int(os.environ.get("AAS_GZIP_LEVEL", 6)),
+    }
+
+    # Codings offered, preferred first when the client accepts several with the same quality
+    ENCODINGS = tuple(encoding for encoding, available in (("zstd", zstandard is not None),
+                                                         ("br", brotli is not None),
+                                                         ("gzip", True)) if available)
+
+    # Server-Sent Events must reach the client event by event, and archives are already compressed
+    COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "text/plain", "text/html", "text/css",
+                          "application/javascript", "text/javascript"}
+
+    @staticmethod
+    def negotiate(accept_encoding: Union[str, None]) -> Union[str, None]:
+        """
+        Returns the coding of the response: the one the client accepts with the highest quality,
+        or None to send the response uncompressed.
+        """
+        if not CompressionService.enabled or not accept_encoding:
+            return None
+        accepted = parse_accept_header(accept_encoding)
+        best, best_quality = None, 0
+        for encoding in CompressionService.ENCODINGS:
+            quality = accepted.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    @staticmethod
+    def is_compressible(status_code: int, mimetype: Union[str, None], content_encoding: Union[str, None]) -> bool:
+        """
+        Tells whether a response may be compressed: successful, of a textual type, and not encoded yet.
+        """
+        return status_code == 200 and not content_encoding and mimetype in CompressionService.COMPRESSIBLE_TYPES
+
+    @staticmethod
+    def encoder(encoding: str):
+        """
+        Returns an incremental encoder of the coding.
+        """
+        level = CompressionService.LEVELS[encoding]
+        if encoding == "zstd":
+            return ZstdEncoder(level)
+        if encoding == "br":
+            return BrotliEncoder(level)
+        return GzipEncoder(level)
+
+    @staticmethod
+    def compress(data: bytes, encoding: str) -> bytes:
+        """
+        Compresses a whole body, counting the time as serialization in the request metrics.
+        """
+        start = time.perf_counter()
+        encoder = CompressionService.encoder(encoding)
+        compressed = encoder.encode(data) + encoder.finish()
+        request_metrics.record_serialization(time.perf_counter() - start)
+        return compressed
+
+    @staticmethod
+    def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+        """
+        Compresses a streamed body as it is produced. The encoder emits data whenever its window
+        fills, so memory usage does not depend on the size of the body.
+        """
+        encoder = CompressionService.encoder(encoding)
+        for chunk in chunks:
+            data = encoder.encode(chunk)
+            if data:
+                yield data
+        yield encoder.finish()
+
+    @staticmethod
+    def add_vary(vary: Union[str, None]) -> str:
+        """
+        Returns the Vary header with Accept-Encoding, so that shared caches keep each coding apart.
+        """
+        if not vary:
+            return "Accept-Encoding"
+        if "accept-encoding" in vary.lower():
+            return vary
+        return f"{vary}, Accept-Encoding"
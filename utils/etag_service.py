@@ -0,0 +1,95 @@
+import hashlib
+import re
+from typing import Union
+
+
+class ETagService:
+
+    @staticmethod
+    def aas_etag(pk: int, row_version: int) -> str:
+        """
+        Builds the strong ETag of a single Asset Administration Shell.
+        \f
+        :param pk: The primary key of the AAS.
+        :param row_version: The version counter of the AAS row.
+        :return: The ETag, without quotes.
+        """
+        return f"aas-{pk}-{row_version}"
+
+    @staticmethod
+    def fields_etag(etag: str, fields: str = None) -> str:
+        """
+        Returns the ETag of a sparse fieldset of a representation, which differs from the ETag of the
+        full representation and of the other fieldsets.
+        \f
+        :param etag: The ETag of the full representation, without quotes.
+        :param fields: The normalized fieldset, None for all fields.
+        :return: The ETag, without quotes.
+        """
+        if not fields:
+            return etag
+        return f"{etag}-{hashlib.sha1(fields.encode()).hexdigest()[:8]}"
+
+    @staticmethod
+    def depth_etag(etag: str, depth: int = 0) -> str:
+        """
+        Returns the ETag of a representation including the Submodels down to the given depth, which
+        differs from the ETag of the AAS alone and of the other depths.
+        \f
+        :param etag: The ETag of the representation without Submodels, without quotes.
+        :param depth: The depth of the representation, 0 for the AAS alone.
+        :return: The ETag, without quotes.
+        """
+        if not depth:
+            return etag
+        return f"{etag}-d{depth}"
+
+    @staticmethod
+    def aas_list_etag(change_stamp: int, query_string: bytes) -> str:
+        """
+        Builds the strong ETag of the list of Asset Administration Shells.
+        The query string is part of the ETag, since each page or format is a different representation.
+        \f
+        :param change_stamp: The change stamp of the repository.
+        :param query_string: The raw query string of the request.
+        :return: The ETag, without quotes.
+        """
+        query_hash = hashlib.sha1(query_string).hexdigest()[:12]
+        return f"aas-list-{change_stamp}-{query_hash}"
+
+    # Suffix of the ETags of compressed responses, e.g. "aas-1-2-gzip"
+    ENCODING_SUFFIX = re.compile(r'-(?:gzip|br|zstd)(?=")')
+
+    @staticmethod
+    def encoded_etag(etag: str, encoding: str) -> str:
+        """
+        Returns the ETag of a compressed representation, which differs from the ETag of the uncompressed one.
+        \f
+        :param etag: The ETag of the uncompressed representation, without quotes.
+        :param encoding: The content coding of the response.
+        :return: The ETag, without quotes.
+        """
+        return f"{etag}-{encoding}"
+
+    @staticmethod
+    def not_modified_etag(etag: str, encoding: Union[str, None], if_none_match: Union[str, None]) -> str:
+        """
+        Returns the ETag of a 304 response, which is the ETag of the compressed representation
+        when the client revalidated the representation compressed with the negotiated coding.
+        \f
+        :param etag: The ETag computed by the route, without quotes.
+        :param encoding: The content coding negotiated with Accept-Encoding, if any.
+        :param if_none_match: The If-None-Match header as sent by the client, before strip_encodings.
+        :return: The ETag, without quotes.
+        """
+        if encoding and if_none_match and f'"{ETagService.encoded_etag(etag, encoding)}"' in if_none_match:
+            return ETagService.encoded_etag(etag, encoding)
+        return etag
+
+    @staticmethod
+    def strip_encodings(header: str) -> str:
+        """
+        Removes the content coding suffixes from the ETags of an If-Match or If-None-Match header, so that
+        a client holding a compressed representation matches the ETag computed by the routes.
+        """
+        return ETagService.ENCODING_SUFFIX.sub("", header)
@@ -1,6 +1,15 @@
 import base64
+import os
+from functools import lru_cache
+from random import randint
+from typing import Iterable, List, Tuple, Union
 from urllib.parse import unquote, quote
 
+from logger import logger
+
+# Number of identifiers memoized in each direction, since integrators convert the same ids on every sync
+ID_CACHE_SIZE = int(os.environ.get("ID_CACHE_SIZE", 65536))
+
 
 class IDDecoderService:
 
@@ -13,13 +22,9 @@ class IDDecoderService:
         :return: The decoded ID, or None if decoding fails.
         """
         try:
-            decoded_bytes = base64.urlsafe_b64decode(encoded_id)
-            # print(f"Decoded bytes: {decoded_bytes}")
-            decoded_id = decoded_bytes.decode('utf-8')
-            decoded_id = unquote(decoded_id)
-            return decoded_id
-        except Exception as e:
-            print(f"Error decoding the ID: {e}")
+            return IDDecoderService.decode_id_or_raise(encoded_id)
+        except ValueError as e:
+            logger.warning(f"Error decoding the ID '{encoded_id}', {e}")
             return None
 
     @staticmethod
@@ -30,12 +35,103 @@ class IDDecoderService:
         :return: The encoded ID, or None if encoding fails.
         """
         try:
-            # URL-encode the ID before Base64 encoding to handle special characters
-            encoded_id = quote(id_to_encode)
-            encoded_bytes = encoded_id.encode('utf-8')
-            encoded_bytes = base64.urlsafe_b64encode(encoded_bytes)
-            encoded_id = encoded_bytes.decode('utf-8')
-            return encoded_id
-        except Exception as e:
-            print(f"Error encoding the ID: {e}")
+            return IDDecoderService.encode_id_or_raise(id_to_encode)
+        except ValueError as e:
+            logger.warning(f"Error encoding the ID '{id_to_encode}', {e}")
             return None
+
+    @staticmethod
+    @lru_cache(maxsize=ID_CACHE_SIZE)
+    def decode_id_or_raise(encoded_id: str) -> str:
+        """
+        Decode the URL-encoded ID, raising ValueError if it is not valid.
+        The results are memoized, the errors are not.
+        """
+        try:
+            # Characters outside the URL-safe alphabet are rejected instead of silently dropped
+            decoded_bytes = base64.b64decode(encoded_id, altchars=b'-_', validate=True)
+            decoded_id = unquote(decoded_bytes.decode('utf-8'))
+        except ValueError as e:
+            # binascii.Error and UnicodeDecodeError are both ValueErrors
+            raise ValueError(f"Invalid URL-safe Base64 ID: {e}") from e
+        if not decoded_id:
+            raise ValueError("Invalid URL-safe Base64 ID: the decoded ID is empty")
+        return decoded_id
+
+    @staticmethod
+    @lru_cache(maxsize=ID_CACHE_SIZE)
+    def encode_id_or_raise(id_to_encode: str) -> str:
+        """
+        Encode the given ID to a URL-safe Base64 representation, raising ValueError if it is not valid.
+        The results are memoized, the errors are not.
+        """
+        try:
+            # URL-encode the ID before Base64 encoding to handle special characters
+            encoded_bytes = quote(id_to_encode).encode('utf-8')
+            return base64.urlsafe_b64encode(encoded_bytes).decode('utf-8')
+        except (TypeError, UnicodeEncodeError) as e:
+            raise ValueError(f"Invalid ID: {e}") from e
+
+    @staticmethod
+    def generate_ids(type_model: str, count: int = 1) -> List[str]:
+        """
+        Returns distinct example IDs of the model type, each made of four random blocks of digits.
+        """
+        ids = set()
+        while len(ids) < count:
+            blocks = [str(randint(1000, 9999)) for _ in range(4)]
+            ids.add(f"https://example.com/ids/{type_model}/" + "_".join(blocks))
+        return list(ids)
+
+    @staticmethod
+    def read_lines(lines: Iterable[bytes]):
+        """
+        Reads the ids of a plain text stream, one per line, skipping blank lines.
+        Yields pairs of (position, id), where the id is an exception if the line is not valid UTF-8.
+        """
+        index = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield index, line.decode('utf-8').strip()
+            except UnicodeDecodeError as e:
+                yield index, e
+            index += 1
+
+    @staticmethod
+    def convert_ids(items: Iterable[Tuple[int, Union[str, Exception]]], encode: bool) -> dict:
+        """
+        Encodes or decodes a batch of ids, reporting an error for each invalid item instead of failing the batch.
+        \f
+        :param items: Pairs of (position, id), where the id is an exception if it could not be read.
+        :param encode: True to encode the ids, False to decode them.
+        :return: The number of converted and invalid ids, and the result of each one.
+        """
+        convert = IDDecoderService.encode_id_or_raise if encode else IDDecoderService.decode_id_or_raise
+        results = []
+        invalid = 0
+
+        for index, item in items:
+            if isinstance(item, Exception):
+                message = f"Invalid item: {str(item)}"
+            elif not isinstance(item, str) or not item:
+                message = "ID must be a non-empty string"
+            else:
+                try:
+                    converted = convert(item)
+                    results.append({
+                        "index": index,
+                        "status": "converted",
+                        "encode_aas_id": converted if encode else item,
+                        "decode_aas_id": item if encode else converted,
+                    })
+                    continue
+                except ValueError as e:
+                    message = str(e)
+
+            invalid += 1
+            results.append({"index": index, "status": "invalid", "message": message})
+
+        return {"converted": len(results) - invalid, "invalid": invalid, "results": results}
+
@@ -0,0 +1,117 @@
+import hashlib
+from typing import Union
+
+from logger import logger
+from model.idempotency_key import IdempotencyKey
+from utils.route_response import RouteResponse
+
+
+class IdempotencyService:
+    """
+    Makes the writes retried with the same Idempotency-Key run once: the first request stores its response,
+    which the retries get back without running the route again.
+    """
+
+    HEADER = "Idempotency-Key"
+
+    # Header of the replayed responses
+    REPLAYED_HEADER = "Idempotent-Replayed"
+
+    # Routes accepting an Idempotency-Key, as (method, path). The other writes are idempotent already
+    ROUTES = {
+        ("POST", "/aas"),
+        ("PUT", "/aas"),
+        ("POST", "/aas/bulk"),
+        ("POST", "/aas/submodels"),
+    }
+
+    MAX_KEY_LENGTH = IdempotencyKey.key.type.length
+
+    @staticmethod
+    def applies(method: str, path: Union[str, None]) -> bool:
+        """
+        Tells whether a route accepts an Idempotency-Key.
+        """
+        return (method, path) in IdempotencyService.ROUTES
+
+    @staticmethod
+    def validate_key(key: str) -> Union[str, None]:
+        """
+        Returns the error message of an invalid Idempotency-Key, None if it is valid.
+        """
+        if not key or len(key) > IdempotencyService.MAX_KEY_LENGTH:
+            return f"{IdempotencyService.HEADER} must have between 1 and {IdempotencyService.MAX_KEY_LENGTH} characters"
+        return None
+
+    @staticmethod
+    def fingerprint(method: str, path: str, query_string: bytes, body: bytes) -> str:
+        """
+        Returns the hash identifying a request, so that a key reused for another request is detected.
+        """
+        request_hash = hashlib.sha256(f"{method} {path}?".encode())
+        request_hash.update(query_string)
+        request_hash.update(b"\n")
+        request_hash.update(body)
+        return request_hash.hexdigest()
+
+    @staticmethod
+    def conflict(entry: IdempotencyKey, fingerprint: str) -> Union[tuple, None]:
+        """
+        Returns the status code and message of a request whose key was used by another request,
+        None if the response of that request can be replayed.
+        """
+        if entry.fingerprint != fingerprint:
+            return 422, f"{IdempotencyService.HEADER} was already used for another request"
+        if entry.status_code is None:
+            return 409, f"A request with this {IdempotencyService.HEADER} is still running"
+        return None
+
+    @staticmethod
+    def is_storable(status_code: int) -> bool:
+        """
+        Tells whether a response is stored for the retries. Server errors are not, so that retries run again.
+        """
+        return status_code < 500
+
+    @staticmethod
+    def begin(session, key: str, method: str, path: str, query_string: bytes, body: bytes):
+        """
+        Reserves the key for a request about to run, whose response is then stored by finish.
+        \f
+        :return: None if the route runs, otherwise the response sent instead: the error of an invalid key
+                 or of a conflicting request, or the stored response of the request that used the key.
+        """
+        error_msg = IdempotencyService.validate_key(key)
+        if error_msg:
+            logger.warning(f"Error reading {IdempotencyService.HEADER}: {error_msg}")
+            return RouteResponse.error(error_msg, 400)
+
+        fingerprint = IdempotencyService.fingerprint(method, path, query_string, body)
+        entry = IdempotencyKey.reserve(session, key, fingerprint)
+        if entry is None:
+            return None
+
+        conflict = IdempotencyService.conflict(entry, fingerprint)
+        if conflict:
+            status_code, error_msg = conflict
+            logger.warning(f"Error reading {IdempotencyService.HEADER} {key}: {error_msg}")
+            response = RouteResponse.error(error_msg, status_code)
+            if status_code == 409:
+                response.headers["Retry-After"] = "1"
+            return response
+
+        logger.debug("Replaying the response of %s %s for %s %s", method, path, IdempotencyService.HEADER, key)
+        return RouteResponse(entry.body, entry.status_code, etag=entry.etag, media_type=entry.content_type,
+                             headers={IdempotencyService.REPLAYED_HEADER: "true"})
+
+    @staticmethod
+    def finish(session, key: str, status_code: int, body: bytes, content_type: Union[str, None],
+               etag: Union[str, None], streamed: bool) -> None:
+        """
+        Stores the response of a request holding a key, replayed to its retries. Server errors and
+        streamed responses release the key instead, so that a retry runs the route again.
+        """
+        if IdempotencyService.is_storable(status_code) and not streamed:
+            IdempotencyKey.complete(session, key, status_code, body, content_type, etag)
+        else:
+            IdempotencyKey.release(session, key)
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+
+class LoadShedder:
+    """
+    Rejects the expensive requests while the repository is overloaded, so that cheap reads stay fast:
+    when the requests running in the process, or the recent latency of the database queries, cross
+    their threshold. The latency is an average of the queries weighted towards the latest ones, which
+    decays while no query runs, so that shedding stops once the load is gone. Streamed responses, such
+    as the Server-Sent Events of the change feed, are counted apart once their route returned, since
+    a subscriber mostly waits for the next change for as long as it is connected.
+    \f
+    :param max_in_flight: Requests running at once in the process above which it is overloaded, 0 for no limit.
+    :param max_db_latency: Average query latency, in seconds, above which it is overloaded, 0 for no limit.
+    :param retry_after: Seconds the rejected clients are asked to wait before retrying.
+    :param half_life: Seconds after which the weight of a query latency in the average is halved.
+    """
+
+    # Methods of the reads, kept running under overload when their route is cheap
+    READ_METHODS = ("GET", "HEAD")
+
+    # Weight of each new query latency in the average
+    SMOOTHING = 0.2
+
+    def __init__(self, max_in_flight: int = 0, max_db_latency: float = 0.0, retry_after: int = 1,
+                 half_life: float = 1.0) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_db_latency = max_db_latency
+        self.retry_after = retry_after
+        self.half_life = half_life
+        self.in_flight = 0
+        self.streams = 0
+        self._latency = 0.0
+        self._latency_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0 or self.max_db_latency > 0
+
+    def enter(self) -> None:
+        """
+        Counts a request starting to run.
+        """
+        with self._lock:
+            self.in_flight += 1
+
+    def leave(self) -> None:
+        """
+        Counts a request done running.
+        """
+        with self._lock:
+            self.in_flight -= 1
+
+    def start_stream(self) -> None:
+        """
+        Counts a running request whose route returned a streamed response as a stream, no longer in flight.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.streams += 1
+
+    def end_stream(self) -> None:
+        """
+        Counts a stream done.
+        """
+        with self._lock:
+            self.streams -= 1
+
+    def observe_query(self, duration: float) -> None:
+        """
+        Adds the latency of a database query to the average.
+        """
+        if not self.max_db_latency:
+            return
+        with self._lock:
+            self._latency = self.db_latency() * (1 - self.SMOOTHING) + duration * self.SMOOTHING
+            self._latency_time = time.monotonic()
+
+    def db_latency(self) -> float:
+        """
+        Returns the average latency of the recent database queries, in seconds.
+        """
+        return self._latency * 0.5 ** ((time.monotonic() - self._latency_time) / self.half_life)
+
+    def is_overloaded(self) -> bool:
+        return (0 < self.max_in_flight <= self.in_flight) or (0 < self.max_db_latency <= self.db_latency())
+
+    def should_shed(self, method: str, cost: float) -> bool:
+        """
+        Tells whether a request is rejected: while overloaded, every request but the reads costing
+        at most a single lookup (see RateLimiter.cost). Routes costing 0, such as the metrics, always run.
+        """
+        if not self.enabled or cost <= 0 or (method in self.READ_METHODS and cost <= 1):
+            return False
+        return self.is_overloaded()
+
+
+load_shedder = LoadShedder(
+    max_in_flight=int(os.environ.get("AAS_SHED_MAX_IN_FLIGHT", 0)),
+    max_db_latency=float(os.environ.get("AAS_SHED_MAX_DB_LATENCY_MS", 0)) / 1000,
+    retry_after=int(os.environ.get("AAS_SHED_RETRY_AFTER", 1))
+)
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+from typing import Iterable, Union
+
+from flask_openapi3 import APIBlueprint
+from flask_openapi3 import __version__ as flask_openapi3_version
+from flask_openapi3.utils import get_operation_id_for_path, parse_parameters
+from pydantic import VERSION as pydantic_version
+
+from logger import logger
+
+
+class DeferredAPIBlueprint(APIBlueprint):
+    """
+    APIBlueprint that only reads the parameter models of its routes when they are declared, and builds
+    their OpenAPI documentation when collect_openapi_info is called. Generating the JSON schemas of the
+    models is most of the import time of the application, and is skipped when the specification is
+    loaded from a file.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.deferred_routes = []
+        self.openapi_collected = False
+
+    def _collect_openapi_info(self, rule: str, func, **kwargs):
+        self.deferred_routes.append((rule, func, kwargs))
+        return parse_parameters(func, doc_ui=False)
+
+    def collect_openapi_info(self) -> None:
+        """
+        Builds the OpenAPI documentation of the routes, once. The operation IDs are named after the
+        view functions, as for routes declared on the application itself.
+        """
+        if self.openapi_collected:
+            return
+        for rule, func, kwargs in self.deferred_routes:
+            kwargs["operation_id"] = kwargs.get("operation_id") or get_operation_id_for_path(
+                name=func.__name__, path=rule, method=kwargs["method"])
+            super()._collect_openapi_info(rule, func, **kwargs)
+        self.openapi_collected = True
+
+
+class OpenAPISpecService:
+    """
+    Saves the OpenAPI specification of the application to a file, and loads it back as long as
+    the code that produced it did not change.
+    """
+
+    @staticmethod
+    def fingerprint(source_paths: Iterable[str]) -> str:
+        """
+        Returns a hash of the files declaring the routes and schemas, and of the libraries building the specification.
+        """
+        digest = hashlib.sha256(f"{flask_openapi3_version}:{pydantic_version}".encode())
+        for path in sorted(source_paths):
+            with open(path, "rb") as file:
+                digest.update(file.read())
+        return digest.hexdigest()
+
+    @staticmethod
+    def load(path: str, fingerprint: str) -> Union[dict, None]:
+        """
+        Returns the specification saved in the file, or None if the file is missing or was written
+        by other code.
+        """
+        try:
+            with open(path, "rb") as file:
+                saved = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Error loading OpenAPI specification from '{path}', {str(e)}")
+            return None
+
+        if saved.get("fingerprint") != fingerprint:
+            logger.warning(f"OpenAPI specification in '{path}' is outdated, it is generated on first request")
+            return None
+        return saved["spec"]
+
+    @staticmethod
+    def save(path: str, spec: dict, fingerprint: str) -> None:
+        """
+        Writes the specification to the file, with the fingerprint of the code that produced it.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, "w", encoding="utf8") as file:
+            json.dump({"fingerprint": fingerprint, "spec": spec}, file, ensure_ascii=False)
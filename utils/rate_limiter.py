@@ -0,0 +1,219 @@
+import hashlib
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+
+class RateLimitBackend:
+    """
+    Defines the storage of the token buckets used by RateLimiter.
+    The default keeps the buckets in process, but a backend shared between workers (e.g. Redis)
+    can be plugged in by implementing this method.
+    """
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """
+        Takes tokens from the bucket of a client, refilled with rate tokens per second up to burst.
+        \f
+        :return: 0 if the tokens were taken, otherwise the time in seconds until enough tokens are available.
+        """
+        raise NotImplementedError
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    In-process token buckets. The buckets of the least recently seen clients are dropped when
+    there are too many, which gives those clients a full bucket again.
+    \f
+    :param max_clients: Maximum number of buckets kept in memory.
+    """
+
+    def __init__(self, max_clients: int = 100000) -> None:
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+def parse_costs(value: str) -> Dict[Tuple[str, str], float]:
+    """
+    Reads the costs of the routes from "METHOD /path=cost" pairs separated by commas,
+    e.g. "GET /aas_list=10,GET /aas/export=50".
+    """
+    costs = {}
+    for pair in filter(None, (pair.strip() for pair in value.split(","))):
+        route, _, cost = pair.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        if not method or not path.strip().startswith("/") or not cost:
+            raise ValueError(f"Invalid route cost '{pair}', expected 'METHOD /path=cost'")
+        costs[(method.upper(), path.strip())] = float(cost)
+    return costs
+
+
+def parse_networks(value: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """
+    Reads addresses and networks separated by commas, e.g. "10.0.0.0/8,::1".
+    """
+    networks = []
+    for network in filter(None, (network.strip() for network in value.split(","))):
+        try:
+            networks.append(ipaddress.ip_network(network, strict=False))
+        except ValueError:
+            raise ValueError(f"Invalid trusted proxy '{network}', expected an address or a network")
+    return networks
+
+
+class RateLimiter:
+    """
+    Limits the requests of each client, identified by its API key or else its address, with a token bucket.
+    Each route costs a number of tokens, so that a full list or an export costs more than a lookup.
+    The repository does not authenticate its clients, so an API key only identifies a client if it is in
+    the allow-list or accepted by the validator: otherwise a client could get a full bucket with every
+    request by sending a new key.
+    \f
+    :param backend: The storage of the buckets.
+    :param rate: Tokens added to the bucket of a client per second, 0 to disable the limit.
+    :param burst: Size of the buckets, i.e. the tokens a client can spend at once after being idle.
+    :param costs: Cost of the routes, as (method, path), overriding DEFAULT_COSTS.
+    :param api_keys: The API keys identifying their clients, the others are ignored.
+    :param trusted_proxies: The addresses and networks of the reverse proxies in front of the repository,
+                            whose X-Forwarded-For header gives the address of the client.
+    """
+
+    # Cost of the routes not listed, e.g. reading or writing a single AAS
+    DEFAULT_COST = 1.0
+
+    # Cost of the routes reading or writing many AAS. Routes costing 0 are never limited
+    DEFAULT_COSTS = {
+        ("GET", "/aas_list"): 10.0,
+        ("GET", "/aas/filter"): 5.0,
+        ("GET", "/aas/search"): 5.0,
+        ("GET", "/aas/export"): 50.0,
+        ("POST", "/aas/import"): 50.0,
+        ("POST", "/aas/bulk"): 20.0,
+        ("GET", "/metrics"): 0.0,
+    }
+
+    def __init__(self, backend: RateLimitBackend, rate: float = 0.0, burst: float = 0.0,
+                 costs: Union[Dict[Tuple[str, str], float], None] = None, api_keys: Iterable[str] = (),
+                 trusted_proxies: Iterable[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]] = ()) -> None:
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst or max(rate, max(self.DEFAULT_COSTS.values()))
+        self.costs = {**self.DEFAULT_COSTS, **(costs or {})}
+        self.api_key_hashes = {self.hash_key(api_key) for api_key in api_keys}
+        self.trusted_proxies = list(trusted_proxies)
+        self.api_key_validator = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def set_backend(self, backend: RateLimitBackend) -> None:
+        """
+        Replaces the storage of the buckets, e.g. with a backend shared between gunicorn workers.
+        """
+        self.backend = backend
+
+    def set_api_key_validator(self, validator: Callable[[str], bool]) -> None:
+        """
+        Accepts the API keys for which the validator returns True, besides those of the allow-list,
+        e.g. the keys checked by an authentication layer in front of the routes.
+        """
+        self.api_key_validator = validator
+
+    def cost(self, method: str, path: str) -> float:
+        """
+        Returns the tokens taken by a request to the route.
+        """
+        return self.costs.get((method, path), self.DEFAULT_COST)
+
+    @staticmethod
+    def hash_key(api_key: str) -> str:
+        """
+        Returns the hash of an API key, so that the keys are not kept in memory or in the backend.
+        """
+        return hashlib.sha256(api_key.encode()).hexdigest()[:32]
+
+    def client_key(self, api_key: Union[str, None], address: Union[str, None],
+                   forwarded_for: Union[str, None] = None) -> str:
+        """
+        Returns the key of the bucket of a client: its API key if it is trusted, otherwise its address.
+        \f
+        :param api_key: The API key sent by the client, if any.
+        :param address: The address of the peer of the connection.
+        :param forwarded_for: The X-Forwarded-For header, only read when the peer is a trusted proxy.
+        """
+        if api_key:
+            key_hash = self.hash_key(api_key)
+            if key_hash in self.api_key_hashes or (self.api_key_validator and self.api_key_validator(api_key)):
+                return f"key:{key_hash}"
+        return f"ip:{self.client_address(address, forwarded_for)}"
+
+    def client_address(self, address: Union[str, None], forwarded_for: Union[str, None] = None) -> Union[str, None]:
+        """
+        Returns the address of a client. Behind trusted proxies, it is the last address of X-Forwarded-For
+        that is not a trusted proxy, since each proxy appends the address of its peer to the header,
+        while the addresses before could be sent by the client.
+        """
+        if not forwarded_for or not self.is_trusted_proxy(address):
+            return address
+        for hop in reversed([hop.strip() for hop in forwarded_for.split(",") if hop.strip()]):
+            address = hop
+            if not self.is_trusted_proxy(hop):
+                break
+        return address
+
+    def is_trusted_proxy(self, address: Union[str, None]) -> bool:
+        if not address or not self.trusted_proxies:
+            return False
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def check(self, client: str, cost: float) -> int:
+        """
+        Takes the cost of a request from the bucket of the client. A cost above the size of the bucket
+        takes the whole bucket.
+        \f
+        :return: 0 if the request may run, otherwise the seconds to wait before retrying, for Retry-After.
+        """
+        if not self.enabled or cost <= 0:
+            return 0
+        wait = self.backend.take(client, min(cost, self.burst), self.rate, self.burst)
+        return math.ceil(wait) if wait else 0
+
+
+rate_limiter = RateLimiter(
+    LocalRateLimitBackend(max_clients=int(os.environ.get("AAS_RATE_LIMIT_MAX_CLIENTS", 100000))),
+    rate=float(os.environ.get("AAS_RATE_LIMIT", 0)),
+    burst=float(os.environ.get("AAS_RATE_LIMIT_BURST", 0)),
+    costs=parse_costs(os.environ.get("AAS_RATE_LIMIT_COSTS", "")),
+    api_keys=filter(None, (key.strip() for key in os.environ.get("AAS_RATE_LIMIT_API_KEYS", "").split(","))),
+    trusted_proxies=parse_networks(os.environ.get("AAS_TRUSTED_PROXIES", ""))
+)
+
+# Header identifying the client, whose address is used when it is missing or not trusted
+API_KEY_HEADER = os.environ.get("AAS_API_KEY_HEADER", "X-API-Key")
+
+# Header of the reverse proxies giving the address of the client, read from the trusted proxies only
+FORWARDED_FOR_HEADER = "X-Forwarded-For"
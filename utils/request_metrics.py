@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Tuple, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+
+class RequestStats:
+    """
+    Time spent by a single request, collected while it runs.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.token = None
+
+
+class Histogram:
+    """
+    Prometheus histogram with one series per combination of label values.
+    \f
+    :param name: Name of the metric.
+    :param description: Help text of the metric.
+    :param label_names: Names of the labels of every series.
+    :param buckets: Upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, label_values: tuple, value: float) -> None:
+        """
+        Adds a value to the series of the label values. Callers hold the lock of RequestMetrics.
+        """
+        series = self._series.get(label_values)
+        if series is None:
+            # Bucket counts, then the sum and the count of the values
+            series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list:
+        """
+        Returns the lines of the histogram in the Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._series.items()):
+            labels = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+def escape_label(value) -> str:
+    """
+    Escapes a label value for the Prometheus text format.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+    """
+    Collects the latency, database queries and serialization time of every request, by route.
+    The statistics of the running request are kept in a context variable, so that the engine
+    events and the serializers can add to them without receiving the request.
+    \f
+    :param enabled: False to skip the collection and the Server-Timing header.
+    """
+
+    # Buckets of the durations, in seconds
+    DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    # Buckets of the number of queries per request, where a growing count usually is an N+1 query
+    QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._current: ContextVar[Union[RequestStats, None]] = ContextVar("request_stats", default=None)
+        self._lock = threading.Lock()
+        labels = ("method", "route")
+        self.request_duration = Histogram(
+            "aas_http_request_duration_seconds", "Duration of the HTTP requests until the response headers.",
+            labels + ("status",), self.DURATION_BUCKETS)
+        self.db_queries = Histogram(
+            "aas_db_queries_per_request", "Number of database queries run by each HTTP request.",
+            labels, self.QUERY_BUCKETS)
+        self.db_duration = Histogram(
+            "aas_db_query_duration_seconds", "Time spent by each HTTP request in database queries.",
+            labels, self.DURATION_BUCKETS)
+        self.serialization_duration = Histogram(
+            "aas_serialization_duration_seconds", "Time spent by each HTTP request encoding JSON.",
+            labels, self.DURATION_BUCKETS)
+
+    def begin(self) -> Union[RequestStats, None]:
+        """
+        Starts collecting the statistics of the request running in the current context.
+        """
+        if not self.enabled:
+            return None
+        stats = RequestStats()
+        stats.token = self._current.set(stats)
+        return stats
+
+    def end(self, stats: Union[RequestStats, None]) -> None:
+        """
+        Stops collecting the statistics of the request. Called in the context where begin was called.
+        """
+        if stats is not None and stats.token is not None:
+            self._current.reset(stats.token)
+            stats.token = None
+
+    def record_query(self, duration: float) -> None:
+        """
+        Adds a database query to the statistics of the running request, if any.
+        """
+        stats = self._current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += duration
+
+    def record_serialization(self, duration: float) -> None:
+        """
+        Adds the time spent encoding a response to the statistics of the running request, if any.
+        """
+        stats = self._current.get()
+        if stats is not None:
+            stats.serialization_time += duration
+
+    def observe(self, stats: Union[RequestStats, None], method: str, route: str, status: int) -> None:
+        """
+        Adds the statistics of a finished request to the histograms of its route.
+        """
+        if stats is None:
+            return
+        stats.duration = time.perf_counter() - stats.start
+        with self._lock:
+            self.request_duration.observe((method, route, str(status)), stats.duration)
+            self.db_queries.observe((method, route), stats.queries)
+            self.db_duration.observe((method, route), stats.db_time)
+            self.serialization_duration.observe((method, route), stats.serialization_time)
+
+    @staticmethod
+    def server_timing(stats: RequestStats) -> str:
+        """
+        Returns the Server-Timing header of a request, with durations in milliseconds.
+        """
+        return (f'db;dur={stats.db_time * 1000:.3f};desc="{stats.queries} queries", '
+                f'serialize;dur={stats.serialization_time * 1000:.3f}, '
+                f'total;dur={stats.duration * 1000:.3f}')
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text format.
+        """
+        lines = []
+        with self._lock:
+            for histogram in (self.request_duration, self.db_queries, self.db_duration, self.serialization_duration):
+                lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsJSONProvider(DefaultJSONProvider):
+    """
+    Flask's default JSON provider, adding the time spent in jsonify to the statistics of the request.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            request_metrics.record_serialization(time.perf_counter() - start)
+
+
+# Metrics shared by the whole process
+request_metrics = RequestMetrics(enabled=os.environ.get("AAS_METRICS_ENABLED", "1") != "0")
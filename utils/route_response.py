@@ -0,0 +1,61 @@
+import time
+from typing import Callable, Iterator, Union
+
+from utils.aas_serializer import AASSerializer
+from utils.request_metrics import request_metrics
+
+
+class RouteResponse:
+    """
+    Response of a route, independent of the web framework: app.py turns it into a Flask response
+    and asgi.py into a Starlette response.
+    \f
+    :param body: Object sent as JSON, bytes sent as they are, or None for an empty body.
+    :param status: HTTP status code.
+    :param etag: Strong ETag of the body, without quotes.
+    :param headers: Other headers of the response.
+    :param media_type: Content type of the body, None for the default of the framework.
+    :param dumps: Encoder of a JSON body, AASSerializer.dumps by default.
+    :param stream: Instead of a body, a function of a session returning the chunks of a streamed body.
+                   A chunk may also be a number of seconds to wait before the next one, e.g. while
+                   polling the change log, which the adapter sleeps without blocking other requests.
+    """
+
+    def __init__(self, body=None, status: int = 200, etag: str = None, headers: dict = None,
+                 media_type: Union[str, None] = "application/json", dumps: Callable = None,
+                 stream: Callable[..., Iterator[Union[bytes, float]]] = None) -> None:
+        self.body = body
+        self.status = status
+        self.etag = etag
+        self.headers = headers or {}
+        self.media_type = media_type
+        self.dumps = dumps
+        self.stream = stream
+
+    @staticmethod
+    def error(error_msg: str, status: int, **fields) -> "RouteResponse":
+        """
+        Returns the response of an error, whose message the route already logged.
+        """
+        return RouteResponse({"message": error_msg, **fields}, status)
+
+    @staticmethod
+    def not_modified(etag: str) -> "RouteResponse":
+        """
+        Returns an empty 304 response for a conditional GET whose ETag still matches.
+        """
+        return RouteResponse(status=304, etag=etag, media_type=None)
+
+    def encode(self) -> bytes:
+        """
+        Returns the body as bytes, with the same JSON encoding as Flask's jsonify.
+        """
+        if self.body is None:
+            return b""
+        if isinstance(self.body, bytes):
+            return self.body
+        dumps = self.dumps or (AASSerializer.dumps if AASSerializer.enabled else AASSerializer.dumps_standard)
+        start = time.perf_counter()
+        body = dumps(self.body) + b"\n"
+        request_metrics.record_serialization(time.perf_counter() - start)
+        return body
@@ -0,0 +1,128 @@
+from typing import List, Union
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+
+from model.asset_administration_shell import AssetAdministrationShell
+from model.submodel import Submodel
+from model.submodel_element import SubmodelElement
+from schemas.asset_administration_shell import SubmodelSchema, SubmodelElementSchema, AAS_MAX_DEPTH, show_aas, \
+    show_submodel
+from utils.aas_serializer import AASSerializer
+
+
+class SubmodelService:
+    """
+    Reads and writes the Submodels of the Asset Administration Shells and their element trees.
+    """
+
+    # Loading strategies of the Submodels of a list of AAS. 'selectin' reads each level with one query
+    # for the whole list, 'lazy' reads the Submodels of each AAS, and the elements of each Submodel, on access
+    STRATEGIES = ("selectin", "lazy")
+
+    @staticmethod
+    def load_options(depth: int, strategy: str = "selectin") -> list:
+        """
+        Returns the loader options of a query of Asset Administration Shells represented at the given depth:
+        the Submodels from depth 1, and their elements down to depth - 1. With selectin loading, the number
+        of queries depends on the depth only, not on the number of AAS or Submodels.
+        """
+        if depth == 0 or strategy == "lazy":
+            return []
+        loader = selectinload(AssetAdministrationShell.submodels)
+        if depth > 1:
+            # The elements of the Submodels are read in path order, one range of the path index per Submodel
+            loader = loader.selectinload(Submodel.elements.and_(SubmodelElement.depth < depth))
+        return [loader]
+
+    @staticmethod
+    def show_aas(aas: AssetAdministrationShell, depth: int, fields: tuple = None) -> dict:
+        """
+        Returns the representation of an AAS with its Submodels, the selected fields only if given.
+        """
+        aas_view = show_aas(aas)
+        if fields:
+            aas_view = AASSerializer.project(aas_view, fields)
+        if depth > 0:
+            aas_view["submodels"] = [show_submodel(submodel, depth - 1) for submodel in aas.submodels]
+        return aas_view
+
+    @staticmethod
+    def element_rows(elements: List[SubmodelElementSchema]) -> List[dict]:
+        """
+        Returns the rows of an element tree, with the materialized path of each element.
+        \f
+        :param elements: The elements at the root of the Submodel.
+        :raises ValueError: If the tree is deeper than the representation of an AAS can go, or if siblings
+            share an id_short.
+        """
+        rows = []
+        pending = [("", elements)]
+        while pending:
+            parent_path, siblings = pending.pop()
+            id_shorts = set()
+            for position, element in enumerate(siblings):
+                if element.id_short in id_shorts:
+                    raise ValueError(f"Duplicate id_short '{element.id_short}' among the elements at the same level")
+                id_shorts.add(element.id_short)
+
+                path = SubmodelElement.child_path(parent_path, position)
+                depth = len(path) // (SubmodelElement.POSITION_WIDTH + 1)
+                if depth >= AAS_MAX_DEPTH:
+                    raise ValueError(f"Submodel Elements cannot be nested more than {AAS_MAX_DEPTH - 1} levels deep")
+                rows.append({
+                    "path": path,
+                    "depth": depth,
+                    "id_short": element.id_short,
+                    "model_type": element.model_type,
+                    "value_type": element.value_type,
+                    "value": element.value,
+                })
+                if element.elements:
+                    pending.append((path, element.elements))
+        return rows
+
+    @staticmethod
+    def conflict_message(error: IntegrityError, submodel: SubmodelSchema) -> str:
+        """
+        Returns the message of a Submodel rejected by a unique constraint: its submodel_id already exists,
+        or its id_short already exists in the AAS.
+        """
+        if "submodel_id" in str(error.orig):
+            return f"Submodel already exists with ID: {submodel.submodel_id}"
+        if "id_short" in str(error.orig):
+            return f"Submodel already exists in the Asset Administration Shell with Id Short: {submodel.id_short}"
+        return f"Submodel already exists: {str(error)}"
+
+    @staticmethod
+    def touch_aas(session, aas_pk: int, row_version: Union[int, None] = None) -> int:
+        """
+        Increments the version of an AAS whose Submodels changed, since they are part of its representation.
+        \f
+        :param row_version: The version the AAS must still have, if any.
+        :return: The new version of the AAS.
+        :raises StaleDataError: If a version is given and the AAS was modified or deleted since it was read.
+        """
+        statement = update(AssetAdministrationShell).where(AssetAdministrationShell.id == aas_pk)
+        if row_version is not None:
+            statement = statement.where(AssetAdministrationShell.row_version == row_version)
+        count = session.execute(statement.values(row_version=AssetAdministrationShell.row_version + 1)).rowcount
+        if not count and row_version is not None:
+            raise StaleDataError(f"Asset Administration Shell #{aas_pk} was modified since it was read")
+        return session.scalar(select(AssetAdministrationShell.row_version).where(
+            AssetAdministrationShell.id == aas_pk))
+
+    @staticmethod
+    def delete_submodels(session, *submodel_criteria) -> int:
+        """
+        Deletes the Submodels matching the criteria, and their elements.
+        \f
+        :return: The number of deleted Submodels.
+        """
+        submodel_pks = session.scalars(select(Submodel.id).where(*submodel_criteria)).all()
+        if submodel_pks:
+            session.execute(delete(SubmodelElement).where(SubmodelElement.submodel_pk.in_(submodel_pks)))
+            session.execute(delete(Submodel).where(Submodel.id.in_(submodel_pks)))
+        return len(submodel_pks)
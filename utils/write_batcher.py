@@ -0,0 +1,135 @@
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.util import await_only
+
+from logger import logger
+from model import session_factory, setup_database, shard_urls
+
+
+class WriteBatcher:
+    """
+    Group commit of the writes of concurrent requests. The writes are queued to a single writer thread,
+    which runs those arriving within a short window in one transaction, each in its own savepoint, and
+    commits them together. On SQLite, the writes of a batch thus share a single sync to disk, instead of one
+    each. Every write gets its own result or error, and its request only gets it once the batch is committed.
+    \f
+    :param enabled: False to commit every write on its own, in the session of its request.
+    :param window: Time, in seconds, the writer waits for more writes after the first of a batch.
+    :param max_writes: Number of writes after which a batch is committed without waiting for the window.
+    """
+
+    def __init__(self, enabled: bool = False, window: float = 0.003, max_writes: int = 64) -> None:
+        self.enabled = enabled
+        self.window = window
+        self.max_writes = max_writes
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, write: Callable) -> Future:
+        """
+        Queues a write, a function of a session that does not commit, e.g. one of AASWriteService.
+        \f
+        :return: The future of the result of the write, set once its batch is committed.
+        """
+        self.start()
+        future = Future()
+        # The write runs in the context of its request, whose metrics count its queries
+        self._queue.put((write, contextvars.copy_context(), future))
+        return future
+
+    def run(self, write: Callable):
+        """
+        Runs a write in the next batch and returns its result, or raises its error.
+        Inside AsyncSession.run_sync, the event loop keeps serving the other requests while the batch commits.
+        """
+        future = self.submit(write)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return future.result()
+        return await_only(asyncio.wrap_future(future))
+
+    def start(self) -> None:
+        """
+        Starts the writer thread, again in each process forked after it started.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.loop, name="aas-group-commit", daemon=True)
+                self._thread.start()
+
+    def loop(self) -> None:
+        """
+        Collects the queued writes into batches and commits them, until the process exits.
+        """
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_writes:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.commit(batch)
+            except Exception as e:
+                # The requests of the batch must not wait forever, e.g. if the database cannot be opened
+                logger.warning(f"Error running a batch of {len(batch)} writes: {str(e)}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    @staticmethod
+    def commit(batch: List[Tuple[Callable, contextvars.Context, Future]]) -> None:
+        """
+        Runs the writes of a batch in one transaction and commits it. A failing write only rolls back its
+        savepoint, while a failing commit fails every write of the batch.
+        """
+        setup_database()
+        done = []
+        # The results stay readable by the requests after the session is closed
+        with session_factory(expire_on_commit=False) as session:
+            if session.get_bind().dialect.name == "sqlite":
+                # pysqlite does not begin a transaction before a SAVEPOINT, which would then start its own
+                # transaction and commit it on release. The write lock is taken at once, for the whole batch
+                session.execute(text("BEGIN IMMEDIATE"))
+            for write, context, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                savepoint = session.begin_nested()
+                try:
+                    result = context.run(write, session)
+                    savepoint.commit()
+                    done.append((future, result))
+                except Exception as e:
+                    savepoint.rollback()
+                    future.set_exception(e)
+
+            try:
+                session.commit()
+            except Exception as e:
+                logger.warning(f"Error committing a batch of {len(done)} writes: {str(e)}")
+                session.rollback()
+                for future, _ in done:
+                    future.set_exception(e)
+                return
+
+        for future, result in done:
+            future.set_result(result)
+
+
+# Sharded repositories commit every write on its own, since a write may span the shard index and a shard
+write_batcher = WriteBatcher(
+    enabled=os.environ.get("AAS_GROUP_COMMIT", "0") == "1" and not shard_urls,
+    window=float(os.environ.get("AAS_GROUP_COMMIT_WINDOW_MS", 3)) / 1000,
+    max_writes=int(os.environ.get("AAS_GROUP_COMMIT_MAX_WRITES", 64))
+)